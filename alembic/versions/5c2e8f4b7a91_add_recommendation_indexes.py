@@ -0,0 +1,32 @@
+"""add recommendation indexes on activity
+
+Revision ID: 5c2e8f4b7a91
+Revises: 93e9a09c0d19
+Create Date: 2026-10-18 10:12:04.118230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c2e8f4b7a91'
+down_revision: Union[str, Sequence[str], None] = '93e9a09c0d19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_activity_created_at_id', 'activity', [sa.text('created_at DESC'), sa.text('id DESC')], unique=False)
+    op.create_index('ix_activity_outdoor_created_at', 'activity', ['is_outdoor', sa.text('created_at DESC')], unique=False)
+    op.create_index('ix_activity_temperature', 'activity', ['ideal_temperature_min', 'ideal_temperature_max'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_activity_temperature', table_name='activity')
+    op.drop_index('ix_activity_outdoor_created_at', table_name='activity')
+    op.drop_index('ix_activity_created_at_id', table_name='activity')
@@ -0,0 +1,28 @@
+"""add (user_id, activity_id) index on history
+
+Revision ID: 8d41b6e0c2f7
+Revises: 5c2e8f4b7a91
+Create Date: 2026-10-18 11:03:47.502611
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d41b6e0c2f7'
+down_revision: Union[str, Sequence[str], None] = '5c2e8f4b7a91'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_history_user_activity', 'history', ['user_id', 'activity_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_history_user_activity', table_name='history')
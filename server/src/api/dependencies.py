@@ -0,0 +1,29 @@
+# api/dependencies.py
+from typing import Optional
+from fastapi import HTTPException, Request
+from server.src.services.gazetteer import Gazetteer
+from server.src.services.weather_service import AsyncWeatherService, default_gazetteer
+
+
+def get_weather_service(request: Request) -> AsyncWeatherService:
+    """
+    Service météo unique du process, créé dans le lifespan de l'application :
+    pool HTTP, caches et compteurs survivent donc d'une requête à l'autre.
+    """
+    service = getattr(request.app.state, "weather_service", None)
+    if service is None:
+        raise HTTPException(status_code=503, detail="Service météo non configuré")
+    return service
+
+
+def get_optional_weather_service(request: Request) -> Optional[AsyncWeatherService]:
+    """Variante pour les routes qui fonctionnent aussi sans météo (recommandations)"""
+    return getattr(request.app.state, "weather_service", None)
+
+
+def get_gazetteer() -> Gazetteer:
+    """Gazetteer local des villes : ne dépend ni de la clé API ni du service météo"""
+    gazetteer = default_gazetteer()
+    if gazetteer is None:
+        raise HTTPException(status_code=503, detail="Index des villes indisponible")
+    return gazetteer
@@ -3,7 +3,7 @@ from sqlalchemy.orm import Session
 from typing import List
 from server.src.db.base import SessionLocal
 from server.src.schemas.activity_schema import Activity, ActivityCreate, ActivityOut
-from server.src.services.activity_service import get_activities, get_activity, create_activity, delete_activity
+from server.src.services.activity_service import get_activities, get_activity, create_activity, delete_activity, update_activity
 from server.src.middlewares.auth_middleware import require_role
 
 router = APIRouter(prefix="/activities", tags=["activities"])
@@ -38,12 +38,8 @@ def delete_existing_activity(activity_id: int, db: Session = Depends(get_db), us
     return activity
 
 @router.put("/{activity_id}", response_model=ActivityOut)
-def update_activity(activity_id: int, activity: ActivityCreate, db: Session = Depends(get_db), user: dict = Depends(require_role([2]))):
-    db_activity = get_activity(db, activity_id)
+def update_existing_activity(activity_id: int, activity: ActivityCreate, db: Session = Depends(get_db), user: dict = Depends(require_role([2]))):
+    db_activity = update_activity(db, activity_id, activity)
     if not db_activity:
         raise HTTPException(status_code=404, detail="Activity not found")
-    for field, value in activity.dict(exclude_unset=True).items():
-        setattr(db_activity, field, value)
-    db.commit()
-    db.refresh(db_activity)
     return db_activity
@@ -1,30 +1,99 @@
 # api/routes_recommendation.py
-from fastapi import APIRouter, Depends, Query
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from server.src.db.base import get_db
 from server.src.middlewares.auth_middleware import get_current_user_from_db
 from server.src.models.user_model import User
-from server.src.services.recommendation_service import get_recommendations_for_user
-from server.src.services.weather_service import WeatherService
-from server.src.core.config import (
-    WEATHER_API_KEY
+from server.src.core.config import parse_duration
+from server.src.services.recommendation_service import (
+    get_forecast_recommendations_for_user,
+    get_recommendations_for_user,
 )
-import os
+from server.src.services.weather_service import AsyncWeatherService
+from server.src.api.dependencies import get_optional_weather_service
+import logging
 
 router = APIRouter(prefix="/recommendations", tags=["recommendations"])
-
-def get_weather_service() -> WeatherService:
-    return WeatherService(api_key=WEATHER_API_KEY or "")
+logger = logging.getLogger(__name__)
 
 @router.get("/")
-def recommendations(
+async def recommendations(
     city: str = Query(None, description="Ville pour filtrer selon la météo"),
     is_outdoor: bool = Query(None, description="Filtrer les activités selon indoor/outdoor"),
+    at: Optional[datetime] = Query(None, description="Instant visé (heure locale de la ville si sans fuseau), ex: 2025-06-07T14:00"),
+    window: Optional[str] = Query(None, description="Période : début/fin ISO (ex: 2025-06-07T00:00/2025-06-09T00:00) ou durée depuis maintenant (12h, 2d)"),
     current_user: User = Depends(get_current_user_from_db),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    weather_service: AsyncWeatherService = Depends(get_optional_weather_service)
 ):
     """
     Retourne les recommandations pour l'utilisateur connecté.
     Optionnellement filtrées selon la météo si city est fournie.
+    Avec at ou window, la meilleure activité pour chaque créneau de 3h des prévisions.
     """
-    return get_recommendations_for_user(current_user, db, city=city, is_outdoor=is_outdoor, weather_service=get_weather_service())
+    if at is not None or window is not None:
+        return await _forecast_recommendations(city, at, window, is_outdoor, current_user, db, weather_service)
+
+    raw_weather = None
+    if city and weather_service is not None:
+        try:
+            raw_weather = await weather_service.get_current_weather(city)
+        except Exception as e:
+            logger.error(f"Impossible de récupérer la météo: {e}")
+
+    # Les requêtes SQL restent synchrones : on les sort de la boucle d'événements
+    return await run_in_threadpool(
+        get_recommendations_for_user,
+        current_user,
+        db,
+        city=city,
+        is_outdoor=is_outdoor,
+        raw_weather=raw_weather,
+    )
+
+async def _forecast_recommendations(city, at, window, is_outdoor, current_user, db, weather_service):
+    if at is not None and window is not None:
+        raise HTTPException(status_code=400, detail="Utiliser at ou window, pas les deux")
+    if not city:
+        raise HTTPException(status_code=400, detail="city est requis avec at ou window")
+    if weather_service is None:
+        raise HTTPException(status_code=503, detail="Service météo non configuré")
+    try:
+        forecast = (await weather_service.lookup_forecast(city)).data
+    except Exception as e:
+        logger.error(f"Impossible de récupérer les prévisions: {e}")
+        raise HTTPException(status_code=503, detail="Prévisions météo indisponibles")
+
+    tz_offset = (forecast.get("city") or {}).get("timezone") or 0
+    return await run_in_threadpool(
+        get_forecast_recommendations_for_user,
+        current_user,
+        db,
+        forecast,
+        is_outdoor=is_outdoor,
+        at=_timestamp(at, tz_offset) if at is not None else None,
+        window=_parse_window(window, tz_offset) if window is not None else None,
+    )
+
+def _timestamp(value: datetime, tz_offset: int) -> int:
+    """Horodatage UTC ; une date sans fuseau est l'heure locale de la ville"""
+    if value.tzinfo is None:
+        return int(value.replace(tzinfo=timezone.utc).timestamp()) - tz_offset
+    return int(value.timestamp())
+
+def _parse_window(window: str, tz_offset: int) -> Tuple[int, int]:
+    try:
+        if "/" in window:
+            start, end = (datetime.fromisoformat(part.strip()) for part in window.split("/", 1))
+            bounds = _timestamp(start, tz_offset), _timestamp(end, tz_offset)
+        else:
+            now = int(datetime.now(timezone.utc).timestamp())
+            bounds = now, now + parse_duration(window.strip()) * 60
+    except ValueError:
+        raise HTTPException(status_code=400, detail="window invalide (début/fin ISO ou durée : 12h, 2d)")
+    if bounds[1] <= bounds[0]:
+        raise HTTPException(status_code=400, detail="window invalide : la fin doit suivre le début")
+    return bounds
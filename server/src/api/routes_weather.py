@@ -1,27 +1,142 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
-import requests
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query, Depends, Header, Response
+import hashlib
+import httpx
 import logging
 from server.src.core.config import (
-    WEATHER_API_KEY
+    WEATHER_API_KEY,
+    WEATHER_BATCH_MAX_ITEMS,
+    WEATHER_CACHE_MAX_SIZE,
+    WEATHER_CACHE_TTL,
+    WEATHER_STALE_TTL,
 )
-from server.src.schemas.weather_schema import CurrentWeatherOut, ForecastOut
-from server.src.services.weather_service import WeatherService
-from server.src.services.weather_adapter import map_current_weather, map_forecast
+from server.src.api.dependencies import get_gazetteer, get_weather_service
+from server.src.schemas.weather_schema import (
+    CitySuggestion,
+    CurrentWeatherOut,
+    ForecastOut,
+    HourlyForecastOut,
+    WeatherBatchIn,
+    WeatherBatchItem,
+    WeatherBatchOut,
+)
+from server.src.services.weather_service import AsyncWeatherService
+from server.src.services.gazetteer import Gazetteer
+from server.src.services.circuit_breaker import CircuitOpenError
+from server.src.services.rate_limiter import RateLimitExceeded
+from server.src.services.forecast_aggregation import SERIES_FIELDS
+from server.src.services.weather_adapter import (
+    map_current_weather,
+    map_forecast,
+    map_hourly_forecast,
+    render_current_weather,
+    splice_age,
+)
+from server.src.services.weather_cache import TTLCache
 
 router = APIRouter(prefix="/weather", tags=["Meteo"])
 logger = logging.getLogger(__name__)
 
-# Dépendance pour le service météo
-def get_weather_service() -> WeatherService:
-    return WeatherService(api_key=WEATHER_API_KEY or "")
+# Réponses /weather/{city} déjà sérialisées, par version des données : (ETag, JSON découpé)
+_rendered_weather = TTLCache(max_size=WEATHER_CACHE_MAX_SIZE, ttl=WEATHER_CACHE_TTL + WEATHER_STALE_TTL)
+
+@router.post("/batch", response_model=WeatherBatchOut, summary="Météo actuelle de plusieurs villes")
+async def current_weather_batch(
+    payload: WeatherBatchIn,
+    service: AsyncWeatherService = Depends(get_weather_service)
+):
+    """
+    Récupère en une requête la météo actuelle d'une liste de villes et/ou de coordonnées.
+    Les doublons sont fusionnés et chaque entrée a son propre résultat ou sa propre erreur.
+    """
+    total = len(payload.cities) + len(payload.coords)
+    if total == 0:
+        raise HTTPException(status_code=400, detail="Au moins une ville ou une coordonnée est requise")
+    if total > WEATHER_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Maximum {WEATHER_BATCH_MAX_ITEMS} villes/coordonnées par requête"
+        )
+
+    lookups = await service.get_current_weather_many(
+        cities=payload.cities,
+        coords=[(c.lat, c.lon) for c in payload.coords],
+    )
+
+    results = []
+    for lookup in lookups:
+        if lookup.error is None:
+            weather = map_current_weather(
+                lookup.query, lookup.data, age_seconds=lookup.age, stale=lookup.stale, degraded=lookup.stale
+            )
+            results.append(WeatherBatchItem(query=lookup.query, ok=True, weather=weather))
+            continue
+        status_code, error_detail = _error_response(lookup.error, lookup.query)
+        results.append(WeatherBatchItem(
+            query=lookup.query, ok=False, status_code=status_code, error=error_detail
+        ))
+
+    return WeatherBatchOut(
+        count=len(results),
+        errors=sum(1 for r in results if not r.ok),
+        results=results
+    )
+
+@router.get("/cities", response_model=List[CitySuggestion], summary="Autocomplétion des villes")
+def city_autocomplete(
+    q: str = Query(..., min_length=1, max_length=100, description="Début du nom de la ville (ex: par, Saint-É, Lyon,FR)"),
+    limit: int = Query(10, ge=1, le=50, description="Nombre maximal de suggestions"),
+    gazetteer: Gazetteer = Depends(get_gazetteer)
+):
+    """
+    Suggestions de villes depuis le gazetteer local, sans appel au service météo.
+    L'identifiant renvoyé peut être utilisé tel quel comme nom de ville.
+    """
+    return [CitySuggestion(**place._asdict()) for place in gazetteer.autocomplete(q, limit=limit)]
+
+@router.get("/coords", response_model=CurrentWeatherOut, summary="Météo actuelle par coordonnées")
+async def current_weather_by_coords(
+    lat: float = Query(..., ge=-90, le=90, description="Latitude"),
+    lon: float = Query(..., ge=-180, le=180, description="Longitude"),
+    service: AsyncWeatherService = Depends(get_weather_service)
+):
+    """
+    Récupère la météo actuelle pour une position GPS.
+    Les positions proches partagent la même observation en cache (cellule geohash).
+    """
+    label = f"{lat},{lon}"
+    try:
+        result = await service.lookup_weather_by_coords(lat, lon)
+        return map_current_weather(label, result.data, age_seconds=result.age, stale=result.stale, degraded=result.degraded)
+    except Exception as e:
+        status_code, error_detail = _error_response(e, label)
+        raise HTTPException(status_code=status_code, detail=error_detail)
+
+@router.get("/coords/forecast", response_model=ForecastOut, summary="Prévisions météo par coordonnées")
+async def forecast_by_coords(
+    lat: float = Query(..., ge=-90, le=90, description="Latitude"),
+    lon: float = Query(..., ge=-180, le=180, description="Longitude"),
+    days: int = Query(3, ge=1, le=7, description="Nombre de jours de prévision (1-7)"),
+    service: AsyncWeatherService = Depends(get_weather_service)
+):
+    """Récupère les prévisions météo pour une position GPS"""
+    label = f"{lat},{lon}"
+    try:
+        result = await service.lookup_forecast_by_coords(lat, lon)
+        return map_forecast(label, days, result.data, age_seconds=result.age, stale=result.stale, degraded=result.degraded)
+    except Exception as e:
+        status_code, error_detail = _error_response(e, label)
+        raise HTTPException(status_code=status_code, detail=error_detail)
 
 @router.get("/{city}", response_model=CurrentWeatherOut, summary="Météo actuelle")
-def current_weather(
+async def current_weather(
     city: str,
-    service: WeatherService = Depends(get_weather_service)
+    service: AsyncWeatherService = Depends(get_weather_service),
+    if_none_match: Optional[str] = Header(None)
 ):
     """
     Récupère la météo actuelle pour une ville spécifique.
+    La réponse porte un ETag par version des données (304 si If-None-Match correspond).
     
     - **city**: Nom de la ville (ex: Paris, London, New York)
     """
@@ -33,14 +148,23 @@ def current_weather(
     
     try:
         logger.info(f"Requête météo actuelle pour: {city}")
-        data = service.get_current_weather(city.strip())
-        return map_current_weather(city, data)
+        result = await service.lookup_current_weather(city.strip())
+        etag, rendered = _render_current_weather(city, result)
+        headers = {"ETag": etag, "Age": str(int(result.age))}
+        if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+            return Response(status_code=304, headers=headers)
+        return Response(content=splice_age(rendered, result.age), media_type="application/json", headers=headers)
         
-    except requests.HTTPError as e:
-        status_code = e.response.status_code if e.response else 500
+    except httpx.HTTPStatusError as e:
+        status_code = e.response.status_code
         error_detail = _handle_http_error(status_code, city)
         logger.warning(f"Erreur HTTP {status_code} pour {city}: {error_detail}")
         raise HTTPException(status_code=status_code, detail=error_detail)
+
+    except (CircuitOpenError, RateLimitExceeded, httpx.TransportError) as e:
+        status_code, error_detail = _error_response(e, city)
+        logger.warning(f"Service météo indisponible pour {city}: {e}")
+        raise HTTPException(status_code=status_code, detail=error_detail)
         
     except Exception as e:
         logger.error(f"Erreur inattendue pour {city}: {e}")
@@ -50,10 +174,10 @@ def current_weather(
         )
 
 @router.get("/{city}/forecast", response_model=ForecastOut, summary="Prévisions météo")
-def forecast(
+async def forecast(
     city: str,
     days: int = Query(3, ge=1, le=7, description="Nombre de jours de prévision (1-7)"),
-    service: WeatherService = Depends(get_weather_service)
+    service: AsyncWeatherService = Depends(get_weather_service)
 ):
     """
     Récupère les prévisions météo pour une ville sur plusieurs jours.
@@ -69,14 +193,19 @@ def forecast(
     
     try:
         logger.info(f"Requête prévisions pour: {city}, {days} jours")
-        data = service.get_forecast_raw(city.strip())
-        return map_forecast(city, days, data)
+        result = await service.lookup_forecast(city.strip())
+        return map_forecast(city, days, result.data, age_seconds=result.age, stale=result.stale, degraded=result.degraded)
         
-    except requests.HTTPError as e:
-        status_code = e.response.status_code if e.response else 500
+    except httpx.HTTPStatusError as e:
+        status_code = e.response.status_code
         error_detail = _handle_http_error(status_code, city)
         logger.warning(f"Erreur HTTP {status_code} pour prévisions {city}: {error_detail}")
         raise HTTPException(status_code=status_code, detail=error_detail)
+
+    except (CircuitOpenError, RateLimitExceeded, httpx.TransportError) as e:
+        status_code, error_detail = _error_response(e, city)
+        logger.warning(f"Service météo indisponible pour prévisions {city}: {e}")
+        raise HTTPException(status_code=status_code, detail=error_detail)
         
     except Exception as e:
         logger.error(f"Erreur inattendue pour prévisions {city}: {e}")
@@ -85,6 +214,70 @@ def forecast(
             detail="Erreur interne du serveur"
         )
 
+@router.get("/{city}/forecast/hourly", response_model=HourlyForecastOut, summary="Prévisions par créneau")
+async def hourly_forecast(
+    city: str,
+    fields: Optional[str] = Query(
+        None, description=f"Colonnes séparées par des virgules (défaut : toutes) parmi {','.join(SERIES_FIELDS)}"
+    ),
+    step: Optional[int] = Query(None, ge=15, le=1440, description="Pas en minutes (interpolation entre les créneaux de 3h)"),
+    points: Optional[int] = Query(None, ge=2, le=500, description="Nombre maximal de points par série (sous-échantillonnage)"),
+    service: AsyncWeatherService = Depends(get_weather_service)
+):
+    """
+    Séries des prévisions sur 5 jours, servies depuis le cache des prévisions (même appel
+    OpenWeatherMap que /forecast), pour les graphiques.
+
+    - **fields**: colonnes à renvoyer (ex: temp,pop) ; dt est toujours inclus
+    - **step**: grille régulière en minutes, valeurs numériques interpolées
+    - **points**: réduit chaque série à ce nombre de points au plus
+    """
+    if not city or not city.strip():
+        raise HTTPException(status_code=400, detail="Le nom de la ville est requis")
+    selected = _parse_fields(fields)
+
+    try:
+        result = await service.lookup_forecast(city.strip())
+        return map_hourly_forecast(
+            city, result.data, selected, step_minutes=step, points=points,
+            age_seconds=result.age, stale=result.stale, degraded=result.degraded
+        )
+    except Exception as e:
+        status_code, error_detail = _error_response(e, city)
+        raise HTTPException(status_code=status_code, detail=error_detail)
+
+def _parse_fields(fields: Optional[str]) -> List[str]:
+    """Colonnes demandées, dans l'ordre de la requête et sans doublon (400 si inconnue)"""
+    if not fields:
+        return list(SERIES_FIELDS)
+    selected = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip() not in ("", "dt")))
+    unknown = [f for f in selected if f not in SERIES_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Colonnes inconnues : {', '.join(unknown)} (disponibles : {', '.join(SERIES_FIELDS)})"
+        )
+    return selected
+
+def _render_current_weather(city: str, result):
+    """
+    ETag et JSON pré-sérialisé d'une version des données : le mapping, la validation
+    Pydantic et l'encodage ne sont faits qu'au premier affichage de cette version.
+    """
+    name = result.data.get("name") or city
+    render_key = (name, result.version, result.stale, result.degraded)
+    cached = _rendered_weather.get(render_key) if result.version else None
+    if cached is not None:
+        return cached
+    digest = hashlib.sha1(repr(render_key).encode()).hexdigest()[:20]
+    cached = (
+        f'W/"{digest}"',
+        render_current_weather(city, result.data, age_seconds=result.age, stale=result.stale, degraded=result.degraded),
+    )
+    if result.version:
+        _rendered_weather.set(render_key, cached)
+    return cached
+
 def _handle_http_error(status_code: int, city: str) -> str:
     """Gère les erreurs HTTP spécifiques à l'API OpenWeatherMap"""
     error_messages = {
@@ -100,24 +293,43 @@ def _handle_http_error(status_code: int, city: str) -> str:
     
     return error_messages.get(status_code, f"Erreur {status_code}")
 
+def _error_response(error: Exception, city: str):
+    """Code HTTP et message à renvoyer pour une erreur du service météo"""
+    if isinstance(error, httpx.HTTPStatusError):
+        status_code = error.response.status_code
+        return status_code, _handle_http_error(status_code, city)
+    if isinstance(error, (CircuitOpenError, RateLimitExceeded)):
+        return 503, "Service météo temporairement indisponible"
+    if isinstance(error, httpx.TimeoutException):
+        return 504, _handle_http_error(504, city)
+    if isinstance(error, httpx.TransportError):
+        return 502, _handle_http_error(502, city)
+    logger.error(f"Erreur inattendue pour {city}: {error}")
+    return 500, "Erreur interne du serveur"
+
 # Route de santé pour vérifier que l'API fonctionne
 @router.get("/health/check")
-def health_check(service: WeatherService = Depends(get_weather_service)):
+async def health_check(service: AsyncWeatherService = Depends(get_weather_service)):
     """Vérifie la santé de l'API météo"""
     try:
         # Test avec une ville simple
         test_city = "London"
-        data = service.get_current_weather(test_city)
+        data = await service.get_current_weather(test_city)
         
         return {
             "status": "healthy",
             "service": "openweathermap",
             "test_city": test_city,
-            "api_key_configured": bool(WEATHER_API_KEY)
+            "api_key_configured": bool(WEATHER_API_KEY),
+            **service.stats()
         }
     except Exception as e:
         logger.error(f"Health check failed: {e}")
         raise HTTPException(
             status_code=503,
             detail="Service météo indisponible"
-        )
\ No newline at end of file
+        )
+@router.get("/health/metrics")
+async def metrics(service: AsyncWeatherService = Depends(get_weather_service)):
+    """Compteurs du service météo (cache, disjoncteur, nouvelles tentatives, latences, quota) sans appel à l'API"""
+    return {**service.stats(), "rendered_responses": _rendered_weather.stats()}
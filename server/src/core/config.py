@@ -13,6 +13,83 @@ POSTGRES_PORT = os.getenv("POSTGRES_PORT")
 # weather api
 WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")
 
+# weather cache (TTL en secondes)
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "600"))
+WEATHER_FORECAST_CACHE_TTL = float(os.getenv("WEATHER_FORECAST_CACHE_TTL", "1800"))
+# durée pendant laquelle une entrée expirée peut encore être servie (stale-while-revalidate)
+WEATHER_STALE_TTL = float(os.getenv("WEATHER_STALE_TTL", "3600"))
+# rafraîchissement en arrière-plan des villes les plus demandées (0 = désactivé)
+WEATHER_REFRESH_INTERVAL = float(os.getenv("WEATHER_REFRESH_INTERVAL", "60"))
+WEATHER_REFRESH_TOP_N = int(os.getenv("WEATHER_REFRESH_TOP_N", "20"))
+# âge maximal des données servies en secours quand le service météo est en panne
+WEATHER_STALE_IF_ERROR_MAX_AGE = float(os.getenv("WEATHER_STALE_IF_ERROR_MAX_AGE", "21600"))
+# disjoncteur : échecs consécutifs avant ouverture, durée d'ouverture (secondes)
+WEATHER_BREAKER_FAILURE_THRESHOLD = int(os.getenv("WEATHER_BREAKER_FAILURE_THRESHOLD", "5"))
+WEATHER_BREAKER_COOLDOWN = float(os.getenv("WEATHER_BREAKER_COOLDOWN", "30"))
+# nombre d'appels d'essai autorisés quand le disjoncteur est à moitié ouvert
+WEATHER_BREAKER_HALF_OPEN_CALLS = int(os.getenv("WEATHER_BREAKER_HALF_OPEN_CALLS", "1"))
+# nouvelles tentatives : nombre max d'essais, backoff (secondes), part des appels pouvant être rejoués
+WEATHER_RETRY_MAX_ATTEMPTS = int(os.getenv("WEATHER_RETRY_MAX_ATTEMPTS", "3"))
+WEATHER_RETRY_BASE_DELAY = float(os.getenv("WEATHER_RETRY_BASE_DELAY", "0.2"))
+WEATHER_RETRY_MAX_DELAY = float(os.getenv("WEATHER_RETRY_MAX_DELAY", "2"))
+WEATHER_RETRY_BUDGET_RATIO = float(os.getenv("WEATHER_RETRY_BUDGET_RATIO", "0.2"))
+# quota OpenWeatherMap côté client (0 = désactivé), rafale max, attente max d'un jeton (secondes)
+WEATHER_RATE_LIMIT_PER_MINUTE = float(os.getenv("WEATHER_RATE_LIMIT_PER_MINUTE", "60"))
+WEATHER_RATE_LIMIT_BURST = int(os.getenv("WEATHER_RATE_LIMIT_BURST", "10"))
+WEATHER_RATE_LIMIT_MAX_WAIT = float(os.getenv("WEATHER_RATE_LIMIT_MAX_WAIT", "2"))
+# timeout adaptatif : multiple du p99 des latences observées, borné (WEATHER_HTTP_TIMEOUT = borne haute)
+WEATHER_TIMEOUT_MIN = float(os.getenv("WEATHER_TIMEOUT_MIN", "1"))
+WEATHER_TIMEOUT_PERCENTILE = float(os.getenv("WEATHER_TIMEOUT_PERCENTILE", "99"))
+WEATHER_TIMEOUT_MULTIPLIER = float(os.getenv("WEATHER_TIMEOUT_MULTIPLIER", "2"))
+WEATHER_CACHE_MAX_SIZE = int(os.getenv("WEATHER_CACHE_MAX_SIZE", "1024"))
+# stockage du cache météo : "memory" (par process), "sqlite" ou "redis" (partagés entre workers)
+WEATHER_CACHE_BACKEND = os.getenv("WEATHER_CACHE_BACKEND", "memory").lower()
+WEATHER_CACHE_SQLITE_PATH = os.getenv("WEATHER_CACHE_SQLITE_PATH", "weather_cache.sqlite3")
+WEATHER_CACHE_REDIS_URL = os.getenv("WEATHER_CACHE_REDIS_URL", "redis://localhost:6379/0")
+WEATHER_COORDS_PRECISION = int(os.getenv("WEATHER_COORDS_PRECISION", "2"))
+# cache géographique : précision geohash des cellules (6 ≈ 1,2 km x 0,6 km), rayon de recherche des voisines
+WEATHER_GEO_PRECISION = int(os.getenv("WEATHER_GEO_PRECISION", "6"))
+WEATHER_GEO_RADIUS_KM = float(os.getenv("WEATHER_GEO_RADIUS_KM", "1"))
+
+# weather http client (pool de connexions partagé)
+WEATHER_HTTP_TIMEOUT = float(os.getenv("WEATHER_HTTP_TIMEOUT", "15"))
+WEATHER_HTTP_MAX_CONNECTIONS = int(os.getenv("WEATHER_HTTP_MAX_CONNECTIONS", "100"))
+WEATHER_HTTP_MAX_KEEPALIVE = int(os.getenv("WEATHER_HTTP_MAX_KEEPALIVE", "20"))
+WEATHER_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("WEATHER_HTTP_KEEPALIVE_EXPIRY", "30"))
+WEATHER_HTTP2 = os.getenv("WEATHER_HTTP2", "true").lower() in ("1", "true", "yes")
+
+# weather batch (POST /weather/batch)
+WEATHER_BATCH_MAX_ITEMS = int(os.getenv("WEATHER_BATCH_MAX_ITEMS", "200"))
+WEATHER_BATCH_CONCURRENCY = int(os.getenv("WEATHER_BATCH_CONCURRENCY", "10"))
+
+# index local nom de ville -> ID OpenWeatherMap (appels groupés /group)
+WEATHER_CITY_INDEX_PATH = os.getenv("WEATHER_CITY_INDEX_PATH", "city_index.json")
+# gazetteer local des villes (normalisation avant tout appel, autocomplétion) ; chemin vide = fichier fourni
+WEATHER_GAZETTEER_ENABLED = os.getenv("WEATHER_GAZETTEER_ENABLED", "true").lower() in ("1", "true", "yes")
+WEATHER_GAZETTEER_PATH = os.getenv("WEATHER_GAZETTEER_PATH", "")
+# fautes de frappe tolérées dans les suggestions seulement (la résolution exige une correspondance exacte)
+WEATHER_GAZETTEER_MAX_TYPOS = int(os.getenv("WEATHER_GAZETTEER_MAX_TYPOS", "1"))
+
+# recommandations : index des activités en mémoire (sinon filtrage entièrement en SQL)
+RECOMMENDATION_ACTIVITY_INDEX = os.getenv("RECOMMENDATION_ACTIVITY_INDEX", "true").lower() in ("1", "true", "yes")
+# délai (secondes) entre deux comparaisons de l'index avec la base (modifications d'un autre process)
+RECOMMENDATION_INDEX_CHECK_INTERVAL = float(os.getenv("RECOMMENDATION_INDEX_CHECK_INTERVAL", "5"))
+# activités déjà vues par utilisateur (bitsets en mémoire), rechargées depuis la base après ce délai
+RECOMMENDATION_HISTORY_CACHE_TTL = float(os.getenv("RECOMMENDATION_HISTORY_CACHE_TTL", "60"))
+RECOMMENDATION_HISTORY_CACHE_SIZE = int(os.getenv("RECOMMENDATION_HISTORY_CACHE_SIZE", "10000"))
+# traitement par lot (notifications) : utilisateurs par paquet écrit, lignes d'historique par page
+RECOMMENDATION_JOB_CHUNK_SIZE = int(os.getenv("RECOMMENDATION_JOB_CHUNK_SIZE", "500"))
+RECOMMENDATION_JOB_HISTORY_PAGE_SIZE = int(os.getenv("RECOMMENDATION_JOB_HISTORY_PAGE_SIZE", "5000"))
+# attente max d'un jeton du quota météo pour le job (seau propre au job : il attend son tour au lieu d'échouer)
+RECOMMENDATION_JOB_WEATHER_MAX_WAIT = float(os.getenv("RECOMMENDATION_JOB_WEATHER_MAX_WAIT", "3600"))
+# instantanés de classement par (ville, tranche météo, tranche d'âge, is_outdoor), historique appliqué à la lecture
+RECOMMENDATION_SNAPSHOTS = os.getenv("RECOMMENDATION_SNAPSHOTS", "true").lower() in ("1", "true", "yes")
+RECOMMENDATION_SNAPSHOT_TEMP_STEP = float(os.getenv("RECOMMENDATION_SNAPSHOT_TEMP_STEP", "2"))      # °C
+RECOMMENDATION_SNAPSHOT_AGE_BAND = int(os.getenv("RECOMMENDATION_SNAPSHOT_AGE_BAND", "10"))        # années
+RECOMMENDATION_SNAPSHOT_DEPTH = int(os.getenv("RECOMMENDATION_SNAPSHOT_DEPTH", "500"))             # activités classées
+RECOMMENDATION_SNAPSHOT_CACHE_SIZE = int(os.getenv("RECOMMENDATION_SNAPSHOT_CACHE_SIZE", "2000"))
+RECOMMENDATION_SNAPSHOT_TTL = float(os.getenv("RECOMMENDATION_SNAPSHOT_TTL", "3600"))
+
 # JWT settings
 SECRET_KEY_ACCESS = os.getenv("SECRET_KEY_ACCESS")
 SECRET_KEY_REFRESH = os.getenv("SECRET_KEY_REFRESH")
@@ -0,0 +1,95 @@
+# server/src/jobs/recommendations.py
+"""
+Recommandations du matin pour tous les utilisateurs (job de notifications), en JSON Lines :
+    python -m server.src.jobs.recommendations --output recommandations.jsonl
+"""
+import argparse
+import json
+import logging
+import sys
+from typing import List, Optional
+
+from server.src.core.config import (
+    WEATHER_API_KEY,
+    WEATHER_RATE_LIMIT_BURST,
+    WEATHER_RATE_LIMIT_PER_MINUTE,
+    RECOMMENDATION_JOB_CHUNK_SIZE,
+    RECOMMENDATION_JOB_WEATHER_MAX_WAIT,
+)
+from server.src.db.base import SessionLocal
+from server.src.services.rate_limiter import TokenBucket
+from server.src.services.recommendation_service import get_recommendations_for_users
+from server.src.services.weather_service import WeatherService
+
+logger = logging.getLogger("recommendation_job")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Recommandations d'activités par lot, une ligne JSON par utilisateur")
+    parser.add_argument("--output", "-o", default="-", help="fichier de sortie (- : sortie standard)")
+    parser.add_argument("--limit", type=int, default=5, help="activités recommandées par utilisateur")
+    parser.add_argument("--chunk-size", type=int, default=RECOMMENDATION_JOB_CHUNK_SIZE, help="utilisateurs par paquet écrit")
+    parser.add_argument("--user-id", type=int, action="append", dest="user_ids", help="limiter à cet utilisateur (répétable)")
+    outdoor = parser.add_mutually_exclusive_group()
+    outdoor.add_argument("--outdoor", dest="is_outdoor", action="store_const", const=True)
+    outdoor.add_argument("--indoor", dest="is_outdoor", action="store_const", const=False)
+    parser.add_argument("--no-weather", action="store_true", help="ne pas interroger le service météo")
+    return parser.parse_args(argv)
+
+
+def job_rate_limiter() -> Optional[TokenBucket]:
+    """
+    Quota de la clé API pour le job : même débit que l'API, mais une attente longue
+    (RECOMMENDATION_JOB_WEATHER_MAX_WAIT) plutôt que le refus après quelques secondes
+    du seau partagé, pensé pour des requêtes interactives
+    """
+    if WEATHER_RATE_LIMIT_PER_MINUTE <= 0:
+        return None
+    return TokenBucket(
+        rate=WEATHER_RATE_LIMIT_PER_MINUTE / 60,
+        burst=WEATHER_RATE_LIMIT_BURST,
+        max_wait=RECOMMENDATION_JOB_WEATHER_MAX_WAIT,
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    weather_service = None
+    if not args.no_weather:
+        if WEATHER_API_KEY:
+            weather_service = WeatherService(api_key=WEATHER_API_KEY, rate_limiter=job_rate_limiter())
+        else:
+            logger.warning("WEATHER_API_KEY absente : recommandations sans météo")
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    db = SessionLocal()
+    users = weather_misses = 0
+    try:
+        for chunk in get_recommendations_for_users(
+            db,
+            weather_service=weather_service,
+            user_ids=args.user_ids,
+            is_outdoor=args.is_outdoor,
+            limit=args.limit,
+            chunk_size=args.chunk_size,
+        ):
+            out.writelines(json.dumps(entry, ensure_ascii=False) + "\n" for entry in chunk)
+            out.flush()
+            users += len(chunk)
+            weather_misses += sum(1 for entry in chunk if entry["weather_error"])
+            logger.info(f"{users} utilisateurs traités")
+        if weather_misses:
+            logger.warning(f"{weather_misses} utilisateurs recommandés sans météo (voir weather_error)")
+    finally:
+        db.close()
+        if weather_service is not None:
+            weather_service.close()
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
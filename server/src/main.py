@@ -1,3 +1,5 @@
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends
 from fastapi.openapi.utils import get_openapi
 
@@ -20,6 +22,10 @@ from server.src.db.base import Base, engine, SessionLocal
 from server.src.models.user_model import Base as UserBase
 from server.src.models.role_model import Base as RoleBase
 from server.src.core.init_roles import init_roles, init_admin
+from server.src.core.config import WEATHER_API_KEY
+from server.src.services.weather_service import AsyncWeatherService
+
+logger = logging.getLogger(__name__)
 
 # Crée les tables si elles n'existent pas
 Base.metadata.create_all(bind=engine)
@@ -30,11 +36,32 @@ init_roles(db)
 init_admin(db, email="admin@example.com", username="admin", password="Admin123!")
 db.close()
 
+# -----------------------------
+# ♻️ Ressources partagées (lifespan)
+# -----------------------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Service météo unique du process : il possède le pool HTTP, les caches et les compteurs
+    try:
+        app.state.weather_service = AsyncWeatherService(api_key=WEATHER_API_KEY or "")
+        # Rafraîchit en arrière-plan les villes les plus demandées avant leur expiration
+        app.state.weather_service.start_background_refresh()
+    except ValueError as e:
+        logger.warning(f"Service météo désactivé: {e}")
+        app.state.weather_service = None
+    yield
+    if app.state.weather_service is not None:
+        await app.state.weather_service.aclose()
+
+
 # -----------------------------
 # 🚀 App FastAPI
 # -----------------------------
 app = FastAPI(
-    title="Weather API", version="1.0", description="API météo 🌦️ avec JWT et rôles"
+    title="Weather API",
+    version="1.0",
+    description="API météo 🌦️ avec JWT et rôles",
+    lifespan=lifespan,
 )
 
 # -----------------------------
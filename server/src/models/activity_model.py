@@ -1,5 +1,5 @@
 from sqlalchemy import (
-    Column, Integer, String, Boolean, Enum, Float, DateTime, ForeignKey, Table
+    Column, Integer, String, Boolean, Enum, Float, DateTime, ForeignKey, Table, Index
 )
 from sqlalchemy.orm import relationship
 from server.src.db.base import Base
@@ -52,6 +52,14 @@ class Activity(Base):
     tags = relationship("Tag", secondary=activity_tag, back_populates="activities")
     history = relationship("History", back_populates="activity", cascade="all, delete-orphan")
 
+    # Recommandations : parcours dans l'ordre du tri (plus récentes d'abord) jusqu'au LIMIT,
+    # avec ou sans filtre indoor/outdoor, et fenêtre de température
+    __table_args__ = (
+        Index("ix_activity_created_at_id", created_at.desc(), id.desc()),
+        Index("ix_activity_outdoor_created_at", is_outdoor, created_at.desc()),
+        Index("ix_activity_temperature", ideal_temperature_min, ideal_temperature_max),
+    )
+
 
 class Category(Base):
     __tablename__ = "category"
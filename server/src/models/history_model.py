@@ -1,5 +1,5 @@
 # models/history_model.py
-from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from server.src.db.base import Base
@@ -15,3 +15,8 @@ class History(Base):
     # Relations
     user = relationship("User", back_populates="history")
     activity = relationship("Activity", back_populates="history")
+
+    # Exclusion des activités vues (NOT EXISTS) et chargement de l'historique d'un utilisateur
+    __table_args__ = (
+        Index("ix_history_user_activity", "user_id", "activity_id"),
+    )
@@ -1,4 +1,4 @@
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from pydantic import BaseModel, Field
 from datetime import datetime
 
@@ -37,6 +37,9 @@ class CurrentWeatherOut(BaseModel):
     # Métadonnées
     last_updated: datetime = Field(..., description="Dernière mise à jour des données")
     mock: bool = Field(False, description="Données simulées ou réelles")
+    stale: bool = Field(False, description="Données périmées servies pendant leur rafraîchissement")
+    age_seconds: float = Field(0, description="Âge des données en cache (secondes)")
+    degraded: bool = Field(False, description="Dernières données connues, servies car le service météo est indisponible")
 
 class ForecastDay(BaseModel):
     date: str = Field(..., description="Date de la prévision (YYYY-MM-DD)")
@@ -76,4 +79,54 @@ class ForecastOut(BaseModel):
     
     # Métadonnées
     generated_at: datetime = Field(..., description="Heure de génération du rapport")
-    mock: bool = Field(False, description="Données simulées ou réelles")
\ No newline at end of file
+    mock: bool = Field(False, description="Données simulées ou réelles")
+    stale: bool = Field(False, description="Données périmées servies pendant leur rafraîchissement")
+    age_seconds: float = Field(0, description="Âge des données en cache (secondes)")
+    degraded: bool = Field(False, description="Dernières données connues, servies car le service météo est indisponible")
+
+class HourlyForecastOut(BaseModel):
+    city: str = Field(..., description="Ville concernée")
+    country: str = Field(..., description="Pays concerné")
+    lat: float = Field(..., description="Latitude")
+    lon: float = Field(..., description="Longitude")
+    timezone: int = Field(0, description="Décalage horaire de la ville par rapport à UTC (secondes)")
+
+    # Séries (une liste par colonne, même longueur)
+    fields: List[str] = Field(..., description="Colonnes renvoyées, en plus de dt")
+    step_minutes: Optional[int] = Field(None, description="Pas de la grille interpolée (minutes), sinon créneaux d'origine")
+    points: int = Field(..., description="Nombre de points par série")
+    series: Dict[str, List[Any]] = Field(..., description="Valeurs par colonne ; dt : horodatages UTC (secondes)")
+
+    # Métadonnées
+    generated_at: datetime = Field(..., description="Heure de génération du rapport")
+    mock: bool = Field(False, description="Données simulées ou réelles")
+    stale: bool = Field(False, description="Données périmées servies pendant leur rafraîchissement")
+    age_seconds: float = Field(0, description="Âge des données en cache (secondes)")
+    degraded: bool = Field(False, description="Dernières données connues, servies car le service météo est indisponible")
+
+class Coordinates(BaseModel):
+    lat: float = Field(..., ge=-90, le=90, description="Latitude")
+    lon: float = Field(..., ge=-180, le=180, description="Longitude")
+
+class WeatherBatchIn(BaseModel):
+    cities: List[str] = Field([], description="Noms de villes", examples=[["Paris", "Lyon"]])
+    coords: List[Coordinates] = Field([], description="Coordonnées GPS")
+
+class WeatherBatchItem(BaseModel):
+    query: str = Field(..., description="Ville ou coordonnées demandées (après dédoublonnage)")
+    ok: bool = Field(..., description="Recherche réussie")
+    weather: Optional[CurrentWeatherOut] = Field(None, description="Météo actuelle si ok")
+    status_code: Optional[int] = Field(None, description="Code d'erreur si échec")
+    error: Optional[str] = Field(None, description="Message d'erreur si échec")
+
+class WeatherBatchOut(BaseModel):
+    count: int = Field(..., description="Nombre de recherches distinctes")
+    errors: int = Field(..., description="Nombre de recherches en échec")
+    results: List[WeatherBatchItem] = Field(..., description="Résultats par ville/coordonnées")
+
+class CitySuggestion(BaseModel):
+    id: str = Field(..., description="Identifiant canonique de la ville (pays:nom)")
+    name: str = Field(..., description="Nom de la ville")
+    country: str = Field(..., description="Code du pays")
+    lat: float = Field(..., description="Latitude")
+    lon: float = Field(..., description="Longitude")
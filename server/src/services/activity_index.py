@@ -0,0 +1,409 @@
+# services/activity_index.py
+import bisect
+import heapq
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Callable, Container, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from server.src.core.config import RECOMMENDATION_INDEX_CHECK_INTERVAL
+from server.src.models.activity_model import Activity, activity_category, activity_tag
+
+logger = logging.getLogger(__name__)
+
+_INF = float("inf")
+
+
+def _enum_value(value: Any) -> Optional[str]:
+    return getattr(value, "value", value)
+
+
+class ActivityFeatures(NamedTuple):
+    """Colonnes d'une activité utiles au filtrage des recommandations"""
+    id: int
+    created_at: float             # timestamp, pour l'ordre "plus récentes d'abord"
+    is_outdoor: Optional[bool]
+    location_type: Optional[str]
+    weather_conditions: Optional[str]
+    temp_min: Optional[float]     # None (ou 0, comme le filtre historique) : pas de borne
+    temp_max: Optional[float]
+    min_age: Optional[int]
+    max_age: Optional[int]
+    intensity: Optional[str]
+    labels: Tuple[Tuple[str, int], ...]  # ("category", id) / ("tag", id), pour l'affinité
+
+    @classmethod
+    def from_row(cls, row: Any, labels: Iterable[Tuple[str, int]] = ()) -> "ActivityFeatures":
+        """Depuis une activité ORM ou une ligne de la requête de chargement (mêmes attributs)"""
+        created_at = row.created_at.timestamp() if isinstance(row.created_at, datetime) else 0.0
+        return cls(
+            row.id,
+            created_at,
+            row.is_outdoor,
+            _enum_value(row.location_type),
+            _enum_value(row.weather_conditions),
+            row.ideal_temperature_min or None,
+            row.ideal_temperature_max or None,
+            row.min_age,
+            row.max_age,
+            _enum_value(row.intensity),
+            tuple(sorted(labels)),
+        )
+
+    @property
+    def weather_key(self) -> Tuple[Any, ...]:
+        """Caractéristiques dont dépend la partie météo du score"""
+        return (self.is_outdoor, self.weather_conditions, self.temp_min, self.temp_max, self.intensity)
+
+
+# Colonnes lues pour (re)construire l'index, sans hydrater les objets ni leurs relations
+_INDEX_COLUMNS = (
+    Activity.id,
+    Activity.created_at,
+    Activity.is_outdoor,
+    Activity.location_type,
+    Activity.weather_conditions,
+    Activity.ideal_temperature_min,
+    Activity.ideal_temperature_max,
+    Activity.min_age,
+    Activity.max_age,
+    Activity.intensity,
+)
+
+
+class _Endpoints:
+    """Bornes triées (valeur, id) d'un intervalle par activité ; les ids sans borne à part"""
+
+    def __init__(self):
+        self.values: List[Tuple[float, int]] = []
+        self.unbounded: Set[int] = set()
+
+    def add(self, activity_id: int, value: Optional[float]) -> None:
+        if value is None:
+            self.unbounded.add(activity_id)
+        else:
+            bisect.insort(self.values, (value, activity_id))
+
+    def remove(self, activity_id: int, value: Optional[float]) -> None:
+        if value is None:
+            self.unbounded.discard(activity_id)
+            return
+        i = bisect.bisect_left(self.values, (value, activity_id))
+        if i < len(self.values) and self.values[i] == (value, activity_id):
+            del self.values[i]
+
+    def at_most(self, x: float, include_unbounded: bool = True) -> Set[int]:
+        """Ids dont la borne est <= x"""
+        ids = {i for _, i in self.values[:bisect.bisect_right(self.values, (x, _INF))]}
+        return ids | self.unbounded if include_unbounded else ids
+
+    def at_least(self, x: float, include_unbounded: bool = True) -> Set[int]:
+        """Ids dont la borne est >= x"""
+        ids = {i for _, i in self.values[bisect.bisect_left(self.values, (x, -_INF)):]}
+        return ids | self.unbounded if include_unbounded else ids
+
+    def count_at_most(self, x: float, include_unbounded: bool = True) -> int:
+        """Taille de at_most(x), par dichotomie et sans construire l'ensemble"""
+        return bisect.bisect_right(self.values, (x, _INF)) + (len(self.unbounded) if include_unbounded else 0)
+
+    def count_at_least(self, x: float, include_unbounded: bool = True) -> int:
+        """Taille de at_least(x), par dichotomie et sans construire l'ensemble"""
+        count = len(self.values) - bisect.bisect_left(self.values, (x, -_INF))
+        return count + (len(self.unbounded) if include_unbounded else 0)
+
+
+def _accepts(
+    f: ActivityFeatures,
+    temp: Optional[float],
+    age: Optional[int],
+    is_outdoor: Optional[bool],
+    exclude_outdoor: bool,
+    location_type: Optional[str],
+    weather_condition: Optional[str],
+) -> bool:
+    """Critères de match() vérifiés sur une activité"""
+    if is_outdoor is not None and f.is_outdoor != is_outdoor:
+        return False
+    if exclude_outdoor and f.is_outdoor is True:
+        return False
+    if location_type is not None and f.location_type != location_type:
+        return False
+    if weather_condition is not None and f.weather_conditions != weather_condition:
+        return False
+    if age is not None and (f.min_age is None or f.min_age > age or (f.max_age is not None and f.max_age < age)):
+        return False
+    if temp is not None and ((f.temp_min is not None and f.temp_min > temp) or (f.temp_max is not None and f.temp_max < temp)):
+        return False
+    return True
+
+
+class ActivityIndex:
+    """
+    Index en mémoire du catalogue d'activités pour les recommandations :
+    bornes de température et d'âge triées, ensembles par is_outdoor, location_type
+    et weather_conditions. Un filtrage devient quelques intersections d'ensembles ;
+    seules les activités retenues sont ensuite chargées avec leurs relations.
+
+    Pour le score, chaque activité a aussi un code de combinaison météo (weather_rows) et un
+    code de catégories/tags (label_rows) : un score est calculé par combinaison distincte,
+    et les ids sont groupés par code météo pour une sélection top-k par bornes.
+
+    Mis à jour par activity_service à chaque création/modification/suppression.
+    La signature (nombre d'activités, dernier updated_at) est comparée à la base au plus
+    une fois par `check_interval` secondes : une modification faite par un autre process
+    provoque une reconstruction, avec ce délai au plus.
+    """
+
+    def __init__(self, check_interval: float = RECOMMENDATION_INDEX_CHECK_INTERVAL):
+        self._lock = threading.RLock()
+        self._entries: Dict[int, ActivityFeatures] = {}
+        self._signature: Optional[Tuple[int, Optional[datetime]]] = None
+        self.check_interval = check_interval
+        self._checked_at = 0.0
+        # Incrémentée à chaque changement du contenu (instantanés de recommandations)
+        self.version = 0
+        self._reset()
+
+        # Compteurs
+        self.rebuilds = 0
+        self.updates = 0
+
+    def _reset(self) -> None:
+        self._entries = {}
+        self._temp_min = _Endpoints()
+        self._temp_max = _Endpoints()
+        self._age_min = _Endpoints()
+        self._age_max = _Endpoints()
+        self._by_outdoor: Dict[Optional[bool], Set[int]] = defaultdict(set)
+        self._by_location: Dict[Optional[str], Set[int]] = defaultdict(set)
+        self._by_condition: Dict[Optional[str], Set[int]] = defaultdict(set)
+        # Matrice de caractéristiques, par combinaisons distinctes
+        self.weather_rows: List[Tuple[Any, ...]] = []
+        self.label_rows: List[Tuple[Tuple[str, int], ...]] = []
+        self._weather_codes: Dict[Tuple[Any, ...], int] = {}
+        self._label_codes: Dict[Tuple[Tuple[str, int], ...], int] = {}
+        self.label_code: Dict[int, int] = {}
+        self.by_weather_code: Dict[int, Set[int]] = defaultdict(set)
+        self.version += 1
+
+    @staticmethod
+    def _intern(row: Tuple[Any, ...], rows: List[Tuple[Any, ...]], codes: Dict[Tuple[Any, ...], int]) -> int:
+        code = codes.get(row)
+        if code is None:
+            code = codes[row] = len(rows)
+            rows.append(row)
+        return code
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def lock(self) -> threading.RLock:
+        """Verrou de l'index : lectures cohérentes des codes et des matrices (weather_rows, label_rows)"""
+        return self._lock
+
+    @staticmethod
+    def _db_signature(db: Session) -> Tuple[int, Optional[datetime]]:
+        count, last_update = db.query(func.count(Activity.id), func.max(Activity.updated_at)).one()
+        return count, last_update
+
+    def ensure_fresh(self, db: Session) -> None:
+        """
+        Reconstruit l'index si la base a changé depuis la dernière mise à jour connue ;
+        sans requête si la dernière vérification date de moins de check_interval secondes
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._signature is not None and now - self._checked_at < self.check_interval:
+                return
+        signature = self._db_signature(db)
+        with self._lock:
+            self._checked_at = now
+            if signature == self._signature:
+                return
+        self.rebuild(db, signature)
+
+    def rebuild(self, db: Session, signature: Optional[Tuple[int, Optional[datetime]]] = None) -> None:
+        rows = db.query(*_INDEX_COLUMNS).all()
+        labels: Dict[int, List[Tuple[str, int]]] = defaultdict(list)
+        for activity_id, category_id in db.query(activity_category.c.activity_id, activity_category.c.category_id):
+            labels[activity_id].append(("category", category_id))
+        for activity_id, tag_id in db.query(activity_tag.c.activity_id, activity_tag.c.tag_id):
+            labels[activity_id].append(("tag", tag_id))
+        with self._lock:
+            self._reset()
+            for row in rows:
+                self._insert(ActivityFeatures.from_row(row, labels.get(row.id, ())))
+            self._signature = signature or self._db_signature(db)
+            self.rebuilds += 1
+        logger.info(f"Index des activités reconstruit ({len(rows)} activités)")
+
+    def _insert(self, features: ActivityFeatures) -> None:
+        i = features.id
+        self._entries[i] = features
+        self._temp_min.add(i, features.temp_min)
+        self._temp_max.add(i, features.temp_max)
+        if features.min_age is not None:  # comme en SQL : min_age NULL exclut l'activité
+            self._age_min.add(i, features.min_age)
+        self._age_max.add(i, features.max_age)
+        self._by_outdoor[features.is_outdoor].add(i)
+        self._by_location[features.location_type].add(i)
+        self._by_condition[features.weather_conditions].add(i)
+        self.by_weather_code[self._intern(features.weather_key, self.weather_rows, self._weather_codes)].add(i)
+        self.label_code[i] = self._intern(features.labels, self.label_rows, self._label_codes)
+        self.version += 1
+
+    def _remove(self, activity_id: int) -> Optional[ActivityFeatures]:
+        features = self._entries.pop(activity_id, None)
+        if features is None:
+            return None
+        self._temp_min.remove(activity_id, features.temp_min)
+        self._temp_max.remove(activity_id, features.temp_max)
+        if features.min_age is not None:
+            self._age_min.remove(activity_id, features.min_age)
+        self._age_max.remove(activity_id, features.max_age)
+        self._by_outdoor[features.is_outdoor].discard(activity_id)
+        self._by_location[features.location_type].discard(activity_id)
+        self._by_condition[features.weather_conditions].discard(activity_id)
+        self.by_weather_code[self._weather_codes[features.weather_key]].discard(activity_id)
+        self.label_code.pop(activity_id, None)
+        self.version += 1
+        return features
+
+    def upsert(self, activity: Activity) -> None:
+        """Activité créée ou modifiée (après commit)"""
+        with self._lock:
+            if self._signature is None:
+                return  # pas encore construit : le premier usage chargera tout
+            self._remove(activity.id)
+            labels = [("category", c.id) for c in activity.categories] + [("tag", t.id) for t in activity.tags]
+            self._insert(ActivityFeatures.from_row(activity, labels))
+            count, last_update = self._signature
+            if activity.updated_at is not None and (last_update is None or activity.updated_at > last_update):
+                last_update = activity.updated_at
+            self._signature = (len(self._entries), last_update)
+            self.updates += 1
+
+    def remove(self, activity_id: int) -> None:
+        """Activité supprimée (après commit)"""
+        with self._lock:
+            if self._signature is None or self._remove(activity_id) is None:
+                return
+            self._signature = (len(self._entries), self._signature[1])
+            self.updates += 1
+
+    def match(
+        self,
+        temp: Optional[float] = None,
+        age: Optional[int] = None,
+        is_outdoor: Optional[bool] = None,
+        exclude_outdoor: bool = False,
+        location_type: Optional[str] = None,
+        weather_condition: Optional[str] = None,
+    ) -> Set[int]:
+        """
+        Ids des activités compatibles, avec la même sémantique que l'ancien filtrage :
+        température dans [min, max] (borne absente ou nulle ignorée), âge dans [min_age, max_age]
+        (min_age requis), is_outdoor exact, activités d'extérieur exclues (pluie/neige).
+        Le parcours part du plus petit ensemble de candidats (ensembles par valeur, ou bornes
+        triées dont la taille est connue par dichotomie) ; les autres critères sont vérifiés
+        sur les caractéristiques de ces seuls candidats, sans copie du catalogue.
+        """
+        with self._lock:
+            entries = self._entries
+            sources = []  # (taille, candidats)
+            for value, groups in (
+                (is_outdoor, self._by_outdoor),
+                (location_type, self._by_location),
+                (weather_condition, self._by_condition),
+            ):
+                if value is not None:
+                    group = groups.get(value, set())
+                    sources.append((len(group), lambda group=group: group))
+            if age is not None:
+                sources.append((self._age_min.count_at_most(age, include_unbounded=False),
+                                lambda: self._age_min.at_most(age, include_unbounded=False)))
+                sources.append((self._age_max.count_at_least(age), lambda: self._age_max.at_least(age)))
+            if temp is not None:
+                sources.append((self._temp_min.count_at_most(temp), lambda: self._temp_min.at_most(temp)))
+                sources.append((self._temp_max.count_at_least(temp), lambda: self._temp_max.at_least(temp)))
+            if not sources:
+                ids = set(entries)
+                if exclude_outdoor:
+                    ids -= self._by_outdoor.get(True, set())
+                return ids
+
+            _, smallest = min(sources, key=lambda source: source[0])
+            return {
+                i for i in smallest()
+                if _accepts(entries[i], temp, age, is_outdoor, exclude_outdoor, location_type, weather_condition)
+            }
+
+    def features(self, activity_id: int) -> Optional[ActivityFeatures]:
+        return self._entries.get(activity_id)
+
+    def top_k(
+        self,
+        candidates: Set[int],
+        k: int,
+        weather_scores: Callable[[], Sequence[Optional[float]]],
+        label_scores: Callable[[], Sequence[float]],
+        exclude: Container[int] = (),
+    ) -> List[Tuple[float, int]]:
+        """
+        Les k meilleurs (score, id) parmi `candidates` hors `exclude`, score = score de la
+        combinaison météo (None : combinaison exclue) + score des catégories/tags ;
+        à égalité, les plus récentes d'abord.
+        weather_scores / label_scores renvoient un score par ligne de weather_rows / label_rows ;
+        elles sont appelées sous le verrou, pour que les codes lus ensuite y correspondent
+        même si un upsert concurrent ajoute une combinaison.
+        Les groupes de même code météo sont parcourus du meilleur au moins bon et le parcours
+        s'arrête dès qu'aucun groupe restant ne peut entrer dans le top-k.
+        """
+        if k <= 0 or not candidates:
+            return []
+        heap: List[Tuple[float, float, int]] = []
+        with self._lock:
+            weather_scores, label_scores = weather_scores(), label_scores()
+            best_label = max(label_scores, default=0.0)
+            entries, label_code = self._entries, self.label_code
+            groups = sorted(
+                ((weather_scores[code], ids) for code, ids in self.by_weather_code.items()
+                 if ids and weather_scores[code] is not None),
+                key=lambda group: -group[0],
+            )
+            for weather_score, ids in groups:
+                if len(heap) == k and weather_score + best_label < heap[0][0]:
+                    break
+                small, large = (ids, candidates) if len(ids) <= len(candidates) else (candidates, ids)
+                for i in small:
+                    if i not in large or i in exclude:
+                        continue
+                    item = (weather_score + label_scores[label_code[i]], entries[i].created_at, i)
+                    if len(heap) < k:
+                        heapq.heappush(heap, item)
+                    elif item > heap[0]:
+                        heapq.heapreplace(heap, item)
+        return [(score, i) for score, _, i in sorted(heap, reverse=True)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "activities": len(self._entries),
+                "rebuilds": self.rebuilds,
+                "updates": self.updates,
+                "version": self.version,
+            }
+
+
+_activity_index = ActivityIndex()
+
+
+def get_activity_index() -> ActivityIndex:
+    """Index partagé du process"""
+    return _activity_index
@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
 from server.src.models.activity_model import Activity, Category, Tag
 from server.src.schemas.activity_schema import ActivityCreate
+from server.src.services.activity_index import get_activity_index
 from typing import List
 
 def get_activities(db: Session) -> List[Activity]:
@@ -36,6 +37,18 @@ def create_activity(db: Session, activity: ActivityCreate) -> Activity:
     db.add(db_activity)
     db.commit()
     db.refresh(db_activity)
+    get_activity_index().upsert(db_activity)
+    return db_activity
+
+def update_activity(db: Session, activity_id: int, activity: ActivityCreate) -> Activity:
+    db_activity = db.query(Activity).filter(Activity.id == activity_id).first()
+    if not db_activity:
+        return None
+    for field, value in activity.dict(exclude_unset=True).items():
+        setattr(db_activity, field, value)
+    db.commit()
+    db.refresh(db_activity)
+    get_activity_index().upsert(db_activity)
     return db_activity
 
 def delete_activity(db: Session, activity_id: int):
@@ -43,4 +56,5 @@ def delete_activity(db: Session, activity_id: int):
     if db_activity:
         db.delete(db_activity)
         db.commit()
+        get_activity_index().remove(activity_id)
     return db_activity
@@ -0,0 +1,59 @@
+# services/adaptive_timeout.py
+import math
+import threading
+from collections import deque
+from typing import Any, Dict, List
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentile par rang le plus proche d'une liste déjà triée (non vide)"""
+    rank = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+class AdaptiveTimeout:
+    """
+    Timeout déduit des latences observées : `multiplier` x le percentile `pct` des
+    `window` dernières réponses, borné par [min_timeout, max_timeout].
+    Tant qu'il y a moins de `min_samples` mesures, max_timeout est utilisé.
+    """
+
+    def __init__(
+        self,
+        min_timeout: float = 1.0,
+        max_timeout: float = 15.0,
+        pct: float = 99.0,
+        multiplier: float = 2.0,
+        window: int = 200,
+        min_samples: int = 20,
+    ):
+        if not 0 < min_timeout <= max_timeout:
+            raise ValueError("il faut 0 < min_timeout <= max_timeout")
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.pct = pct
+        self.multiplier = multiplier
+        self.min_samples = min_samples
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._timeout = max_timeout
+
+    def observe(self, latency: float) -> None:
+        """Enregistre la durée d'une réponse reçue (les timeouts ne sont pas des mesures)"""
+        with self._lock:
+            self._samples.append(latency)
+            if len(self._samples) >= self.min_samples:
+                target = percentile(sorted(self._samples), self.pct) * self.multiplier
+                self._timeout = min(self.max_timeout, max(self.min_timeout, target))
+
+    def timeout(self) -> float:
+        return self._timeout
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = sorted(self._samples)
+        result: Dict[str, Any] = {"samples": len(samples), "timeout": round(self._timeout, 3)}
+        if samples:
+            for pct in (50, 95, 99):
+                result[f"p{pct}"] = round(percentile(samples, pct), 3)
+        return result
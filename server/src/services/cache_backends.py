@@ -0,0 +1,298 @@
+# services/cache_backends.py
+import json
+import logging
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, Union
+
+from server.src.services.weather_cache import CacheEntry, TTLCache
+
+try:
+    import redis  # dépendance optionnelle : WEATHER_CACHE_BACKEND=redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# En-tête binaire d'une valeur partagée : stored_at, expires_at (timestamps Unix)
+_HEADER = struct.Struct("!dd")
+
+
+def encode_value(value: Any, stored_at: float, expires_at: float) -> bytes:
+    """JSON compact compressé, précédé des dates de mise en cache et d'expiration"""
+    payload = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return _HEADER.pack(stored_at, expires_at) + zlib.compress(payload, 1)
+
+
+def decode_value(blob: bytes) -> Tuple[float, float, Any]:
+    stored_at, expires_at = _HEADER.unpack_from(blob)
+    return stored_at, expires_at, json.loads(zlib.decompress(blob[_HEADER.size:]))
+
+
+def encode_key(key: Hashable) -> str:
+    """("weather", "city", "paris") -> "weather:city:paris" """
+    if isinstance(key, tuple):
+        return ":".join(str(part) for part in key)
+    return str(key)
+
+
+class SQLiteStore:
+    """
+    Stockage clé -> octets dans un fichier SQLite local (mode WAL), partagé
+    par tous les workers d'une même machine.
+    """
+
+    def __init__(self, path: str, max_size: int = 1024):
+        self.path = path
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS weather_cache ("
+            " key TEXT PRIMARY KEY, purge_at REAL NOT NULL, value BLOB NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_weather_cache_purge_at ON weather_cache (purge_at)")
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM weather_cache WHERE key = ? AND purge_at > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, purge_after: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO weather_cache (key, purge_at, value) VALUES (?, ?, ?)",
+                (key, now + purge_after, value),
+            )
+            # Ménage : entrées hors délai, puis les plus proches de la purge si la table est pleine
+            self._conn.execute("DELETE FROM weather_cache WHERE purge_at <= ?", (now,))
+            self._conn.execute(
+                "DELETE FROM weather_cache WHERE key IN ("
+                " SELECT key FROM weather_cache ORDER BY purge_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_size,),
+            )
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM weather_cache WHERE key = ?", (key,))
+
+    def clear(self, prefix: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM weather_cache WHERE key LIKE ? ESCAPE '\\'",
+                               (prefix.replace("%", "\\%").replace("_", "\\_") + "%",))
+
+    def count(self, prefix: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM weather_cache WHERE key LIKE ? ESCAPE '\\' AND purge_at > ?",
+                (prefix.replace("%", "\\%").replace("_", "\\_") + "%", time.time()),
+            ).fetchone()
+        return row[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class RedisStore:
+    """
+    Stockage clé -> octets sur un serveur parlant le protocole Redis.
+    `client` : tout objet exposant get/set(px=)/delete/scan_iter (redis.Redis ou équivalent).
+    L'expiration est confiée au serveur (PX) ; l'éviction dépend de sa politique maxmemory.
+    """
+
+    def __init__(self, client: Any):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisStore":
+        if redis is None:
+            raise RuntimeError("Le paquet redis est requis pour WEATHER_CACHE_BACKEND=redis")
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes, purge_after: float) -> None:
+        self.client.set(key, value, px=max(1, int(purge_after * 1000)))
+
+    def delete(self, key: str) -> None:
+        self.client.delete(key)
+
+    def clear(self, prefix: str) -> None:
+        keys = list(self.client.scan_iter(match=f"{prefix}*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def count(self, prefix: str) -> int:
+        return sum(1 for _ in self.client.scan_iter(match=f"{prefix}*"))
+
+    def close(self) -> None:
+        close = getattr(self.client, "close", None)
+        if close is not None:
+            close()
+
+
+class SharedTTLCache:
+    """
+    Même interface que TTLCache, mais les valeurs (dicts JSON) sont sérialisées dans
+    un stockage partagé entre processus (SQLiteStore, RedisStore). Les dates sont des
+    timestamps Unix pour être comparables d'un worker à l'autre. Chaque lecture
+    renvoie une copie désérialisée ; les compteurs sont propres au process.
+    """
+
+    def __init__(
+        self,
+        store: Any,
+        namespace: str,
+        max_size: int = 1024,
+        ttl: float = 600.0,
+        clock: Callable[[], float] = time.time,
+        stale_ttl: float = 0.0,
+    ):
+        if ttl <= 0:
+            raise ValueError("ttl doit être strictement positif")
+        if stale_ttl < 0:
+            raise ValueError("stale_ttl doit être positif ou nul")
+        self.store = store
+        self.prefix = f"{namespace}:"
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        # Compteurs
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _read(self, key: Hashable) -> Optional[Tuple[float, float, Any]]:
+        try:
+            blob = self.store.get(self.prefix + encode_key(key))
+            if blob is None:
+                return None
+            entry = decode_value(blob)
+        except Exception as e:
+            # Un cache partagé indisponible ne doit pas bloquer la météo
+            self.errors += 1
+            logger.warning(f"Lecture du cache partagé impossible ({key}): {e}")
+            return None
+        if entry[1] + self.stale_ttl <= self._clock():
+            return None
+        return entry
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._read(key)
+        if entry is None or entry[1] <= self._clock():
+            self._count("misses")
+            return None
+        self._count("hits")
+        return entry[2]
+
+    def get_entry(self, key: Hashable) -> Optional[CacheEntry]:
+        entry = self.peek_entry(key)
+        if entry is None:
+            self._count("misses")
+        else:
+            self._count("hits" if entry.fresh else "stale_hits")
+        return entry
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        entry = self._read(key)
+        if entry is None or entry[1] <= self._clock():
+            return None
+        return entry[2]
+
+    def peek_entry(self, key: Hashable) -> Optional[CacheEntry]:
+        entry = self._read(key)
+        if entry is None:
+            return None
+        now = self._clock()
+        stored_at, expires_at, value = entry
+        return CacheEntry(value, now - stored_at, expires_at - now, stored_at)
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        now = self._clock()
+        ttl = ttl if ttl is not None else self.ttl
+        try:
+            self.store.set(
+                self.prefix + encode_key(key), encode_value(value, now, now + ttl), ttl + self.stale_ttl
+            )
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Écriture dans le cache partagé impossible ({key}): {e}")
+
+    def delete(self, key: Hashable) -> None:
+        self.store.delete(self.prefix + encode_key(key))
+
+    def clear(self) -> None:
+        self.store.clear(self.prefix)
+
+    def __len__(self) -> int:
+        try:
+            return self.store.count(self.prefix)
+        except Exception:
+            return 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            stats = {
+                "backend": type(self.store).__name__,
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "stale_ttl": self.stale_ttl,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+        stats["size"] = len(self)
+        return stats
+
+
+WeatherCache = Union[TTLCache, SharedTTLCache]
+
+
+def create_cache(
+    backend: str,
+    namespace: str,
+    max_size: int,
+    ttl: float,
+    stale_ttl: float,
+    store: Any = None,
+) -> WeatherCache:
+    """
+    Cache de réponses brutes selon WEATHER_CACHE_BACKEND :
+    "memory" (TTLCache, propre au process), "sqlite" ou "redis" (partagés entre workers).
+    `store` : stockage déjà ouvert, à réutiliser entre les caches d'un même service.
+    """
+    if backend == "memory":
+        return TTLCache(max_size=max_size, ttl=ttl, stale_ttl=stale_ttl)
+    if backend in ("sqlite", "redis"):
+        return SharedTTLCache(store, namespace, max_size=max_size, ttl=ttl, stale_ttl=stale_ttl)
+    raise ValueError(f"Backend de cache inconnu : {backend}")
+
+
+def create_store(backend: str, sqlite_path: str, redis_url: str, max_size: int = 1024):
+    """Stockage partagé correspondant au backend (None pour le cache mémoire)"""
+    if backend == "sqlite":
+        return SQLiteStore(sqlite_path, max_size=max_size)
+    if backend == "redis":
+        return RedisStore.from_url(redis_url)
+    return None
@@ -0,0 +1,115 @@
+# services/circuit_breaker.py
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Levée quand le disjoncteur est ouvert : l'appel vers l'API n'est pas tenté"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Circuit ouvert, nouvel essai dans {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur à trois états :
+    - closed : les appels passent, les échecs consécutifs sont comptés ;
+    - open : après `failure_threshold` échecs, les appels sont refusés pendant `cooldown` secondes ;
+    - half_open : passé ce délai, `half_open_max_calls` appels d'essai sont autorisés.
+      Un succès referme le circuit, un échec le rouvre pour un nouveau cooldown.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        cooldown: float = 30.0,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if failure_threshold <= 0:
+            raise ValueError("failure_threshold doit être strictement positif")
+        if half_open_max_calls <= 0:
+            raise ValueError("half_open_max_calls doit être strictement positif")
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probes = 0  # appels d'essai en cours (half_open)
+
+        # Compteurs
+        self.opens = 0
+        self.rejected = 0
+        self.transitions: Counter = Counter()  # "closed->open" -> nombre
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state(self._clock())
+
+    def _state(self, now: float) -> str:
+        if self._opened_at is None:
+            return CLOSED
+        return OPEN if now < self._opened_at + self.cooldown else HALF_OPEN
+
+    def _transition(self, before: str, after: str) -> None:
+        if before != after:
+            self.transitions[f"{before}->{after}"] += 1
+
+    def before_call(self) -> None:
+        """Lève CircuitOpenError si le circuit est ouvert ou si l'essai half_open est déjà en cours"""
+        with self._lock:
+            now = self._clock()
+            state = self._state(now)
+            if state == OPEN:
+                self.rejected += 1
+                raise CircuitOpenError(self._opened_at + self.cooldown - now)
+            if state == HALF_OPEN:
+                if self._probes >= self.half_open_max_calls:
+                    self.rejected += 1
+                    raise CircuitOpenError(0)
+                if self._probes == 0:
+                    self._transition(OPEN, HALF_OPEN)
+                self._probes += 1
+
+    def release(self) -> None:
+        """Libère un essai half_open interrompu sans résultat (annulation)"""
+        with self._lock:
+            self._probes = max(0, self._probes - 1)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._transition(self._state(self._clock()), CLOSED)
+            self._failures = 0
+            self._opened_at = None
+            self._probes = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            now = self._clock()
+            state = self._state(now)
+            self._failures += 1
+            if state == HALF_OPEN or (state == CLOSED and self._failures >= self.failure_threshold):
+                self._transition(state, OPEN)
+                self._opened_at = now
+                self._probes = 0
+                self.opens += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._state(self._clock()),
+                "consecutive_failures": self._failures,
+                "opens": self.opens,
+                "rejected": self.rejected,
+                "transitions": dict(self.transitions),
+            }
@@ -0,0 +1,67 @@
+# services/city_index.py
+import json
+import logging
+import os
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CityIdIndex:
+    """
+    Index local nom de ville normalisé -> ID de ville OpenWeatherMap.
+    Alimenté par les réponses /weather (champ "id") et persisté dans un fichier JSON,
+    il permet de regrouper les recherches dans des appels /group.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        if path:
+            self.load()
+
+    def load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Index des villes illisible ({self.path}): {e}")
+            return
+        with self._lock:
+            self._ids.update({name: int(city_id) for name, city_id in data.items()})
+
+    def save(self) -> None:
+        """Écrit l'index s'il a changé (écriture atomique via un fichier temporaire)"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = dict(self._ids)
+            self._dirty = False
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Impossible d'enregistrer l'index des villes ({self.path}): {e}")
+
+    def get(self, name: str) -> Optional[int]:
+        return self._ids.get(name)
+
+    def learn(self, name: str, city_id: Optional[int]) -> None:
+        if not city_id:
+            return
+        with self._lock:
+            if self._ids.get(name) != city_id:
+                self._ids[name] = int(city_id)
+                self._dirty = True
+
+    def __len__(self) -> int:
+        return len(self._ids)
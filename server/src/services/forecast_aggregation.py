@@ -0,0 +1,276 @@
+# services/forecast_aggregation.py
+from array import array
+from collections import Counter
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from server.src.services.json_stream import JsonArrayStream
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_SECONDS_PER_DAY = 86400
+
+# Colonnes d'un créneau, dans l'ordre du format compact (to_payload)
+_COLUMNS = ("dt", "temp", "feels_like", "humidity", "pressure", "wind_speed", "pop",
+            "condition", "description", "icon", "sunrise", "sunset")
+
+# Colonnes exposées par créneau (séries horaires) : valeurs numériques interpolées, libellés non
+NUMERIC_FIELDS = ("temp", "feels_like", "humidity", "pressure", "wind_speed", "pop")
+LABEL_FIELDS = ("condition", "description", "icon")
+SERIES_FIELDS = NUMERIC_FIELDS + LABEL_FIELDS
+
+
+def _timestamp(item: Dict[str, Any]) -> Optional[int]:
+    """Horodatage UTC d'un créneau : champ "dt", sinon "dt_txt" (UTC, "YYYY-MM-DD HH:MM:SS")"""
+    dt = item.get("dt")
+    if isinstance(dt, (int, float)):
+        return int(dt)
+    dt_txt = item.get("dt_txt")
+    if not dt_txt:
+        return None
+    try:
+        return int(datetime.fromisoformat(dt_txt).replace(tzinfo=timezone.utc).timestamp())
+    except ValueError:
+        return None
+
+
+class ForecastColumns:
+    """
+    Prévisions 3h stockées par colonnes (array typés) pour les agrégations par jour.
+    Les chaînes (condition, description, icône) sont codées en entiers via un dictionnaire.
+    Les jours sont des jours locaux de la ville (décalage `timezone` d'OpenWeatherMap, en secondes),
+    calculés à l'agrégation : l'objet "city" peut arriver après la liste (lecture en flux).
+    """
+
+    def __init__(self, tz_offset: int = 0, city: Optional[Dict[str, Any]] = None):
+        self.tz_offset = tz_offset
+        self.city: Dict[str, Any] = city or {}
+        self.dt = array("q")          # horodatage UTC du créneau
+        self.temp = array("d")
+        self.feels_like = array("d")
+        self.humidity = array("d")
+        self.pressure = array("d")
+        self.wind_speed = array("d")
+        self.pop = array("d")
+        self.condition = array("l")
+        self.description = array("l")
+        self.icon = array("l")
+        self.sunrise = array("q")
+        self.sunset = array("q")
+        self._codes: Dict[str, int] = {}
+        self._labels: List[str] = []
+
+    @classmethod
+    def from_items(cls, items: Iterable[Dict[str, Any]], tz_offset: int = 0) -> "ForecastColumns":
+        columns = cls(tz_offset)
+        for item in items:
+            columns.add(item)
+        return columns
+
+    @classmethod
+    def from_payload(cls, data: Dict[str, Any]) -> "ForecastColumns":
+        """Depuis le format compact (to_payload) ou une réponse /forecast brute ("list")"""
+        city = data.get("city") or {}
+        columns = cls(city.get("timezone") or 0, city)
+        stored = data.get("columns")
+        if stored is None:
+            for item in data.get("list") or []:
+                columns.add(item)
+            return columns
+        for name in _COLUMNS:
+            getattr(columns, name).extend(stored[name])
+        columns._labels = list(data.get("labels") or [])
+        columns._codes = {label: code for code, label in enumerate(columns._labels)}
+        return columns
+
+    def set_city(self, city: Dict[str, Any]) -> None:
+        """En-tête "city" d'OpenWeatherMap : fixe aussi le fuseau des jours"""
+        self.city = city or {}
+        self.tz_offset = self.city.get("timezone") or 0
+
+    def to_payload(self) -> Dict[str, Any]:
+        """Format compact sérialisable en JSON (listes par colonne) pour le cache"""
+        return {
+            "city": self.city,
+            "cnt": len(self),
+            "columns": {name: getattr(self, name).tolist() for name in _COLUMNS},
+            "labels": list(self._labels),
+        }
+
+    def __len__(self) -> int:
+        return len(self.dt)
+
+    def _code(self, label: str) -> int:
+        code = self._codes.get(label)
+        if code is None:
+            code = self._codes[label] = len(self._labels)
+            self._labels.append(label)
+        return code
+
+    def add(self, item: Dict[str, Any]) -> None:
+        """Ajoute un créneau de la liste "list" d'OpenWeatherMap (ignoré s'il n'est pas daté)"""
+        timestamp = _timestamp(item)
+        if timestamp is None:
+            return
+        main_data = item.get("main") or {}
+        weather_data = (item.get("weather") or [{}])[0]
+        wind_data = item.get("wind") or {}
+        sys_data = item.get("sys") or {}
+
+        self.dt.append(timestamp)
+        self.temp.append(main_data.get("temp", 0))
+        self.feels_like.append(main_data.get("feels_like", 0))
+        self.humidity.append(main_data.get("humidity", 0))
+        self.pressure.append(main_data.get("pressure", 0))
+        self.wind_speed.append(wind_data.get("speed", 0))
+        self.pop.append(item.get("pop", 0))
+        self.condition.append(self._code(weather_data.get("main", "Clear")))
+        self.description.append(self._code(weather_data.get("description", "")))
+        self.icon.append(self._code(weather_data.get("icon", "")))
+        self.sunrise.append(sys_data.get("sunrise", 0))
+        self.sunset.append(sys_data.get("sunset", 0))
+
+    def _days(self) -> array:
+        """Jour local (depuis le 01/01/1970) de chaque créneau"""
+        offset = self.tz_offset
+        return array("l", ((t + offset) // _SECONDS_PER_DAY for t in self.dt))
+
+    def _day_ranges(self, days: array, max_days: int) -> List[range]:
+        """Lignes de chaque jour, dans l'ordre chronologique"""
+        ranges = []
+        start = 0
+        for i in range(1, len(days) + 1):
+            if i == len(days) or days[i] != days[start]:
+                ranges.append(range(start, i))
+                if len(ranges) == max_days:
+                    break
+                start = i
+        return ranges
+
+    def _sort(self) -> None:
+        """Remet les créneaux dans l'ordre chronologique (seulement si la liste est désordonnée)"""
+        dt = self.dt
+        if all(dt[i] <= dt[i + 1] for i in range(len(dt) - 1)):
+            return
+        order = sorted(range(len(dt)), key=dt.__getitem__)
+        for name in _COLUMNS:
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, (column[i] for i in order)))
+
+    def _mode(self, column: array, rows: range, default: str) -> str:
+        if not rows:
+            return default
+        return self._labels[Counter(column[rows.start:rows.stop]).most_common(1)[0][0]]
+
+    def series(
+        self,
+        fields: Iterable[str] = SERIES_FIELDS,
+        step: Optional[int] = None,
+        points: Optional[int] = None,
+    ) -> Dict[str, List[Any]]:
+        """
+        Séries par créneau, colonne par colonne ("dt" toujours inclus, horodatages UTC) :
+        - `step` (secondes) : rééchantillonnage sur une grille régulière, interpolation linéaire
+          des valeurs numériques, libellé du créneau précédent ;
+        - `points` : réduction à `points` valeurs au plus, par moyenne (mode pour les libellés)
+          de tranches consécutives, datées de leur premier créneau.
+        """
+        self._sort()
+        frame: Dict[str, List[Any]] = {"dt": self.dt.tolist()}
+        for name in fields:
+            frame[name] = getattr(self, name).tolist()
+        if step:
+            frame = _resample(frame, step)
+        if points and points < len(frame["dt"]):
+            frame = _downsample(frame, points)
+        for name in LABEL_FIELDS:
+            if name in frame:
+                frame[name] = [self._labels[code] for code in frame[name]]
+        return frame
+
+    def daily(self, max_days: int) -> List[Dict[str, Any]]:
+        """Résumé des `max_days` premiers jours : moyennes, extrêmes et valeurs les plus fréquentes"""
+        self._sort()
+        days = self._days()
+        summaries = []
+        for rows in self._day_ranges(days, max_days):
+            a, b = rows.start, rows.stop
+            n = b - a
+
+            def mean(column: array) -> float:
+                return round(sum(column[a:b]) / n, 1)
+
+            temps = self.temp[a:b]
+            summaries.append({
+                "date": date.fromordinal(_EPOCH_ORDINAL + days[a]).isoformat(),
+                "condition": self._mode(self.condition, rows, "Clear"),
+                "description": self._mode(self.description, rows, "Clear"),
+                "icon": self._mode(self.icon, rows, "Clear"),
+                "temp_avg": mean(self.temp),
+                "temp_min": min(temps),
+                "temp_max": max(temps),
+                "feels_like_avg": mean(self.feels_like),
+                "humidity": round(mean(self.humidity)),
+                "pressure": round(mean(self.pressure)),
+                "wind_speed": mean(self.wind_speed),
+                "pop": round(mean(self.pop), 2),
+                # Lever/coucher de soleil : premier créneau de la journée
+                "sunrise": datetime.fromtimestamp(self.sunrise[a]),
+                "sunset": datetime.fromtimestamp(self.sunset[a]),
+            })
+        return summaries
+
+
+def _resample(frame: Dict[str, List[Any]], step: int) -> Dict[str, List[Any]]:
+    dt = frame["dt"]
+    if len(dt) < 2:
+        return frame
+    out: Dict[str, List[Any]] = {name: [] for name in frame}
+    i = 0
+    for t in range(dt[0], dt[-1] + 1, step):
+        while i < len(dt) - 2 and dt[i + 1] <= t:
+            i += 1
+        span = dt[i + 1] - dt[i]
+        frac = (t - dt[i]) / span if span else 0.0
+        out["dt"].append(t)
+        for name, column in frame.items():
+            if name in NUMERIC_FIELDS:
+                a, b = column[i], column[i + 1]
+                out[name].append(round(a + (b - a) * frac, 2))
+            elif name != "dt":
+                out[name].append(column[i + 1] if frac >= 1 else column[i])
+    return out
+
+
+def _downsample(frame: Dict[str, List[Any]], points: int) -> Dict[str, List[Any]]:
+    n = len(frame["dt"])
+    bounds = [k * n // points for k in range(points + 1)]
+    out: Dict[str, List[Any]] = {name: [] for name in frame}
+    for a, b in zip(bounds, bounds[1:]):
+        for name, column in frame.items():
+            if name == "dt":
+                out[name].append(column[a])
+            elif name in NUMERIC_FIELDS:
+                out[name].append(round(sum(column[a:b]) / (b - a), 2))
+            else:
+                out[name].append(Counter(column[a:b]).most_common(1)[0][0])
+    return out
+
+
+class ForecastStream:
+    """
+    Réponse /forecast lue en flux : chaque créneau de "list" est ajouté aux colonnes dès qu'il
+    est analysé, le document complet n'est jamais chargé. close() renvoie le format compact.
+    """
+
+    def __init__(self):
+        self._parser = JsonArrayStream("list")
+        self.columns = ForecastColumns()
+
+    def feed(self, chunk: bytes) -> None:
+        for item in self._parser.feed(chunk):
+            self.columns.add(item)
+
+    def close(self) -> Dict[str, Any]:
+        header = self._parser.close()
+        self.columns.set_city(header.get("city"))
+        return self.columns.to_payload()
@@ -0,0 +1,251 @@
+# services/gazetteer.py
+import heapq
+import logging
+import mmap
+import os
+import threading
+import unicodedata
+from array import array
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Fichier fourni avec l'application : table triée "clé\tid\tnom\tpays\tlat\tlon\tpopulation"
+BUNDLED_GAZETTEER_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "cities.tsv")
+
+
+class Place(NamedTuple):
+    id: str           # identifiant canonique "pays:nom" ("fr:saint etienne")
+    name: str         # nom d'affichage ("Saint-Étienne")
+    country: str      # code ISO 3166-1 alpha-2
+    lat: float
+    lon: float
+    population: int
+
+    @property
+    def query(self) -> str:
+        """Requête OpenWeatherMap non ambiguë ("Saint-Étienne,FR")"""
+        return f"{self.name},{self.country}"
+
+
+def fold(text: str) -> str:
+    """Forme de recherche : sans accents, en minuscules, tirets et apostrophes remplacés par des espaces"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    for sep in "-'’.":
+        stripped = stripped.replace(sep, " ")
+    return " ".join(stripped.split()).casefold()
+
+
+def parse_query(query: str) -> Tuple[str, Optional[str]]:
+    """
+    "Pàris, fr" -> ("paris", "FR") ; le suffixe n'est un pays que s'il fait 2 lettres.
+    Les identifiants canoniques ("fr:paris") sont acceptés aussi.
+    """
+    country, sep, name = query.partition(":")
+    if sep and len(country.strip()) == 2 and country.strip().isalpha():
+        return fold(name), country.strip().upper()
+    name, _, country = query.rpartition(",")
+    country = country.strip()
+    if name and len(country) == 2 and country.isalpha():
+        return fold(name), country.upper()
+    return fold(query), None
+
+
+def trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Distance de Levenshtein, arrêtée dès qu'elle dépasse `limit` (renvoie alors limit + 1)"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def write_table(places: Iterable[Tuple[Place, Iterable[str]]], path: str) -> None:
+    """
+    Écrit la table triée à partir de (lieu, noms alternatifs) : une ligne par nom de recherche,
+    triée par octets UTF-8 de la clé pour la recherche dichotomique sur le fichier mappé.
+    """
+    lines = []
+    for place, alternate_names in places:
+        for name in {place.name, *alternate_names}:
+            key = fold(name)
+            lines.append(
+                f"{key}\t{place.id}\t{place.name}\t{place.country}\t{place.lat}\t{place.lon}\t{place.population}\n"
+            )
+    lines.sort(key=lambda line: line.encode("utf-8"))
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        f.writelines(lines)
+
+
+class Gazetteer:
+    """
+    Index local des villes, lu depuis une table triée mappée en mémoire (mmap) :
+    - recherche exacte et par préfixe par dichotomie sur les clés ;
+    - index de trigrammes (construit au chargement) pour les fautes de frappe de l'autocomplétion.
+    Seuls les décalages des lignes (array 'I') et les trigrammes sont gardés en RAM.
+    """
+
+    def __init__(self, path: str, max_typos: int = 1):
+        self.path = path
+        self.max_typos = max_typos
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._offsets = array("I")
+        self._keys: List[str] = []          # clés distinctes, dans l'ordre du fichier
+        self._trigrams: Dict[str, array] = defaultdict(lambda: array("I"))
+        self._load()
+
+    def _load(self) -> None:
+        position, size = 0, len(self._map)
+        previous = None
+        while position < size:
+            end = self._map.find(b"\n", position)
+            end = size if end == -1 else end
+            if end > position:
+                key = self._map[position:self._map.find(b"\t", position, end)].decode("utf-8")
+                if key != previous:
+                    key_id = len(self._keys)
+                    self._keys.append(key)
+                    for gram in trigrams(key):
+                        self._trigrams[gram].append(key_id)
+                    previous = key
+                self._offsets.append(position)
+            position = end + 1
+        self._trigrams = dict(self._trigrams)
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def _line(self, row: int) -> List[str]:
+        start = self._offsets[row]
+        end = self._map.find(b"\n", start)
+        return self._map[start:end if end != -1 else len(self._map)].decode("utf-8").split("\t")
+
+    def _place(self, row: int) -> Place:
+        _, place_id, name, country, lat, lon, population = self._line(row)
+        return Place(place_id, name, country, float(lat), float(lon), int(population))
+
+    def _key_at(self, row: int) -> bytes:
+        start = self._offsets[row]
+        return self._map[start:self._map.find(b"\t", start)]
+
+    def _lower_bound(self, key: bytes) -> int:
+        """Première ligne dont la clé est >= key (dichotomie ; bisect(key=) exige Python 3.10)"""
+        low, high = 0, len(self._offsets)
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _rows_with_prefix(self, prefix: bytes, limit: int) -> Iterable[int]:
+        row = self._lower_bound(prefix)
+        end = min(len(self._offsets), row + limit)
+        while row < end and self._key_at(row).startswith(prefix):
+            yield row
+            row += 1
+
+    def exact(self, key: str, country: Optional[str] = None) -> List[Place]:
+        """Lieux dont un nom a exactement cette clé, les plus peuplés d'abord"""
+        encoded = key.encode("utf-8")
+        row = self._lower_bound(encoded)
+        places = []
+        while row < len(self._offsets) and self._key_at(row) == encoded:
+            place = self._place(row)
+            if country is None or place.country == country:
+                places.append(place)
+            row += 1
+        return sorted(places, key=lambda p: -p.population)
+
+    def resolve(self, query: str) -> Optional[Place]:
+        """
+        Ville correspondant à une saisie utilisateur : correspondance exacte après normalisation
+        (casse, accents, suffixe ",PAYS", préfixe "pays:") uniquement. Une ville absente de la
+        table ne doit pas être remplacée par une voisine orthographique ("Vienne" n'est pas Vienna) :
+        les fautes de frappe ne sont tolérées que dans les suggestions (autocomplete).
+        """
+        key, country = parse_query(query)
+        if not key:
+            return None
+        places = self.exact(key, country)
+        return places[0] if places else None
+
+    def _similar_keys(self, key: str, limit: int) -> List[Tuple[str, float]]:
+        """Clés les plus proches par similarité de Jaccard sur les trigrammes"""
+        grams = trigrams(key)
+        shared: Dict[int, int] = defaultdict(int)
+        for gram in grams:
+            for key_id in self._trigrams.get(gram, ()):
+                shared[key_id] += 1
+        scored = (
+            (count / (len(grams) + len(trigrams(self._keys[key_id])) - count), key_id)
+            for key_id, count in shared.items()
+        )
+        return [(self._keys[key_id], score) for score, key_id in heapq.nlargest(limit, scored)]
+
+    def autocomplete(self, query: str, limit: int = 10) -> List[Place]:
+        """
+        Suggestions pour une saisie partielle : noms commençant par la saisie (les plus peuplés
+        d'abord), complétés si besoin par les noms à `max_typos` fautes de frappe près (noms de
+        6 lettres et plus), puis par les noms proches (trigrammes).
+        """
+        key, country = parse_query(query)
+        if not key:
+            return []
+        by_id: Dict[str, Place] = {}
+        for row in self._rows_with_prefix(key.encode("utf-8"), limit=50 * limit):
+            place = self._place(row)
+            if country is None or place.country == country:
+                by_id.setdefault(place.id, place)
+        suggestions = heapq.nsmallest(limit, by_id.values(), key=lambda p: -p.population)
+        if len(suggestions) < limit and len(key) >= 3:
+            similar = self._similar_keys(key, limit=max(limit, 10))
+            typos = [
+                candidate for candidate, _ in similar
+                if self.max_typos > 0 and len(key) >= 6 and edit_distance(key, candidate, self.max_typos) <= self.max_typos
+            ]
+            close = typos + [candidate for candidate, score in similar if score >= 0.4 and candidate not in typos]
+            for candidate in close:
+                for place in self.exact(candidate, country):
+                    if place.id not in by_id and len(suggestions) < limit:
+                        by_id[place.id] = place
+                        suggestions.append(place)
+        return suggestions
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+
+_gazetteer: Optional[Gazetteer] = None
+_gazetteer_lock = threading.Lock()
+_gazetteer_loaded = False
+
+
+def get_gazetteer(path: Optional[str], max_typos: int = 1) -> Optional[Gazetteer]:
+    """Gazetteer partagé du process, chargé au premier appel (None si désactivé ou illisible)"""
+    global _gazetteer, _gazetteer_loaded
+    with _gazetteer_lock:
+        if not _gazetteer_loaded:
+            _gazetteer_loaded = True
+            if path:
+                try:
+                    _gazetteer = Gazetteer(path, max_typos=max_typos)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Gazetteer des villes illisible ({path}): {e}")
+        return _gazetteer
@@ -0,0 +1,151 @@
+# services/geo_cache.py
+import math
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Iterator, Optional, Set, Tuple
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {c: i for i, c in enumerate(_BASE32)}
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def geohash_encode(lat: float, lon: float, precision: int) -> str:
+    """Geohash de `precision` caractères (6 : cellule d'environ 1,2 km x 0,6 km)"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits, bit_count, even = 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+
+def geohash_bbox(geohash: str) -> Tuple[float, float, float, float]:
+    """(lat_min, lat_max, lon_min, lon_max) de la cellule"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = _DECODE[char]
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (bits >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lat_range[0], lat_range[1], lon_range[0], lon_range[1]
+
+
+def geohash_center(geohash: str) -> Tuple[float, float]:
+    lat_min, lat_max, lon_min, lon_max = geohash_bbox(geohash)
+    return (lat_min + lat_max) / 2, (lon_min + lon_max) / 2
+
+
+def geohash_neighbors(geohash: str) -> Iterator[str]:
+    """Les 8 cellules voisines (même précision), calculées depuis le centre de la cellule"""
+    lat_min, lat_max, lon_min, lon_max = geohash_bbox(geohash)
+    lat, lon = (lat_min + lat_max) / 2, (lon_min + lon_max) / 2
+    dlat, dlon = lat_max - lat_min, lon_max - lon_min
+    for i in (-1, 0, 1):
+        for j in (-1, 0, 1):
+            if i == 0 and j == 0:
+                continue
+            n_lat = lat + i * dlat
+            if not -90 < n_lat < 90:
+                continue
+            n_lon = (lon + j * dlon + 180) % 360 - 180
+            yield geohash_encode(n_lat, n_lon, len(geohash))
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class GeoIndex:
+    """
+    Index spatial des observations en cache par coordonnées : ensemble des cellules
+    geohash connues, par type de données ("weather" / "forecast").
+    Une recherche parcourt la cellule de la position et ses 8 voisines : le rayon utile
+    est donc borné par la taille d'une cellule à la précision choisie.
+    """
+
+    def __init__(self, precision: int = 6):
+        if not 1 <= precision <= 12:
+            raise ValueError("precision doit être comprise entre 1 et 12")
+        self.precision = precision
+        self._cells: Dict[str, Set[str]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+        # Compteurs
+        self.exact_hits = 0
+        self.nearby_hits = 0
+
+    def cell(self, lat: float, lon: float) -> str:
+        return geohash_encode(lat, lon, self.precision)
+
+    def add(self, kind: str, cell: str) -> None:
+        with self._lock:
+            self._cells[kind].add(cell)
+
+    def discard(self, kind: str, cell: str) -> None:
+        with self._lock:
+            self._cells[kind].discard(cell)
+
+    def nearest(
+        self,
+        kind: str,
+        lat: float,
+        lon: float,
+        radius_km: float,
+        is_fresh: Callable[[str], bool],
+    ) -> Optional[str]:
+        """
+        Cellule connue la plus proche (distance au centre) dont l'entrée est encore fraîche.
+        La cellule de la position est toujours acceptée, les voisines seulement dans le rayon.
+        """
+        own = self.cell(lat, lon)
+        with self._lock:
+            known = self._cells[kind]
+            candidates = [c for c in (own, *geohash_neighbors(own)) if c in known]
+        by_distance = sorted(
+            (haversine_km(lat, lon, *geohash_center(c)), c) for c in candidates
+        )
+        for distance, cell in by_distance:
+            if distance > radius_km and cell != own:
+                continue
+            if is_fresh(cell):
+                with self._lock:
+                    if cell == own:
+                        self.exact_hits += 1
+                    else:
+                        self.nearby_hits += 1
+                return cell
+        return None
+
+    def __len__(self) -> int:
+        return sum(len(cells) for cells in self._cells.values())
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "precision": self.precision,
+            "cells": len(self),
+            "exact_hits": self.exact_hits,
+            "nearby_hits": self.nearby_hits,
+        }
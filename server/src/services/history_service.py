@@ -1,9 +1,13 @@
 # services/history_service.py
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
 from server.src.models.history_model import History
 from server.src.models.user_model import User
 from server.src.models.activity_model import Activity
+from server.src.services.viewed_history import get_viewed_history
+from server.src.core.config import RECOMMENDATION_JOB_HISTORY_PAGE_SIZE
 from datetime import datetime
+from typing import Iterator, Optional, Tuple
 
 def add_to_history(user: User, activity: Activity, db: Session):
     """
@@ -16,6 +20,7 @@ def add_to_history(user: User, activity: Activity, db: Session):
         db.add(history_entry)
         db.commit()
         db.refresh(history_entry)
+        get_viewed_history().add(user.id, activity.id)
         return history_entry
     return existing
 
@@ -24,3 +29,30 @@ def get_user_history(user: User, db: Session):
     Retourne l'historique des activités vues par l'utilisateur.
     """
     return db.query(History).filter_by(user_id=user.id).order_by(History.timestamp.desc()).all()
+
+
+def iter_viewed_activities(
+    db: Session,
+    min_user_id: Optional[int] = None,
+    max_user_id: Optional[int] = None,
+    page_size: int = RECOMMENDATION_JOB_HISTORY_PAGE_SIZE,
+) -> Iterator[Tuple[int, int]]:
+    """
+    Parcourt l'historique en (user_id, activity_id) croissants, page par page :
+    pagination par clé (pas d'OFFSET) sur l'index history (user_id, activity_id).
+    """
+    last = None
+    while True:
+        query = db.query(History.user_id, History.activity_id)
+        if min_user_id is not None:
+            query = query.filter(History.user_id >= min_user_id)
+        if max_user_id is not None:
+            query = query.filter(History.user_id <= max_user_id)
+        if last is not None:
+            query = query.filter(tuple_(History.user_id, History.activity_id) > last)
+        rows = query.order_by(History.user_id, History.activity_id).limit(page_size).all()
+        for user_id, activity_id in rows:
+            yield user_id, activity_id
+        if len(rows) < page_size:
+            return
+        last = tuple(rows[-1])
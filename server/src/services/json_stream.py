@@ -0,0 +1,132 @@
+# services/json_stream.py
+import codecs
+import json
+from typing import Any, Dict, List
+
+_WHITESPACE = " \t\n\r"
+_decoder = json.JSONDecoder()
+
+
+class JsonArrayStream:
+    """
+    Analyse incrémentale d'un objet JSON reçu par morceaux : les éléments du tableau
+    `array_key` sont renvoyés un par un dès qu'ils sont complets, sans jamais construire
+    le tableau entier ; les autres champs de premier niveau sont conservés (close()).
+
+        stream = JsonArrayStream("list")
+        for chunk in chunks:
+            for item in stream.feed(chunk):
+                ...
+        header = stream.close()
+    """
+
+    def __init__(self, array_key: str):
+        self.array_key = array_key
+        self.header: Dict[str, Any] = {}
+        self.items = 0
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._state = "start"
+        self._key = None
+        self._final = False
+
+    def _skip(self, chars: str = _WHITESPACE) -> bool:
+        """Avance après les caractères donnés ; False s'il faut attendre la suite"""
+        while self._pos < len(self._buf) and self._buf[self._pos] in chars:
+            self._pos += 1
+        return self._pos < len(self._buf)
+
+    def _expect(self, char: str) -> None:
+        if self._buf[self._pos] != char:
+            raise ValueError(f"JSON invalide : '{char}' attendu en position {self._pos}")
+        self._pos += 1
+
+    def _value(self) -> Any:
+        """Valeur JSON complète à la position courante, ou _INCOMPLETE s'il manque des données"""
+        try:
+            value, end = _decoder.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError:
+            if self._final:
+                raise ValueError("JSON tronqué ou invalide")
+            return _INCOMPLETE
+        # Un nombre en fin de tampon peut encore continuer dans le morceau suivant
+        if end == len(self._buf) and not self._final and isinstance(value, (int, float)):
+            return _INCOMPLETE
+        self._pos = end
+        return value
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """Ajoute un morceau et renvoie les éléments du tableau devenus complets"""
+        self._buf = self._buf[self._pos:] + self._text.decode(chunk, final=self._final)
+        self._pos = 0
+        items = []
+        while True:
+            if self._state == "start":
+                if not self._skip():
+                    break
+                self._expect("{")
+                self._state = "key"
+            elif self._state == "key":
+                if not self._skip(_WHITESPACE + ","):
+                    break
+                if self._buf[self._pos] == "}":
+                    self._pos += 1
+                    self._state = "done"
+                    continue
+                key = self._value()
+                if key is _INCOMPLETE:
+                    break
+                self._key = key
+                self._state = "colon"
+            elif self._state == "colon":
+                if not self._skip():
+                    break
+                self._expect(":")
+                self._state = "value"
+            elif self._state == "value":
+                if not self._skip():
+                    break
+                if self._key == self.array_key and self._buf[self._pos] == "[":
+                    self._pos += 1
+                    self._state = "items"
+                    continue
+                value = self._value()
+                if value is _INCOMPLETE:
+                    break
+                self.header[self._key] = value
+                self._state = "key"
+            elif self._state == "items":
+                if not self._skip(_WHITESPACE + ","):
+                    break
+                if self._buf[self._pos] == "]":
+                    self._pos += 1
+                    self._state = "key"
+                    continue
+                item = self._value()
+                if item is _INCOMPLETE:
+                    break
+                self.items += 1
+                items.append(item)
+            else:  # done
+                if self._skip():
+                    raise ValueError("JSON invalide : données après la fin de l'objet")
+                break
+        return items
+
+    def close(self) -> Dict[str, Any]:
+        """Termine l'analyse (le reste du tampon doit être complet) et renvoie les autres champs"""
+        self._final = True
+        trailing = self.feed(b"")
+        if self._state != "done":
+            raise ValueError("JSON tronqué : objet incomplet")
+        if trailing:
+            raise ValueError("JSON invalide : éléments après la fin du tableau")
+        return self.header
+
+
+class _Incomplete:
+    pass
+
+
+_INCOMPLETE = _Incomplete()
@@ -0,0 +1,84 @@
+# services/rate_limiter.py
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+class RateLimitExceeded(Exception):
+    """Levée quand le quota d'appels est épuisé et que l'attente dépasserait le délai accepté"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Quota d'appels atteint, nouvel essai dans {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Seau à jetons : `rate` jetons par seconde, au plus `burst` accumulés.
+    Un appel qui ne trouve pas de jeton réserve le prochain disponible et l'appelant attend
+    le délai renvoyé par reserve(), s'il ne dépasse pas `max_wait` ; sinon l'appel est refusé
+    (RateLimitExceeded).
+    Thread-safe : un même seau peut être partagé par les services sync et async du process.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        max_wait: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if rate <= 0:
+            raise ValueError("rate doit être strictement positif")
+        if burst <= 0:
+            raise ValueError("burst doit être strictement positif")
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated_at = clock()
+
+        # Compteurs
+        self.acquired = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.rejected = 0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def reserve(self, max_wait: Optional[float] = None) -> float:
+        """Prend un jeton et renvoie le temps à attendre avant de l'utiliser (0 si disponible)"""
+        max_wait = self.max_wait if max_wait is None else max_wait
+        with self._lock:
+            self._refill(self._clock())
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if wait > max_wait:
+                self.rejected += 1
+                raise RateLimitExceeded(wait)
+            # Le solde peut devenir négatif : les appels suivants attendent leur tour
+            self._tokens -= 1
+            self.acquired += 1
+            if wait > 0:
+                self.waited += 1
+                self.wait_seconds += wait
+                self.max_wait_seconds = max(self.max_wait_seconds, wait)
+            return wait
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refill(self._clock())
+            return {
+                "rate_per_minute": round(self.rate * 60, 2),
+                "burst": self.burst,
+                "tokens": round(self._tokens, 2),
+                "acquired": self.acquired,
+                "waited": self.waited,
+                "wait_seconds": round(self.wait_seconds, 3),
+                "max_wait_seconds": round(self.max_wait_seconds, 3),
+                "rejected": self.rejected,
+            }
@@ -1,12 +1,32 @@
 # server/src/services/recommendation_service.py
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import exists, func, or_
 from server.src.models.activity_model import Activity, Tag, Category
+from server.src.models.address_model import Address
 from server.src.models.user_model import User
 from server.src.models.history_model import History
 from server.src.services.weather_service import WeatherService
+from server.src.services.activity_index import ActivityFeatures, ActivityIndex, get_activity_index
+from server.src.services.viewed_history import get_viewed_history
+from server.src.services.recommendation_snapshots import (
+    age_band,
+    get_recommendation_snapshots,
+    temperature_range,
+    weather_bucket,
+)
+from server.src.services.history_service import iter_viewed_activities
+from server.src.services.forecast_aggregation import ForecastColumns
 from server.src.schemas.weather_schema import CurrentWeatherOut
-from datetime import datetime
+from server.src.core.config import (
+    RECOMMENDATION_ACTIVITY_INDEX,
+    RECOMMENDATION_JOB_CHUNK_SIZE,
+    RECOMMENDATION_JOB_HISTORY_PAGE_SIZE,
+    RECOMMENDATION_SNAPSHOTS,
+)
+from server.src.enums.activity_enums import IntensityEnum, WeatherConditionEnum
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Callable, Container, Dict, Hashable, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
 import logging
 
 logger = logging.getLogger("recommendation_service")
@@ -24,35 +44,24 @@ def get_recommendations_for_user(
     city: str = None, 
     is_outdoor: bool = None,  
     weather_service: WeatherService = None, 
-    limit: int = 5
+    limit: int = 5,
+    raw_weather: dict = None
 ):
-    query = db.query(Activity).options(
-        joinedload(Activity.categories),
-        joinedload(Activity.tags)
-    )
-
-    # Filtrer selon l'âge
-    if user.age is not None:
-        query = query.filter(
-            (Activity.min_age <= user.age) &
-            ((Activity.max_age >= user.age) | (Activity.max_age.is_(None)))
-        )
-
-    # Historique
-    user_history = db.query(History).filter(History.user_id == user.id).all()
-    if user_history:
-        viewed_ids = [h.activity_id for h in user_history]
-        query = query.filter(~Activity.id.in_(viewed_ids))
-
-    # Récupération brute
-    activities = query.order_by(Activity.created_at.desc()).all()
-
+    """
+    raw_weather : réponse OpenWeatherMap déjà récupérée par l'appelant (route async).
+    À défaut, elle est demandée à weather_service si city est fournie.
+    """
     # Météo
     weather_data = None
     temp, condition = None, None
-    if city and weather_service:
+    if raw_weather is None and city and weather_service:
         try:
             raw_weather = weather_service.get_current_weather(city)
+        except Exception as e:
+            logger.error(f"Impossible de récupérer la météo: {e}")
+
+    if raw_weather:
+        try:
             temp = raw_weather.get("temp_c") or raw_weather.get("main", {}).get("temp")
             condition = raw_weather.get("condition") or raw_weather.get("weather", [{}])[0].get("main", "")
 
@@ -82,35 +91,517 @@ def get_recommendations_for_user(
         except Exception as e:
             logger.error(f"Impossible de récupérer la météo: {e}")
 
-    # Filtrer les activités selon la météo (température + conditions)
-    filtered_activities = []
-    for act in activities:
-        # Vérifier température
-        if temp is not None:
-            if act.ideal_temperature_min and temp < act.ideal_temperature_min:
-                continue
-            if act.ideal_temperature_max and temp > act.ideal_temperature_max:
-                continue
-
-        # Vérifier conditions météo
-        if condition:
-            if condition.lower() in ["rain", "snow"] and act.is_outdoor:
-                continue
-
-        
-        # Vérifier is_outdoor passé en paramètre
-        if is_outdoor is not None:
-            if act.is_outdoor != is_outdoor:
-                continue
+    exclude_outdoor = bool(condition) and condition.lower() in ["rain", "snow"]
+    if RECOMMENDATION_ACTIVITY_INDEX:
+        context = WeatherContext.from_raw(raw_weather, temp, condition)
+        weather_city = (raw_weather or {}).get("name") or city
+        activities = _select_with_index(db, user, context, exclude_outdoor, is_outdoor, limit, weather_city)
+    else:
+        activities = _recommendation_query(db, user, temp, exclude_outdoor, is_outdoor).limit(limit).all()
 
+    recommendations = []
+    for act in activities:
         # Mettre à jour la météo pour l'activité
         act.weather_conditions = condition.lower() if condition else act.weather_conditions
-        filtered_activities.append(act)
-
-    # Limiter le nombre de recommandations
-    recommendations = filtered_activities[:limit]
+        recommendations.append(act)
 
     return {
         "activities": recommendations,
         "weather": weather_data
     }
+
+
+# Colonnes des prévisions utilisées pour recommander par créneau
+SLOT_FIELDS = ("temp", "humidity", "wind_speed", "pop", "condition", "description")
+# Un instant hors des prévisions de plus d'un créneau (3h) n'a pas de météo connue
+SLOT_SECONDS = 3 * 3600
+
+
+def get_forecast_recommendations_for_user(
+    user: User,
+    db: Session,
+    forecast: dict,
+    is_outdoor: bool = None,
+    at: Optional[int] = None,
+    window: Optional[Tuple[int, int]] = None,
+    per_slot: int = 1,
+):
+    """
+    Recommandations pour des créneaux à venir, depuis les prévisions en cache (format compact
+    ou réponse /forecast brute) : le créneau le plus proche de `at`, ou tous ceux de
+    `window` (début inclus, fin exclue), horodatages UTC en secondes.
+    Le catalogue est filtré une fois (âge, indoor/outdoor, historique) ; chaque créneau ne
+    recalcule que le score des combinaisons distinctes de la matrice de l'index.
+    """
+    columns = ForecastColumns.from_payload(forecast)
+    series = columns.series(SLOT_FIELDS)
+    slots = [dict(zip(("dt",) + SLOT_FIELDS, values)) for values in zip(series["dt"], *(series[f] for f in SLOT_FIELDS))]
+    if at is not None:
+        nearest = min(slots, key=lambda slot: abs(slot["dt"] - at), default=None)
+        slots = [nearest] if nearest is not None and abs(nearest["dt"] - at) <= SLOT_SECONDS else []
+    elif window is not None:
+        start, end = window
+        slots = [slot for slot in slots if start <= slot["dt"] < end]
+
+    index = get_activity_index()
+    index.ensure_fresh(db)
+    base_ids = index.match(age=user.age, is_outdoor=is_outdoor)
+    viewed = get_viewed_history().get(db, user.id)
+    profile = affinity_profile(index, viewed)
+    # Scores d'affinité communs à tous les créneaux, recalculés sous le verrou de l'index s'il a changé
+    affinity = ScoringEngine(index, WeatherContext(), profile)
+
+    ranked_by_slot = []
+    for slot in slots:
+        context = WeatherContext.from_values(slot["temp"], slot["condition"], slot["wind_speed"], slot["humidity"])
+        engine = ScoringEngine(index, context, profile)
+        ranked_by_slot.append(
+            engine.top_k(base_ids, per_slot, exclude=viewed, eligible_only=True, label_scores=affinity.label_scores)
+        )
+
+    # Chargement unique des activités retenues, tous créneaux confondus
+    selected_ids = {activity_id for ranked in ranked_by_slot for _, activity_id in ranked}
+    by_id = {}
+    if selected_ids:
+        by_id = {
+            act.id: act
+            for act in db.query(Activity).options(
+                selectinload(Activity.categories),
+                selectinload(Activity.tags)
+            ).filter(Activity.id.in_(selected_ids)).all()
+        }
+
+    return {
+        "city": columns.city.get("name"),
+        "timezone": columns.tz_offset,
+        "slots": [
+            {
+                **slot,
+                "time": datetime.fromtimestamp(slot["dt"], timezone.utc).isoformat(),
+                "recommendations": [
+                    {"score": score, "activity": by_id[activity_id]}
+                    for score, activity_id in ranked if activity_id in by_id
+                ],
+            }
+            for slot, ranked in zip(slots, ranked_by_slot)
+        ],
+    }
+
+
+def get_recommendations_for_users(
+    db: Session,
+    weather_service: Optional[WeatherService] = None,
+    user_ids: Optional[Iterable[int]] = None,
+    is_outdoor: bool = None,
+    limit: int = 5,
+    chunk_size: int = RECOMMENDATION_JOB_CHUNK_SIZE,
+    history_page_size: int = RECOMMENDATION_JOB_HISTORY_PAGE_SIZE,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Recommandations d'un lot d'utilisateurs actifs (tous à défaut de user_ids), par paquets
+    de chunk_size : [{"user_id", "city", "condition", "weather_error", "recommendations": [{"activity_id", "name", "score"}]}].
+    weather_error : raison de l'absence de météo pour la ville (recommandations sans météo), sinon None.
+    Quelques requêtes groupées au lieu d'un appel complet par utilisateur :
+    - utilisateurs et ville (première adresse) en une requête ;
+    - météo une fois par ville (get_current_weather_many), scores météo une fois par ville ;
+    - catalogue chargé une fois (index), candidats calculés une fois par âge ;
+    - historique lu en un seul parcours paginé, fusionné avec les utilisateurs triés par ID ;
+    - noms des activités retenues chargés une fois par paquet.
+    """
+    index = get_activity_index()
+    index.ensure_fresh(db)
+    users = _job_users(db, user_ids)
+    if not users:
+        return
+
+    # Météo et scores météo par ville, identifiée par la clé de cache du service météo
+    # (gazetteer : "Pàris", "paris " et "Paris,FR" sont une seule ville, un seul appel)
+    city_keys: Dict[str, Hashable] = {}
+    spelling_by_key: Dict[Hashable, str] = {}
+    for _, _, city in users:
+        if city and city.strip() and city not in city_keys:
+            spelling = " ".join(city.split())
+            key = weather_service.city_cache_key(spelling) if weather_service is not None else spelling.casefold()
+            city_keys[city] = key
+            spelling_by_key.setdefault(key, spelling)
+    contexts: Dict[Hashable, WeatherContext] = {}
+    weather_errors: Dict[Hashable, str] = {}
+    if weather_service is not None and spelling_by_key:
+        key_by_spelling = {spelling: key for key, spelling in spelling_by_key.items()}
+        for lookup in weather_service.get_current_weather_many(cities=list(spelling_by_key.values())):
+            if lookup.error is not None:
+                logger.error(f"Impossible de récupérer la météo de {lookup.query}: {lookup.error}")
+                weather_errors[key_by_spelling[lookup.query]] = str(lookup.error)
+                continue
+            raw = lookup.data or {}
+            temp = (raw.get("main") or {}).get("temp")
+            condition = (raw.get("weather") or [{}])[0].get("main", "")
+            contexts[key_by_spelling[lookup.query]] = WeatherContext.from_raw(raw, temp, condition)
+    engines: Dict[Optional[Hashable], ScoringEngine] = {}
+    candidates_by_age: Dict[Optional[int], Set[int]] = {}
+    no_affinity = ScoringEngine(index, WeatherContext())
+
+    viewed_rows = iter_viewed_activities(db, users[0][0], users[-1][0], page_size=history_page_size)
+    pending = next(viewed_rows, None)
+    chunk: List[Dict[str, Any]] = []
+    for user_id, age, city in users:
+        # Historique : fusion avec le flux trié par (user_id, activity_id)
+        viewed: Set[int] = set()
+        while pending is not None and pending[0] <= user_id:
+            if pending[0] == user_id:
+                viewed.add(pending[1])
+            pending = next(viewed_rows, None)
+
+        city_key = city_keys.get(city)
+        context = contexts.get(city_key, WeatherContext())
+        if city_key not in engines:
+            engines[city_key] = ScoringEngine(index, context)
+        if age not in candidates_by_age:
+            candidates_by_age[age] = index.match(age=age, is_outdoor=is_outdoor)
+
+        profile = affinity_profile(index, viewed)
+        label_scores = ScoringEngine(index, context, profile).label_scores if profile else no_affinity.label_scores
+        engine = engines[city_key]
+        ranked = index.top_k(
+            candidates_by_age[age], limit, lambda: engine.weather_scores(eligible_only=True), label_scores, viewed
+        )
+        chunk.append({
+            "user_id": user_id,
+            "city": city,
+            "condition": context.condition,
+            "weather_error": weather_errors.get(city_key),
+            "recommendations": [
+                {"activity_id": activity_id, "score": round(score, 4)} for score, activity_id in ranked
+            ],
+        })
+        if len(chunk) >= chunk_size:
+            yield _with_activity_names(db, chunk)
+            chunk = []
+    if chunk:
+        yield _with_activity_names(db, chunk)
+
+
+def _job_users(db: Session, user_ids: Optional[Iterable[int]] = None) -> List[Tuple[int, Optional[int], Optional[str]]]:
+    """(id, âge, ville de la première adresse) des utilisateurs actifs, triés par ID"""
+    first_address = (
+        db.query(Address.user_id, func.min(Address.id).label("address_id"))
+        .group_by(Address.user_id)
+        .subquery()
+    )
+    query = (
+        db.query(User.id, User.age, Address.city)
+        .outerjoin(first_address, first_address.c.user_id == User.id)
+        .outerjoin(Address, Address.id == first_address.c.address_id)
+        .filter(or_(User.is_active.is_(None), User.is_active.is_(True)))
+    )
+    if user_ids is not None:
+        query = query.filter(User.id.in_(list(user_ids)))
+    return [tuple(row) for row in query.order_by(User.id).all()]
+
+
+def _with_activity_names(db: Session, chunk: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Complète un paquet avec le nom des activités retenues (une requête par paquet)"""
+    ids = {r["activity_id"] for entry in chunk for r in entry["recommendations"]}
+    names = dict(db.query(Activity.id, Activity.name).filter(Activity.id.in_(ids)).all()) if ids else {}
+    for entry in chunk:
+        for recommendation in entry["recommendations"]:
+            recommendation["name"] = names.get(recommendation["activity_id"])
+    return chunk
+
+
+def _recommendation_query(db: Session, user: User, temp, exclude_outdoor: bool, is_outdoor: bool = None):
+    """
+    Requête SQL complète des recommandations, triée (plus récentes d'abord) : âge, historique,
+    fenêtre de température, exclusion des activités d'extérieur et filtre indoor/outdoor
+    sont évalués par la base, à compléter par .limit() ; les relations sont chargées
+    ensuite pour les seules lignes retenues (selectinload, compatible avec LIMIT).
+    """
+    query = db.query(Activity).options(
+        selectinload(Activity.categories),
+        selectinload(Activity.tags)
+    )
+
+    # Filtrer selon l'âge
+    if user.age is not None:
+        query = query.filter(
+            (Activity.min_age <= user.age) &
+            ((Activity.max_age >= user.age) | (Activity.max_age.is_(None)))
+        )
+
+    # Historique : anti-jointure (NOT EXISTS), index history (user_id, activity_id)
+    query = query.filter(~exists().where(
+        (History.user_id == user.id) & (History.activity_id == Activity.id)
+    ))
+
+    # Température : une borne absente ou nulle n'est pas une contrainte
+    if temp is not None:
+        query = query.filter(
+            or_(Activity.ideal_temperature_min.is_(None), Activity.ideal_temperature_min == 0,
+                Activity.ideal_temperature_min <= temp),
+            or_(Activity.ideal_temperature_max.is_(None), Activity.ideal_temperature_max == 0,
+                Activity.ideal_temperature_max >= temp),
+        )
+
+    # Pluie/neige : pas d'activité d'extérieur
+    if exclude_outdoor:
+        query = query.filter(or_(Activity.is_outdoor.is_(None), Activity.is_outdoor.is_(False)))
+
+    if is_outdoor is not None:
+        query = query.filter(Activity.is_outdoor == is_outdoor)
+
+    return query.order_by(Activity.created_at.desc(), Activity.id.desc())
+
+
+def _select_with_index(
+    db: Session,
+    user: User,
+    context: "WeatherContext",
+    exclude_outdoor: bool,
+    is_outdoor: bool,
+    limit: int,
+    city: Optional[str] = None,
+):
+    """
+    Sélection sur l'index en mémoire (intersections d'ensembles), classement des candidats
+    non vus par le moteur de score, puis chargement des seules activités retenues
+    avec leurs catégories et tags.
+    Avec RECOMMENDATION_SNAPSHOTS, le classement météo vient de l'instantané partagé par la ville,
+    la tranche météo et la tranche d'âge ; seuls l'âge exact, l'historique et l'affinité
+    sont appliqués par utilisateur.
+    """
+    index = get_activity_index()
+    index.ensure_fresh(db)
+
+    # Historique (bitset en mémoire) : exclusion et profil d'affinité
+    viewed = get_viewed_history().get(db, user.id)
+    engine = ScoringEngine(index, context, affinity_profile(index, viewed))
+    ranked = None
+    if RECOMMENDATION_SNAPSHOTS:
+        band = age_band(user.age)
+        key = (city.casefold() if city else None, weather_bucket(context), band, is_outdoor)
+        ranked = get_recommendation_snapshots().top_k(
+            index, key, lambda n: _snapshot_ranking(index, context, band, is_outdoor, n),
+            limit, user.age, context.temp, engine.label_scores, exclude=viewed,
+        )
+    if ranked is None:
+        candidate_ids = index.match(
+            temp=context.temp, age=user.age, is_outdoor=is_outdoor, exclude_outdoor=exclude_outdoor
+        )
+        ranked = engine.top_k(candidate_ids, limit, exclude=viewed)
+    selected_ids = [i for _, i in ranked]
+    if not selected_ids:
+        return []
+    by_id = {
+        act.id: act
+        for act in db.query(Activity).options(
+            selectinload(Activity.categories),
+            selectinload(Activity.tags)
+        ).filter(Activity.id.in_(selected_ids)).all()
+    }
+    return [by_id[i] for i in selected_ids if i in by_id]
+
+
+def _snapshot_ranking(
+    index: ActivityIndex,
+    context: "WeatherContext",
+    band: Optional[Tuple[int, int]],
+    is_outdoor: Optional[bool],
+    n: int,
+) -> List[Tuple[float, int]]:
+    """
+    Les n meilleures activités (score météo, id) compatibles avec au moins une température de
+    la tranche météo et un âge de la tranche d'âge ; température et âge exacts sont vérifiés
+    à la lecture (select)
+    """
+    candidate_ids = index.match(is_outdoor=is_outdoor, exclude_outdoor=context.exclude_outdoor)
+    temps = temperature_range(context.temp)
+    if temps is not None:
+        low, high = temps
+        candidate_ids = {
+            i for i in candidate_ids
+            if (f := index.features(i)) is not None and (f.temp_min is None or f.temp_min < high)
+            and (f.temp_max is None or f.temp_max >= low)
+        }
+    if band is not None:
+        start, end = band
+        candidate_ids = {
+            i for i in candidate_ids
+            if (f := index.features(i)) is not None and f.min_age is not None and f.min_age <= end
+            and (f.max_age is None or f.max_age >= start)
+        }
+    engine = ScoringEngine(index, context)  # sans profil : pas d'affinité
+    return index.top_k(candidate_ids, n, engine.weather_scores, engine.label_scores)
+
+
+# Condition OpenWeatherMap ("main") -> WeatherConditionEnum
+CONDITION_BY_OWM = {
+    "clear": WeatherConditionEnum.sunny.value,
+    "clouds": WeatherConditionEnum.cloudy.value,
+    "rain": WeatherConditionEnum.rainy.value,
+    "drizzle": WeatherConditionEnum.rainy.value,
+    "snow": WeatherConditionEnum.snowy.value,
+    "thunderstorm": WeatherConditionEnum.stormy.value,
+    "tornado": WeatherConditionEnum.stormy.value,
+    "squall": WeatherConditionEnum.windy.value,
+    "mist": WeatherConditionEnum.foggy.value,
+    "fog": WeatherConditionEnum.foggy.value,
+    "haze": WeatherConditionEnum.foggy.value,
+    "smoke": WeatherConditionEnum.foggy.value,
+    "dust": WeatherConditionEnum.foggy.value,
+    "sand": WeatherConditionEnum.foggy.value,
+}
+WINDY_SPEED = 10.0          # m/s : au-delà, la condition retenue est "windy"
+INTENSITY_LEVEL = {IntensityEnum.low.value: 0.0, IntensityEnum.medium.value: 0.5, IntensityEnum.high.value: 1.0}
+
+# Poids des critères du score (somme = 1)
+SCORE_WEIGHTS = {"temperature": 0.35, "condition": 0.25, "intensity": 0.15, "affinity": 0.25}
+
+
+class WeatherContext(NamedTuple):
+    """Conditions utilisées pour le score (None : inconnues, critère neutre)"""
+    temp: Optional[float] = None
+    condition: Optional[str] = None      # valeur de WeatherConditionEnum
+    wind_speed: float = 0.0
+    humidity: float = 0.0
+    exclude_outdoor: bool = False        # pluie/neige : pas d'activité d'extérieur
+
+    @classmethod
+    def from_values(cls, temp: Optional[float], condition: Optional[str], wind_speed: float = 0.0, humidity: float = 0.0) -> "WeatherContext":
+        """Depuis une condition OpenWeatherMap ("Rain", "Clear"...) et les mesures associées"""
+        wind_speed, humidity = wind_speed or 0.0, humidity or 0.0
+        mapped = CONDITION_BY_OWM.get(condition.lower()) if condition else None
+        if wind_speed >= WINDY_SPEED and mapped in (None, WeatherConditionEnum.sunny.value, WeatherConditionEnum.cloudy.value):
+            mapped = WeatherConditionEnum.windy.value
+        exclude_outdoor = bool(condition) and condition.lower() in ["rain", "snow"]
+        return cls(temp, mapped, wind_speed, humidity, exclude_outdoor)
+
+    @classmethod
+    def from_raw(cls, raw_weather: Optional[dict], temp: Optional[float] = None, condition: Optional[str] = None) -> "WeatherContext":
+        raw_weather = raw_weather or {}
+        wind_speed = (raw_weather.get("wind") or {}).get("speed")
+        humidity = (raw_weather.get("main") or {}).get("humidity")
+        return cls.from_values(temp, condition, wind_speed, humidity)
+
+
+def affinity_profile(index: ActivityIndex, viewed: Iterable[int]) -> Dict[Tuple[str, int], float]:
+    """Poids (0-1) de chaque catégorie/tag dans les activités vues, 1 pour le plus fréquent"""
+    counts = Counter()
+    for activity_id in viewed:
+        features = index.features(activity_id)
+        if features is not None:
+            counts.update(features.labels)
+    if not counts:
+        return {}
+    top = max(counts.values())
+    return {label: count / top for label, count in counts.items()}
+
+
+def _clamp(x: float) -> float:
+    return 0.0 if x < 0 else 1.0 if x > 1 else x
+
+
+class ScoringEngine:
+    """
+    Score (0-1) des activités candidates pour une météo et un profil donnés :
+    - température : proximité du centre de la fenêtre idéale (0 au bord) ;
+    - condition : weather_conditions de l'activité identique à la condition actuelle ;
+    - intensité : activités intenses pénalisées par l'humidité et, en extérieur, le vent ;
+    - affinité : catégories et tags des activités déjà vues.
+    Les scores sont calculés par combinaison distincte de la matrice de l'index
+    (weather_rows, label_rows), pas par activité ; la sélection est un top-k par tas.
+    """
+
+    def __init__(self, index: ActivityIndex, context: WeatherContext, profile: Optional[Dict[Tuple[str, int], float]] = None):
+        self.index = index
+        self.context = context
+        self.profile = profile or {}
+        # Facteur d'inconfort (0-1) pour les activités intenses
+        self._humidity_discomfort = _clamp((context.humidity - 60) / 40)
+        self._wind_discomfort = _clamp(context.wind_speed / 15)
+        # Scores par ligne de matrice, valables pour une version de l'index
+        self._scores: Dict[Any, Tuple[int, List[Optional[float]]]] = {}
+
+    def temperature_score(self, temp_min: Optional[float], temp_max: Optional[float]) -> float:
+        t = self.context.temp
+        if t is None or (temp_min is None and temp_max is None):
+            return 0.5
+        if temp_min is not None and temp_max is not None and temp_max > temp_min:
+            half = (temp_max - temp_min) / 2
+            return _clamp(1 - abs(t - (temp_min + half)) / half)
+        # Une seule borne : marge de 10°C pour atteindre le score maximal
+        if temp_min is not None:
+            return _clamp((t - temp_min) / 10)
+        return _clamp((temp_max - t) / 10)
+
+    def condition_score(self, weather_conditions: Optional[str]) -> float:
+        if self.context.condition is None or weather_conditions is None:
+            return 0.5
+        return 1.0 if weather_conditions == self.context.condition else 0.0
+
+    def intensity_score(self, intensity: Optional[str], is_outdoor: Optional[bool]) -> float:
+        discomfort = max(self._humidity_discomfort, self._wind_discomfort if is_outdoor else 0.0)
+        return 1 - INTENSITY_LEVEL.get(intensity, 0.5) * discomfort
+
+    def affinity_score(self, labels: Tuple[Tuple[str, int], ...]) -> float:
+        if not labels or not self.profile:
+            return 0.0
+        return sum(self.profile.get(label, 0.0) for label in labels) / len(labels)
+
+    def weather_score(self, weather_key: Tuple[Any, ...]) -> float:
+        """Partie météo pondérée, pour une ligne ActivityFeatures.weather_key"""
+        is_outdoor, weather_conditions, temp_min, temp_max, intensity = weather_key
+        return (
+            SCORE_WEIGHTS["temperature"] * self.temperature_score(temp_min, temp_max)
+            + SCORE_WEIGHTS["condition"] * self.condition_score(weather_conditions)
+            + SCORE_WEIGHTS["intensity"] * self.intensity_score(intensity, is_outdoor)
+        )
+
+    def eligible(self, weather_key: Tuple[Any, ...]) -> bool:
+        """Mêmes règles que le filtrage : fenêtre de température, pas d'extérieur sous la pluie/neige"""
+        is_outdoor, _, temp_min, temp_max, _ = weather_key
+        t = self.context.temp
+        if t is not None and ((temp_min is not None and t < temp_min) or (temp_max is not None and t > temp_max)):
+            return False
+        return not (self.context.exclude_outdoor and is_outdoor)
+
+    def _per_version(self, name: Any, compute: Callable[[], List[Optional[float]]]) -> List[Optional[float]]:
+        """Liste calculée sous le verrou de l'index, recalculée si l'index a changé depuis"""
+        with self.index.lock:
+            version = self.index.version
+            cached = self._scores.get(name)
+            if cached is None or cached[0] != version:
+                cached = self._scores[name] = (version, compute())
+            return cached[1]
+
+    def weather_scores(self, eligible_only: bool = False) -> List[Optional[float]]:
+        """Score météo de chaque ligne de la matrice (None : combinaison exclue)"""
+        return self._per_version(("weather", eligible_only), lambda: [
+            self.weather_score(row) if not eligible_only or self.eligible(row) else None
+            for row in self.index.weather_rows
+        ])
+
+    def label_scores(self) -> List[float]:
+        return self._per_version("labels", lambda: [
+            SCORE_WEIGHTS["affinity"] * self.affinity_score(row) for row in self.index.label_rows
+        ])
+
+    def score(self, features: ActivityFeatures) -> float:
+        return self.weather_score(features.weather_key) + SCORE_WEIGHTS["affinity"] * self.affinity_score(features.labels)
+
+    def top_k(
+        self,
+        candidates: Set[int],
+        k: int,
+        exclude: Container[int] = (),
+        eligible_only: bool = False,
+        label_scores: Optional[Callable[[], List[float]]] = None,
+    ) -> List[Tuple[float, int]]:
+        """
+        Les k meilleurs (score, id), à égalité les plus récentes d'abord.
+        eligible_only : applique aussi les règles météo (candidats non filtrés par température).
+        label_scores : scores d'affinité d'un autre moteur (même profil, partagés d'un créneau à l'autre).
+        """
+        ranked = self.index.top_k(
+            candidates, k, lambda: self.weather_scores(eligible_only), label_scores or self.label_scores, exclude
+        )
+        return [(round(score, 4), activity_id) for score, activity_id in ranked]
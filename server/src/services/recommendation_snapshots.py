@@ -0,0 +1,204 @@
+# services/recommendation_snapshots.py
+import heapq
+import math
+import threading
+from typing import Any, Callable, Container, Dict, Hashable, List, NamedTuple, Optional, Sequence, Tuple
+
+from server.src.core.config import (
+    RECOMMENDATION_SNAPSHOT_AGE_BAND,
+    RECOMMENDATION_SNAPSHOT_CACHE_SIZE,
+    RECOMMENDATION_SNAPSHOT_DEPTH,
+    RECOMMENDATION_SNAPSHOT_TEMP_STEP,
+    RECOMMENDATION_SNAPSHOT_TTL,
+)
+from server.src.services.activity_index import ActivityIndex
+from server.src.services.weather_cache import TTLCache
+
+
+def weather_bucket(context: Any, temp_step: float = RECOMMENDATION_SNAPSHOT_TEMP_STEP) -> Tuple[Any, ...]:
+    """
+    Tranche météo d'un WeatherContext : température par pas de temp_step, condition,
+    humidité et vent par paliers de l'inconfort qu'ils causent (au-delà de 60 % / jusqu'à 15 m/s)
+    """
+    temp = math.floor(context.temp / temp_step) if context.temp is not None else None
+    humidity = int(max((context.humidity or 0.0) - 60, 0) // 10)
+    wind = int(min(context.wind_speed or 0.0, 15) // 3)
+    return temp, context.condition, context.exclude_outdoor, humidity, wind
+
+
+def temperature_range(temp: Optional[float], temp_step: float = RECOMMENDATION_SNAPSHOT_TEMP_STEP) -> Optional[Tuple[float, float]]:
+    """Températures [début, fin[ de la tranche de temp (celle de weather_bucket)"""
+    if temp is None:
+        return None
+    start = math.floor(temp / temp_step) * temp_step
+    return start, start + temp_step
+
+
+def age_band(age: Optional[int], width: int = RECOMMENDATION_SNAPSHOT_AGE_BAND) -> Optional[Tuple[int, int]]:
+    """Tranche d'âge [début, fin] contenant age (None : âge inconnu, pas de filtre)"""
+    if age is None:
+        return None
+    start = age // width * width
+    return start, start + width - 1
+
+
+class Snapshot(NamedTuple):
+    """
+    Classement météo d'un groupe d'utilisateurs, sans historique ni affinité : activités
+    compatibles avec au moins une température de la tranche et un âge de la tranche d'âge
+    """
+    ranked: List[Tuple[float, float, int]]  # (score météo, created_at, id), du meilleur au moins bon
+    complete: bool                           # False : tronqué à `depth` activités
+    version: int                             # version de l'index à la construction
+
+
+def select(
+    index: ActivityIndex,
+    snapshot: Snapshot,
+    k: int,
+    age: Optional[int],
+    temp: Optional[float],
+    label_scores: Callable[[], Sequence[float]],
+    exclude: Container[int] = (),
+) -> Optional[List[Tuple[float, int]]]:
+    """
+    Les k meilleurs (score, id) d'un instantané pour un utilisateur : âge exact, température
+    actuelle (fenêtre idéale de l'activité) et historique en exclusion finale, affinité ajoutée
+    au score météo. Le parcours s'arrête dès qu'aucune activité restante ne peut entrer dans
+    le top-k ; None si l'instantané tronqué ne suffit pas.
+    label_scores (un score par ligne de index.label_rows) est appelée sous le verrou de l'index,
+    comme pour ActivityIndex.top_k.
+    """
+    if k <= 0:
+        return []
+    with index.lock:
+        return _select(index, snapshot, k, age, temp, label_scores(), exclude)
+
+
+def _select(
+    index: ActivityIndex,
+    snapshot: Snapshot,
+    k: int,
+    age: Optional[int],
+    temp: Optional[float],
+    label_scores: Sequence[float],
+    exclude: Container[int],
+) -> Optional[List[Tuple[float, int]]]:
+    best_label = max(label_scores, default=0.0)
+    heap: List[Tuple[float, float, int]] = []
+    for weather_score, created_at, i in snapshot.ranked:
+        if len(heap) == k and weather_score + best_label < heap[0][0]:
+            break
+        if i in exclude:
+            continue
+        features, label_code = index.features(i), index.label_code.get(i)
+        if features is None or label_code is None:
+            continue
+        if age is not None and (
+            features.min_age is None or features.min_age > age
+            or (features.max_age is not None and features.max_age < age)
+        ):
+            continue
+        if temp is not None and (
+            (features.temp_min is not None and temp < features.temp_min)
+            or (features.temp_max is not None and temp > features.temp_max)
+        ):
+            continue
+        item = (weather_score + label_scores[label_code], created_at, i)
+        if len(heap) < k:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+    else:
+        if not snapshot.complete:
+            return None
+    return [(score, i) for score, _, i in sorted(heap, reverse=True)]
+
+
+class RecommendationSnapshots:
+    """
+    Instantanés de classement par (ville, tranche météo, tranche d'âge, is_outdoor).
+    Un instantané est reconstruit quand la météo de la ville change de tranche (nouvelle clé)
+    ou quand le catalogue change (version de l'index) ; le TTL borne sa durée de vie.
+    """
+
+    def __init__(
+        self,
+        max_size: int = RECOMMENDATION_SNAPSHOT_CACHE_SIZE,
+        ttl: float = RECOMMENDATION_SNAPSHOT_TTL,
+        depth: int = RECOMMENDATION_SNAPSHOT_DEPTH,
+    ):
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+        self._lock = threading.Lock()
+        self.depth = depth
+
+        # Compteurs
+        self.hits = 0
+        self.builds = 0
+        self.fallbacks = 0
+
+    def get(
+        self,
+        index: ActivityIndex,
+        key: Hashable,
+        build: Callable[[int], List[Tuple[float, int]]],
+    ) -> Snapshot:
+        """
+        Instantané de `key`, construit au besoin par build(n) : les n meilleurs (score météo, id)
+        """
+        snapshot: Optional[Snapshot] = self._cache.get(key)
+        if snapshot is not None and snapshot.version == index.version:
+            with self._lock:
+                self.hits += 1
+            return snapshot
+        version = index.version
+        ranked = build(self.depth + 1)
+        # Une activité supprimée entre-temps (autre requête) est ignorée ; la version
+        # lue avant la construction fera reconstruire l'instantané au prochain usage
+        entries = []
+        for score, i in ranked[:self.depth]:
+            features = index.features(i)
+            if features is not None:
+                entries.append((score, features.created_at, i))
+        snapshot = Snapshot(entries, complete=len(ranked) <= self.depth, version=version)
+        self._cache.set(key, snapshot)
+        with self._lock:
+            self.builds += 1
+        return snapshot
+
+    def top_k(
+        self,
+        index: ActivityIndex,
+        key: Hashable,
+        build: Callable[[int], List[Tuple[float, int]]],
+        k: int,
+        age: Optional[int],
+        temp: Optional[float],
+        label_scores: Callable[[], Sequence[float]],
+        exclude: Container[int] = (),
+    ) -> Optional[List[Tuple[float, int]]]:
+        """select() sur l'instantané de `key` ; None : à recalculer sans instantané"""
+        ranked = select(index, self.get(index, key, build), k, age, temp, label_scores, exclude)
+        if ranked is None:
+            with self._lock:
+                self.fallbacks += 1
+        return ranked
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "builds": self.builds, "fallbacks": self.fallbacks, "cache": self._cache.stats()}
+
+
+_snapshots: Optional[RecommendationSnapshots] = None
+_snapshots_lock = threading.Lock()
+
+
+def get_recommendation_snapshots() -> RecommendationSnapshots:
+    """Instantanés partagés du process"""
+    global _snapshots
+    with _snapshots_lock:
+        if _snapshots is None:
+            _snapshots = RecommendationSnapshots()
+        return _snapshots
@@ -0,0 +1,85 @@
+# services/retry_policy.py
+import random
+import threading
+from typing import Any, Callable, Dict
+
+import httpx
+import requests
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Erreurs transitoires pour lesquelles un GET (idempotent) peut être rejoué :
+    timeouts, erreurs de connexion et 5xx. Les 429 ne sont pas rejoués (quota).
+    """
+    if isinstance(error, (httpx.TransportError,
+                          requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return True
+    if isinstance(error, (httpx.HTTPStatusError, requests.exceptions.HTTPError)):
+        status_code = getattr(error.response, "status_code", None)
+        return status_code is not None and status_code >= 500
+    return False
+
+
+class RetryPolicy:
+    """
+    Nouvelles tentatives avec backoff exponentiel et jitter complet, limitées par un budget :
+    chaque appel crédite `budget_ratio` jeton, chaque nouvelle tentative en consomme un.
+    En cas de panne, les tentatives s'arrêtent donc d'elles-mêmes au lieu de multiplier la charge.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.2,
+        max_delay: float = 2.0,
+        budget_ratio: float = 0.2,
+        budget_max: float = 10.0,
+        rand: Callable[[float, float], float] = random.uniform,
+    ):
+        if max_attempts <= 0:
+            raise ValueError("max_attempts doit être strictement positif")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.budget_max = budget_max
+        self._rand = rand
+        self._lock = threading.Lock()
+        self._tokens = budget_max
+
+        # Compteurs
+        self.calls = 0
+        self.retries = 0
+        self.budget_exhausted = 0
+
+    def on_call(self) -> None:
+        """À appeler une fois par appel logique (pas par tentative)"""
+        with self._lock:
+            self.calls += 1
+            self._tokens = min(self.budget_max, self._tokens + self.budget_ratio)
+
+    def should_retry(self, error: Exception, attempt: int) -> bool:
+        """attempt : numéro (à partir de 0) de la tentative qui vient d'échouer"""
+        if attempt + 1 >= self.max_attempts or not is_retryable(error):
+            return False
+        with self._lock:
+            if self._tokens < 1:
+                self.budget_exhausted += 1
+                return False
+            self._tokens -= 1
+            self.retries += 1
+            return True
+
+    def backoff(self, attempt: int) -> float:
+        """Délai avant la tentative suivante : uniforme dans [0, min(max_delay, base_delay * 2^attempt)]"""
+        return self._rand(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "budget_exhausted": self.budget_exhausted,
+                "budget_tokens": round(self._tokens, 2),
+            }
@@ -0,0 +1,95 @@
+# services/viewed_history.py
+import threading
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from sqlalchemy.orm import Session
+
+from server.src.core.config import RECOMMENDATION_HISTORY_CACHE_SIZE, RECOMMENDATION_HISTORY_CACHE_TTL
+from server.src.models.history_model import History
+from server.src.services.weather_cache import TTLCache
+
+
+class Bitset:
+    """Ensemble d'IDs positifs sur un bytearray (bit n = ID n) : test d'appartenance en O(1)"""
+
+    __slots__ = ("_bits", "count")
+
+    def __init__(self, ids: Iterable[int] = ()):
+        ids = list(ids)
+        self._bits = bytearray((max(ids) >> 3) + 1 if ids else 0)
+        self.count = 0
+        for i in ids:
+            self.add(i)
+
+    def add(self, i: int) -> None:
+        byte = i >> 3
+        if byte >= len(self._bits):
+            self._bits.extend(bytes(byte + 1 - len(self._bits)))
+        mask = 1 << (i & 7)
+        if not self._bits[byte] & mask:
+            self._bits[byte] |= mask
+            self.count += 1
+
+    def __contains__(self, i: int) -> bool:
+        byte = i >> 3
+        return 0 <= byte < len(self._bits) and bool(self._bits[byte] >> (i & 7) & 1)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[int]:
+        for byte, bits in enumerate(self._bits):
+            while bits:
+                low = bits & -bits
+                yield (byte << 3) + low.bit_length() - 1
+                bits ^= low
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
+
+
+class ViewedHistory:
+    """
+    Activités déjà vues par utilisateur (bitsets), chargées une fois depuis la table history
+    puis tenues à jour par history_service. Le TTL borne le retard sur les ajouts faits
+    par un autre process ; une mise à jour locale ne le prolonge pas.
+    """
+
+    def __init__(self, max_users: int = RECOMMENDATION_HISTORY_CACHE_SIZE, ttl: float = RECOMMENDATION_HISTORY_CACHE_TTL):
+        self._cache = TTLCache(max_size=max_users, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, user_id: int) -> Bitset:
+        viewed = self._cache.get(user_id)
+        if viewed is None:
+            rows = db.query(History.activity_id).filter(History.user_id == user_id).all()
+            viewed = Bitset(activity_id for activity_id, in rows)
+            self._cache.set(user_id, viewed)
+        return viewed
+
+    def add(self, user_id: int, activity_id: int) -> None:
+        """Activité ajoutée à l'historique (après commit)"""
+        with self._lock:
+            viewed: Optional[Bitset] = self._cache.peek(user_id)
+            if viewed is not None:
+                viewed.add(activity_id)
+
+    def invalidate(self, user_id: int) -> None:
+        self._cache.delete(user_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+
+_viewed_history: Optional[ViewedHistory] = None
+_viewed_history_lock = threading.Lock()
+
+
+def get_viewed_history() -> ViewedHistory:
+    """Historiques partagés du process"""
+    global _viewed_history
+    with _viewed_history_lock:
+        if _viewed_history is None:
+            _viewed_history = ViewedHistory()
+        return _viewed_history
@@ -0,0 +1,152 @@
+# services/weather_cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional, Tuple
+
+
+class CacheEntry(NamedTuple):
+    """Entrée lue avec ses métadonnées de fraîcheur"""
+    value: Any
+    age: float            # secondes depuis la mise en cache
+    ttl_remaining: float  # <= 0 : entrée périmée, encore servable pendant stale_ttl
+    stored_at: float = 0.0  # date de mise en cache (horloge du cache) : identifie la version
+
+    @property
+    def fresh(self) -> bool:
+        return self.ttl_remaining > 0
+
+
+class TTLCache:
+    """
+    Cache mémoire borné : expiration par TTL + éviction LRU.
+    Une entrée expirée reste lisible via get_entry pendant `stale_ttl` secondes
+    (stale-while-revalidate) avant d'être supprimée.
+    Thread-safe (les routes sync tournent dans le threadpool de FastAPI).
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: float = 600.0,
+        clock: Callable[[], float] = time.monotonic,
+        stale_ttl: float = 0.0,
+    ):
+        if max_size <= 0:
+            raise ValueError("max_size doit être strictement positif")
+        if ttl <= 0:
+            raise ValueError("ttl doit être strictement positif")
+        if stale_ttl < 0:
+            raise ValueError("stale_ttl doit être positif ou nul")
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._clock = clock
+        # clé -> (stored_at, expires_at, valeur)
+        self._data: "OrderedDict[Hashable, Tuple[float, float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Compteurs
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _lookup(self, key: Hashable, now: float) -> Optional[Tuple[float, float, Any]]:
+        """Entrée encore servable (fraîche ou périmée), en purgeant celles hors délai (verrou pris)"""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] + self.stale_ttl <= now:
+            del self._data[key]
+            self.expirations += 1
+            return None
+        return entry
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Retourne la valeur si elle est présente et non expirée, sinon None"""
+        with self._lock:
+            now = self._clock()
+            entry = self._lookup(key, now)
+            if entry is None or entry[1] <= now:
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def get_entry(self, key: Hashable) -> Optional[CacheEntry]:
+        """Comme get, mais renvoie aussi les entrées périmées encore dans la fenêtre stale_ttl"""
+        with self._lock:
+            now = self._clock()
+            entry = self._lookup(key, now)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            stored_at, expires_at, value = entry
+            self._data.move_to_end(key)
+            if expires_at > now:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+            return CacheEntry(value, now - stored_at, expires_at - now, stored_at)
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Comme get, sans toucher aux compteurs ni à l'ordre LRU"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] <= self._clock():
+                return None
+            return entry[2]
+
+    def peek_entry(self, key: Hashable) -> Optional[CacheEntry]:
+        """Comme get_entry, sans toucher aux compteurs ni à l'ordre LRU"""
+        with self._lock:
+            now = self._clock()
+            entry = self._data.get(key)
+            if entry is None or entry[1] + self.stale_ttl <= now:
+                return None
+            return CacheEntry(entry[2], now - entry[0], entry[1] - now, entry[0])
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Ajoute/remplace une entrée, en évinçant la moins récemment utilisée si plein"""
+        now = self._clock()
+        expires_at = now + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            self._data[key] = (now, expires_at, value)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Instantané des compteurs (pour le health check / les métriques)"""
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "stale_ttl": self.stale_ttl,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -1,21 +1,240 @@
+import asyncio
+import threading
+import time
 import requests
-from typing import Any, Dict, Optional
+import httpx
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Hashable, Iterable, List, NamedTuple, Optional, Tuple
 import logging
 from datetime import datetime
+from server.src.core.config import (
+    WEATHER_CACHE_TTL,
+    WEATHER_CACHE_MAX_SIZE,
+    WEATHER_CACHE_BACKEND,
+    WEATHER_CACHE_SQLITE_PATH,
+    WEATHER_CACHE_REDIS_URL,
+    WEATHER_FORECAST_CACHE_TTL,
+    WEATHER_COORDS_PRECISION,
+    WEATHER_GEO_PRECISION,
+    WEATHER_GEO_RADIUS_KM,
+    WEATHER_HTTP_TIMEOUT,
+    WEATHER_HTTP_MAX_CONNECTIONS,
+    WEATHER_HTTP_MAX_KEEPALIVE,
+    WEATHER_HTTP_KEEPALIVE_EXPIRY,
+    WEATHER_HTTP2,
+    WEATHER_BATCH_CONCURRENCY,
+    WEATHER_CITY_INDEX_PATH,
+    WEATHER_GAZETTEER_ENABLED,
+    WEATHER_GAZETTEER_PATH,
+    WEATHER_GAZETTEER_MAX_TYPOS,
+    WEATHER_STALE_TTL,
+    WEATHER_REFRESH_INTERVAL,
+    WEATHER_REFRESH_TOP_N,
+    WEATHER_STALE_IF_ERROR_MAX_AGE,
+    WEATHER_BREAKER_FAILURE_THRESHOLD,
+    WEATHER_BREAKER_COOLDOWN,
+    WEATHER_BREAKER_HALF_OPEN_CALLS,
+    WEATHER_RETRY_MAX_ATTEMPTS,
+    WEATHER_RETRY_BASE_DELAY,
+    WEATHER_RETRY_MAX_DELAY,
+    WEATHER_RETRY_BUDGET_RATIO,
+    WEATHER_TIMEOUT_MIN,
+    WEATHER_TIMEOUT_PERCENTILE,
+    WEATHER_TIMEOUT_MULTIPLIER,
+    WEATHER_RATE_LIMIT_PER_MINUTE,
+    WEATHER_RATE_LIMIT_BURST,
+    WEATHER_RATE_LIMIT_MAX_WAIT,
+)
+from server.src.services.cache_backends import WeatherCache, create_cache, create_store
+from server.src.services.single_flight import SingleFlight, AsyncSingleFlight
+from server.src.services.city_index import CityIdIndex
+from server.src.services.circuit_breaker import CLOSED, CircuitBreaker, CircuitOpenError
+from server.src.services.retry_policy import RetryPolicy
+from server.src.services.adaptive_timeout import AdaptiveTimeout
+from server.src.services.rate_limiter import RateLimitExceeded, TokenBucket
+from server.src.services.geo_cache import GeoIndex, geohash_center
+from server.src.services.gazetteer import BUNDLED_GAZETTEER_PATH, Gazetteer, get_gazetteer
+from server.src.services.forecast_aggregation import ForecastStream
+
+try:
+    import h2  # noqa: F401  (dépendance optionnelle : httpx[http2])
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
 
 logger = logging.getLogger(__name__)
 
-class WeatherService:
-    def __init__(self, api_key: str):
+# Nombre maximal d'IDs de villes par appel /group (limite OpenWeatherMap)
+GROUP_MAX_IDS = 20
+
+# Taille des morceaux lus sur une réponse en flux (/forecast)
+STREAM_CHUNK_SIZE = 16 * 1024
+
+
+def normalize_city(city: str) -> str:
+    """Normalise un nom de ville pour servir de clé de cache ("  New   York " -> "new york")"""
+    return " ".join(city.split()).casefold()
+
+
+_rate_limiter: Optional[TokenBucket] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> Optional[TokenBucket]:
+    """Seau à jetons du quota de la clé API, partagé par tous les services du process (None si désactivé)"""
+    global _rate_limiter
+    if WEATHER_RATE_LIMIT_PER_MINUTE <= 0:
+        return None
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = TokenBucket(
+                rate=WEATHER_RATE_LIMIT_PER_MINUTE / 60,
+                burst=WEATHER_RATE_LIMIT_BURST,
+                max_wait=WEATHER_RATE_LIMIT_MAX_WAIT,
+            )
+        return _rate_limiter
+
+
+def default_gazetteer() -> Optional[Gazetteer]:
+    """Gazetteer configuré (WEATHER_GAZETTEER_*), partagé par tout le process"""
+    if not WEATHER_GAZETTEER_ENABLED:
+        return None
+    return get_gazetteer(WEATHER_GAZETTEER_PATH or BUNDLED_GAZETTEER_PATH, WEATHER_GAZETTEER_MAX_TYPOS)
+
+
+def is_upstream_failure(error: Exception) -> bool:
+    """Erreurs imputables au service météo (panne, timeout, quota) et non à la requête elle-même"""
+    if isinstance(error, (CircuitOpenError, RateLimitExceeded, httpx.TransportError,
+                          requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return True
+    if isinstance(error, (httpx.HTTPStatusError, requests.exceptions.HTTPError)):
+        status_code = getattr(error.response, "status_code", None)
+        return status_code is not None and (status_code == 429 or status_code >= 500)
+    return False
+
+
+class WeatherLookup(NamedTuple):
+    """Résultat d'une recherche d'un lot : données brutes ou erreur"""
+    query: str
+    data: Optional[Dict[str, Any]] = None
+    error: Optional[Exception] = None
+    age: float = 0.0
+    stale: bool = False
+
+
+class WeatherResult(NamedTuple):
+    """
+    Données brutes avec leur âge ; stale=True si elles sont en cours de rafraîchissement,
+    degraded=True si elles remplacent une réponse que le service météo n'a pas pu fournir.
+    version identifie l'entrée de cache d'où viennent les données (date de mise en cache).
+    """
+    data: Dict[str, Any]
+    age: float = 0.0
+    stale: bool = False
+    degraded: bool = False
+    version: float = 0.0
+
+
+def create_async_client(
+    timeout: float = WEATHER_HTTP_TIMEOUT,
+    max_connections: int = WEATHER_HTTP_MAX_CONNECTIONS,
+    max_keepalive: int = WEATHER_HTTP_MAX_KEEPALIVE,
+    keepalive_expiry: float = WEATHER_HTTP_KEEPALIVE_EXPIRY,
+    http2: bool = WEATHER_HTTP2,
+) -> httpx.AsyncClient:
+    """Client HTTP poolé (keep-alive, HTTP/2 si h2 est installé), à créer une fois par process"""
+    return httpx.AsyncClient(
+        timeout=timeout,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        ),
+        http2=http2 and HTTP2_AVAILABLE,
+    )
+
+
+class BaseWeatherService:
+    """Partie commune aux services sync et async : configuration, paramètres et clés de cache"""
+
+    # Endpoints lus en flux : la réponse est agrégée au fil de l'eau et mise en cache au format compact
+    STREAMED_ENDPOINTS = {"/forecast": ForecastStream}
+
+    def __init__(
+        self,
+        api_key: str,
+        cache: Optional[WeatherCache] = None,
+        coords_precision: int = WEATHER_COORDS_PRECISION,
+        city_index: Optional[CityIdIndex] = None,
+        forecast_cache: Optional[WeatherCache] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        stale_if_error: float = WEATHER_STALE_IF_ERROR_MAX_AGE,
+        retry_policy: Optional[RetryPolicy] = None,
+        timeouts: Optional[AdaptiveTimeout] = None,
+        rate_limiter: Optional[TokenBucket] = None,
+        geo_index: Optional[GeoIndex] = None,
+        gazetteer: Optional[Gazetteer] = None,
+    ):
         if not api_key:
             raise ValueError("OPENWEATHER_API_KEY manquant : mets ta clé dans .env")
         self.api_key = api_key
         self.base_url = "https://api.openweathermap.org/data/2.5"
-    
-    def _make_api_call(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
-        """Méthode générique pour appeler l'API OpenWeatherMap"""
-        url = f"{self.base_url}{endpoint}"
-        
+        # Cache de la météo actuelle (réponses brutes OpenWeatherMap)
+        # Les entrées expirées sont conservées assez longtemps pour le stale-while-revalidate
+        # et pour servir de secours en cas de panne (stale-if-error)
+        retention = max(WEATHER_STALE_TTL, stale_if_error)
+        # Avec WEATHER_CACHE_BACKEND=sqlite/redis, les deux caches partagent un stockage commun à tous les workers
+        self.cache_store = None
+        if cache is None or forecast_cache is None:
+            self.cache_store = create_store(
+                WEATHER_CACHE_BACKEND, WEATHER_CACHE_SQLITE_PATH, WEATHER_CACHE_REDIS_URL,
+                max_size=2 * WEATHER_CACHE_MAX_SIZE,
+            )
+        self.cache = cache if cache is not None else create_cache(
+            WEATHER_CACHE_BACKEND, "meteo:current", WEATHER_CACHE_MAX_SIZE, WEATHER_CACHE_TTL, retention,
+            store=self.cache_store,
+        )
+        # Cache des prévisions brutes (5 jours / 3h) : un seul payload par ville, quel que soit `days`
+        self.forecast_cache = forecast_cache if forecast_cache is not None else create_cache(
+            WEATHER_CACHE_BACKEND, "meteo:forecast", WEATHER_CACHE_MAX_SIZE, WEATHER_FORECAST_CACHE_TTL, retention,
+            store=self.cache_store,
+        )
+        self.coords_precision = coords_precision
+        # Recherches par coordonnées regroupées par cellule geohash, avec reprise d'une cellule voisine
+        self.geo_index = geo_index if geo_index is not None else GeoIndex(WEATHER_GEO_PRECISION)
+        self.geo_radius_km = WEATHER_GEO_RADIUS_KM
+        # Nom de ville -> ID OpenWeatherMap, pour les appels groupés /group
+        self.city_index = city_index if city_index is not None else CityIdIndex(WEATHER_CITY_INDEX_PATH)
+        # Noms saisis ("paris ", "Pàris", "Paris,FR") ramenés à une ville canonique avant tout appel
+        self.gazetteer = gazetteer if gazetteer is not None else default_gazetteer()
+        # Mode dégradé : disjoncteur + âge maximal des données de secours
+        self.breaker = breaker if breaker is not None else CircuitBreaker(
+            failure_threshold=WEATHER_BREAKER_FAILURE_THRESHOLD,
+            cooldown=WEATHER_BREAKER_COOLDOWN,
+            half_open_max_calls=WEATHER_BREAKER_HALF_OPEN_CALLS,
+        )
+        # Nouvelles tentatives (GET idempotents) et timeout suivant les latences observées
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy(
+            max_attempts=WEATHER_RETRY_MAX_ATTEMPTS,
+            base_delay=WEATHER_RETRY_BASE_DELAY,
+            max_delay=WEATHER_RETRY_MAX_DELAY,
+            budget_ratio=WEATHER_RETRY_BUDGET_RATIO,
+        )
+        self.timeouts = timeouts if timeouts is not None else AdaptiveTimeout(
+            min_timeout=min(WEATHER_TIMEOUT_MIN, WEATHER_HTTP_TIMEOUT),
+            max_timeout=WEATHER_HTTP_TIMEOUT,
+            pct=WEATHER_TIMEOUT_PERCENTILE,
+            multiplier=WEATHER_TIMEOUT_MULTIPLIER,
+        )
+        self.rate_limiter = rate_limiter if rate_limiter is not None else get_rate_limiter()
+        self.stale_if_error = stale_if_error
+        self.stale_if_error_served = 0
+
+    def _coords_key(self, lat: float, lon: float) -> Tuple[float, float]:
+        return (round(lat, self.coords_precision), round(lon, self.coords_precision))
+
+    def _api_params(self, params: Dict[str, Any]) -> Dict[str, Any]:
         # Paramètres par défaut
         default_params = {
             "appid": self.api_key,
@@ -23,13 +242,304 @@ class WeatherService:
             "lang": "fr"
         }
         default_params.update(params)
-        
+        return default_params
+
+    @staticmethod
+    def _flight_key(endpoint: str, params: Dict[str, Any]) -> Hashable:
+        return (endpoint, tuple(sorted(params.items())))
+
+    def _city_request(self, city: str, kind: str = "weather") -> Tuple[Hashable, Dict[str, Any]]:
+        """Ville connue du gazetteer : clé canonique et requête "Nom,PAYS" ; sinon la saisie normalisée"""
+        place = self.gazetteer.resolve(city) if self.gazetteer is not None else None
+        if place is not None:
+            return (kind, "city", place.id), {"q": place.query}
+        return (kind, "city", normalize_city(city)), {"q": city}
+
+    def city_cache_key(self, city: str, kind: str = "weather") -> Hashable:
+        """Clé de cache de la ville : deux graphies d'une même ville du gazetteer ont la même clé"""
+        return self._city_request(city, kind)[0]
+
+    def _cell_request(self, cell: str, kind: str = "weather") -> Tuple[Hashable, Dict[str, Any]]:
+        """Une cellule geohash = une observation, demandée au centre de la cellule"""
+        lat, lon = self._coords_key(*geohash_center(cell))
+        return (kind, "geo", cell), {"lat": lat, "lon": lon}
+
+    def _coords_request(self, lat: float, lon: float, kind: str = "weather") -> Tuple[Hashable, Dict[str, Any]]:
+        """
+        Clé de la cellule de la position, ou de la cellule voisine la plus proche
+        si elle a une entrée fraîche dans le rayon geo_radius_km.
+        """
+        def is_fresh(cell: str) -> bool:
+            key = (kind, "geo", cell)
+            entry = self._cache_for(key).peek_entry(key)
+            if entry is None:
+                # Entrée évincée ou expirée : la cellule sort de l'index
+                self.geo_index.discard(kind, cell)
+                return False
+            return entry.fresh
+
+        cell = self.geo_index.nearest(kind, lat, lon, self.geo_radius_km, is_fresh)
+        return self._cell_request(cell or self.geo_index.cell(lat, lon), kind)
+
+    def _cache_for(self, key: Hashable) -> WeatherCache:
+        """Le premier élément de la clé ("weather" / "forecast") désigne le cache concerné"""
+        return self.forecast_cache if key[0] == "forecast" else self.cache
+
+    def _batch_requests(
+        self,
+        cities: Iterable[str],
+        coords: Iterable[Tuple[float, float]],
+    ) -> Dict[Hashable, Tuple[str, Dict[str, Any]]]:
+        """Dédoublonne un lot par clé de cache : {clé: (libellé, params)} dans l'ordre d'arrivée"""
+        requests_by_key: Dict[Hashable, Tuple[str, Dict[str, Any]]] = {}
+        for city in cities:
+            city = " ".join(city.split())
+            if not city:
+                continue
+            key, params = self._city_request(city)
+            requests_by_key.setdefault(key, (city, params))
+        for lat, lon in coords:
+            key, params = self._coords_request(lat, lon)
+            label_lat, label_lon = self._coords_key(lat, lon)
+            requests_by_key.setdefault(key, (f"{label_lat},{label_lon}", params))
+        return requests_by_key
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cache": self.cache.stats(),
+            "forecast_cache": self.forecast_cache.stats(),
+            "single_flight": self.single_flight.stats(),
+            "city_index": len(self.city_index),
+            "geo_index": self.geo_index.stats(),
+            "breaker": self.breaker.stats(),
+            "retries": self.retry_policy.stats(),
+            "latency": self.timeouts.stats(),
+            "rate_limiter": self.rate_limiter.stats() if self.rate_limiter is not None else None,
+            "stale_if_error_served": self.stale_if_error_served,
+        }
+
+    def _record_outcome(self, started: float, error: Optional[Exception] = None) -> None:
+        """
+        Met à jour le disjoncteur (seules les pannes du service météo comptent comme échecs)
+        et les latences, pour toute réponse effectivement reçue.
+        """
+        if error is None or isinstance(error, (httpx.HTTPStatusError, requests.exceptions.HTTPError)):
+            self.timeouts.observe(time.monotonic() - started)
+        if error is not None and is_upstream_failure(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def _reserve_call(self) -> float:
+        """
+        Vérifie le disjoncteur puis prend un jeton du quota ; renvoie l'attente imposée
+        par le limiteur (RateLimitExceeded si elle dépasse le délai accepté).
+        """
+        self.breaker.before_call()
+        if self.rate_limiter is None:
+            return 0.0
+        try:
+            return self.rate_limiter.reserve()
+        except RateLimitExceeded:
+            self.breaker.release()
+            raise
+
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        # Inutile de rejouer si l'échec vient d'ouvrir le disjoncteur
+        return self.breaker.state == CLOSED and self.retry_policy.should_retry(error, attempt)
+
+    def _stale_fallback(self, key: Hashable, error: Exception) -> Optional[WeatherResult]:
+        """Dernière observation connue si l'erreur vient du service météo et qu'elle n'est pas trop ancienne"""
+        if not is_upstream_failure(error):
+            return None
+        entry = self._cache_for(key).peek_entry(key)
+        if entry is None or entry.age > self.stale_if_error:
+            return None
+        self.stale_if_error_served += 1
+        logger.warning(f"Service météo indisponible ({error}), données de secours pour {key} ({entry.age:.0f}s)")
+        return WeatherResult(entry.value, age=entry.age, stale=True, degraded=True, version=entry.stored_at)
+
+    def _index_entry(self, key: Hashable, data: Dict[str, Any]) -> None:
+        """Met à jour les index secondaires après la mise en cache d'une réponse"""
+        if key[1] == "geo":
+            self.geo_index.add(key[0], key[2])
+        else:
+            self._learn_city_id(key, data)
+
+    def _learn_city_id(self, key: Hashable, data: Dict[str, Any]) -> None:
+        """Retient l'ID OpenWeatherMap d'une ville à partir d'une réponse /weather"""
+        if key[1] == "city":
+            # /weather : "id" à la racine ; /forecast : dans l'objet "city"
+            self.city_index.learn(key[2], data.get("id") or (data.get("city") or {}).get("id"))
+
+    def _plan_batch(
+        self,
+        requests_by_key: Dict[Hashable, Tuple[str, Dict[str, Any]]],
+    ) -> Tuple[Dict[Hashable, WeatherLookup], List[List[Tuple[int, Hashable]]], List[Hashable]]:
+        """
+        Répartit un lot : résultats déjà en cache, paquets /group (villes dont l'ID
+        est connu, 20 max par paquet) et appels /weather unitaires pour le reste.
+        """
+        results: Dict[Hashable, WeatherLookup] = {}
+        with_ids: List[Tuple[int, Hashable]] = []
+        singles: List[Hashable] = []
+        for key, (query, params) in requests_by_key.items():
+            data = self.cache.get(key)
+            if data is not None:
+                results[key] = WeatherLookup(query, data=data)
+                continue
+            city_id = self.city_index.get(key[2]) if key[1] == "city" else None
+            if city_id:
+                with_ids.append((city_id, key))
+            else:
+                singles.append(key)
+        groups = [with_ids[i:i + GROUP_MAX_IDS] for i in range(0, len(with_ids), GROUP_MAX_IDS)]
+        return results, groups, singles
+
+    def _batch_failure(self, key: Hashable, query: str, error: Exception) -> WeatherLookup:
+        fallback = self._stale_fallback(key, error)
+        if fallback is None:
+            return WeatherLookup(query, error=error)
+        return WeatherLookup(query, data=fallback.data, age=fallback.age, stale=True)
+
+    @staticmethod
+    def _group_params(group: List[Tuple[int, Hashable]]) -> Dict[str, Any]:
+        return {"id": ",".join(str(city_id) for city_id in sorted({city_id for city_id, _ in group}))}
+
+    def _store_group_response(
+        self,
+        group: List[Tuple[int, Hashable]],
+        data: Dict[str, Any],
+    ) -> Tuple[Dict[Hashable, Dict[str, Any]], List[Hashable]]:
+        """Met en cache chaque ville d'une réponse /group ; renvoie (trouvées, absentes)"""
+        by_id = {item.get("id"): item for item in data.get("list") or []}
+        found: Dict[Hashable, Dict[str, Any]] = {}
+        missing: List[Hashable] = []
+        for city_id, key in group:
+            item = by_id.get(city_id)
+            if item is None:
+                missing.append(key)
+                continue
+            self.cache.set(key, item)
+            found[key] = item
+        return found, missing
+
+
+class WeatherService(BaseWeatherService):
+    """Service synchrone (scripts, jobs) : requests avec une Session pour réutiliser les connexions"""
+
+    def __init__(
+        self,
+        api_key: str,
+        cache: Optional[WeatherCache] = None,
+        single_flight: Optional[SingleFlight] = None,
+        coords_precision: int = WEATHER_COORDS_PRECISION,
+        city_index: Optional[CityIdIndex] = None,
+        forecast_cache: Optional[WeatherCache] = None,
+        session: Optional[requests.Session] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        stale_if_error: float = WEATHER_STALE_IF_ERROR_MAX_AGE,
+        retry_policy: Optional[RetryPolicy] = None,
+        timeouts: Optional[AdaptiveTimeout] = None,
+        rate_limiter: Optional[TokenBucket] = None,
+        geo_index: Optional[GeoIndex] = None,
+        gazetteer: Optional[Gazetteer] = None,
+    ):
+        super().__init__(
+            api_key,
+            cache=cache,
+            coords_precision=coords_precision,
+            city_index=city_index,
+            forecast_cache=forecast_cache,
+            breaker=breaker,
+            stale_if_error=stale_if_error,
+            retry_policy=retry_policy,
+            timeouts=timeouts,
+            rate_limiter=rate_limiter,
+            geo_index=geo_index,
+            gazetteer=gazetteer,
+        )
+        # Fusion des appels identiques simultanés vers OpenWeatherMap
+        self.single_flight = single_flight if single_flight is not None else SingleFlight()
+        self.session = session if session is not None else requests.Session()
+
+    def _cached_call(self, key: Hashable, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Appel API avec lecture/écriture du cache (les valeurs en cache ne doivent pas être modifiées)"""
+        data = self._cache_for(key).get(key)
+        if data is not None:
+            logger.debug(f"Cache hit météo: {key}")
+            return data
+        # Le remplissage du cache se fait dans le vol partagé : un thread qui arrive
+        # juste après ne peut pas relancer l'appel avant que le cache soit à jour
+        try:
+            return self.single_flight.do(("cache", key), lambda: self._fetch_and_cache(key, endpoint, params))
+        except Exception as e:
+            fallback = self._stale_fallback(key, e)
+            if fallback is None:
+                raise
+            return fallback.data
+
+    def _fetch_and_cache(self, key: Hashable, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        data = self._cache_for(key).peek(key)
+        if data is not None:
+            return data
+        data = self._make_api_call(endpoint, params)
+        self._cache_for(key).set(key, data)
+        self._index_entry(key, data)
+        return data
+
+    def _make_api_call(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Appelle l'API OpenWeatherMap ; les appels simultanés avec le même
+        (endpoint, params) partagent une seule requête réseau et son résultat/erreur.
+        """
+        return self.single_flight.do(
+            self._flight_key(endpoint, params), lambda: self._call_api(endpoint, params)
+        )
+
+    def _call_api(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Appel réseau protégé par le disjoncteur (CircuitOpenError si ouvert) et limité
+        par le quota de la clé API (RateLimitExceeded au-delà de l'attente acceptée),
+        rejoué avec backoff sur les erreurs transitoires tant que le budget le permet.
+        """
+        self.retry_policy.on_call()
+        attempt = 0
+        while True:
+            wait = self._reserve_call()
+            if wait > 0:
+                time.sleep(wait)
+            started = time.monotonic()
+            try:
+                data = self._send(endpoint, params, timeout=self.timeouts.timeout())
+            except Exception as e:
+                self._record_outcome(started, e)
+                if not self._should_retry(e, attempt):
+                    raise
+                time.sleep(self.retry_policy.backoff(attempt))
+                attempt += 1
+                continue
+            self._record_outcome(started)
+            return data
+
+    def _send(self, endpoint: str, params: Dict[str, Any], timeout: float = WEATHER_HTTP_TIMEOUT) -> Dict[str, Any]:
+        """Méthode générique pour appeler l'API OpenWeatherMap"""
+        url = f"{self.base_url}{endpoint}"
+
         try:
             logger.info(f"Appel API OpenWeather: {endpoint} avec params: {params}")
-            response = requests.get(url, params=default_params, timeout=15.0)
-            response.raise_for_status()  # Lève une exception pour les codes 4xx/5xx
-            return response.json()
-            
+            stream_type = self.STREAMED_ENDPOINTS.get(endpoint)
+            if stream_type is None:
+                response = self.session.get(url, params=self._api_params(params), timeout=timeout)
+                response.raise_for_status()  # Lève une exception pour les codes 4xx/5xx
+                return response.json()
+            with self.session.get(url, params=self._api_params(params), timeout=timeout, stream=True) as response:
+                response.raise_for_status()
+                stream = stream_type()
+                for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                    stream.feed(chunk)
+                return stream.close()
+
         except requests.exceptions.HTTPError as e:
             logger.error(f"Erreur HTTP {response.status_code}: {e}")
             raise
@@ -45,20 +555,393 @@ class WeatherService:
 
     def get_current_weather(self, city: str) -> Dict[str, Any]:
         """Récupère la météo actuelle avec gestion d'erreur améliorée"""
-        params = {"q": city}
-        return self._make_api_call("/weather", params)
+        key, params = self._city_request(city)
+        return self._cached_call(key, "/weather", params)
 
     def get_forecast_raw(self, city: str) -> Dict[str, Any]:
-        """Récupère les prévisions sur 5 jours (3h par 3h)"""
-        params = {"q": city}
-        return self._make_api_call("/forecast", params)
-    
+        """Récupère les prévisions sur 5 jours (3h par 3h), mises en cache par ville"""
+        key, params = self._city_request(city, kind="forecast")
+        return self._cached_call(key, "/forecast", params)
+
     def get_weather_by_coords(self, lat: float, lon: float) -> Dict[str, Any]:
         """Récupère la météo par coordonnées GPS"""
-        params = {"lat": lat, "lon": lon}
-        return self._make_api_call("/weather", params)
-    
+        key, params = self._coords_request(lat, lon)
+        return self._cached_call(key, "/weather", params)
+
     def get_forecast_by_coords(self, lat: float, lon: float) -> Dict[str, Any]:
         """Récupère les prévisions par coordonnées GPS"""
-        params = {"lat": lat, "lon": lon}
-        return self._make_api_call("/forecast", params)
\ No newline at end of file
+        key, params = self._coords_request(lat, lon, kind="forecast")
+        return self._cached_call(key, "/forecast", params)
+
+    def get_current_weather_many(
+        self,
+        cities: Iterable[str] = (),
+        coords: Iterable[Tuple[float, float]] = (),
+        concurrency: int = WEATHER_BATCH_CONCURRENCY,
+    ) -> List[WeatherLookup]:
+        """
+        Météo actuelle d'un lot de villes/coordonnées, dédoublonné et parallélisé (threads).
+        Les villes dont l'ID est connu partent par paquets de 20 dans des appels /group.
+        """
+        requests_by_key = self._batch_requests(cities, coords)
+        results, groups, singles = self._plan_batch(requests_by_key)
+
+        def fetch_single(key: Hashable) -> None:
+            query, params = requests_by_key[key]
+            try:
+                data = self.single_flight.do(
+                    ("cache", key), lambda: self._fetch_and_cache(key, "/weather", params)
+                )
+                results[key] = WeatherLookup(query, data=data)
+            except Exception as e:
+                results[key] = self._batch_failure(key, query, e)
+
+        def fetch_group(group: List[Tuple[int, Hashable]]) -> None:
+            try:
+                data = self._make_api_call("/group", self._group_params(group))
+            except Exception as e:
+                for _, key in group:
+                    results[key] = self._batch_failure(key, requests_by_key[key][0], e)
+                return
+            found, missing = self._store_group_response(group, data)
+            for key, item in found.items():
+                results[key] = WeatherLookup(requests_by_key[key][0], data=item)
+            # ID inconnu de /group (ville renommée...) : repli sur /weather
+            for key in missing:
+                fetch_single(key)
+
+        tasks = [(fetch_group, group) for group in groups] + [(fetch_single, key) for key in singles]
+        if tasks:
+            with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(tasks)))) as pool:
+                list(pool.map(lambda task: task[0](task[1]), tasks))
+        return [results[key] for key in requests_by_key]
+
+    def close(self) -> None:
+        self.city_index.save()
+        self.session.close()
+        if self.cache_store is not None:
+            self.cache_store.close()
+
+
+class AsyncWeatherService(BaseWeatherService):
+    """
+    Service asynchrone pour les routes : s'appuie sur un httpx.AsyncClient partagé,
+    créé dans le lifespan de l'application (pool de connexions keep-alive).
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        client: Optional[httpx.AsyncClient] = None,
+        cache: Optional[WeatherCache] = None,
+        single_flight: Optional[AsyncSingleFlight] = None,
+        coords_precision: int = WEATHER_COORDS_PRECISION,
+        city_index: Optional[CityIdIndex] = None,
+        forecast_cache: Optional[WeatherCache] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        stale_if_error: float = WEATHER_STALE_IF_ERROR_MAX_AGE,
+        retry_policy: Optional[RetryPolicy] = None,
+        timeouts: Optional[AdaptiveTimeout] = None,
+        rate_limiter: Optional[TokenBucket] = None,
+        geo_index: Optional[GeoIndex] = None,
+        gazetteer: Optional[Gazetteer] = None,
+    ):
+        super().__init__(
+            api_key,
+            cache=cache,
+            coords_precision=coords_precision,
+            city_index=city_index,
+            forecast_cache=forecast_cache,
+            breaker=breaker,
+            stale_if_error=stale_if_error,
+            retry_policy=retry_policy,
+            timeouts=timeouts,
+            rate_limiter=rate_limiter,
+            geo_index=geo_index,
+            gazetteer=gazetteer,
+        )
+        self.single_flight = single_flight if single_flight is not None else AsyncSingleFlight()
+        # Un client fourni appartient à l'appelant (lifespan), sinon le service le ferme
+        self._owns_client = client is None
+        self.client = client if client is not None else create_async_client()
+
+        # Stale-while-revalidate : popularité des clés et tâches de rafraîchissement
+        self._popularity: Counter = Counter()
+        self._refreshable: Dict[Hashable, Tuple[str, Dict[str, Any]]] = {}
+        self._background: set = set()
+        self._refresher: Optional["asyncio.Task[None]"] = None
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.stale_while_revalidate = WEATHER_STALE_TTL
+
+    async def _lookup(self, key: Hashable, endpoint: str, params: Dict[str, Any]) -> WeatherResult:
+        """
+        Lecture via le cache en stale-while-revalidate : une entrée périmée est servie
+        immédiatement (avec son âge) et rafraîchie en tâche de fond.
+        Les valeurs en cache ne doivent pas être modifiées.
+        """
+        if self._refresher is not None:
+            self._popularity[key] += 1
+            self._refreshable[key] = (endpoint, params)
+
+        entry = self._cache_for(key).get_entry(key)
+        if entry is not None:
+            if entry.fresh:
+                return WeatherResult(entry.value, age=entry.age, version=entry.stored_at)
+            if -entry.ttl_remaining <= self.stale_while_revalidate:
+                self._refresh_in_background(key, endpoint, params)
+                return WeatherResult(entry.value, age=entry.age, stale=True, version=entry.stored_at)
+            # Trop ancienne pour le stale-while-revalidate : gardée comme secours en cas de panne
+
+        try:
+            data = await self.single_flight.do(("cache", key), lambda: self._fetch_and_cache(key, endpoint, params))
+        except Exception as e:
+            fallback = self._stale_fallback(key, e)
+            if fallback is None:
+                raise
+            return fallback
+        entry = self._cache_for(key).peek_entry(key)
+        return WeatherResult(data, version=entry.stored_at if entry is not None else 0.0)
+
+    async def _cached_call(self, key: Hashable, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        return (await self._lookup(key, endpoint, params)).data
+
+    def _refresh_in_background(self, key: Hashable, endpoint: str, params: Dict[str, Any]) -> None:
+        task = asyncio.ensure_future(self._refresh(key, endpoint, params))
+        # Garde une référence pour que la tâche ne soit pas collectée en cours de route
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _refresh(self, key: Hashable, endpoint: str, params: Dict[str, Any]) -> None:
+        try:
+            # Même vol partagé que les lectures : un seul rafraîchissement par clé
+            await self.single_flight.do(
+                ("cache", key), lambda: self._fetch_and_cache(key, endpoint, params, force=True)
+            )
+            self.refreshes += 1
+        except Exception as e:
+            self.refresh_errors += 1
+            logger.warning(f"Rafraîchissement en arrière-plan échoué pour {key}: {e}")
+
+    async def refresh_hot_entries(self, top_n: int = WEATHER_REFRESH_TOP_N, lead_time: float = WEATHER_REFRESH_INTERVAL) -> int:
+        """
+        Rafraîchit les `top_n` clés les plus demandées qui expirent dans moins de
+        `lead_time` secondes (ou ont déjà quitté le cache). Retourne le nombre de rafraîchissements.
+        """
+        hot = [key for key, _ in self._popularity.most_common(top_n)]
+
+        # Décroissance des compteurs : la popularité reflète les derniers cycles
+        for key in list(self._popularity):
+            self._popularity[key] //= 2
+            if not self._popularity[key] and key not in hot:
+                del self._popularity[key]
+                self._refreshable.pop(key, None)
+
+        due = []
+        for key in hot:
+            entry = self._cache_for(key).peek_entry(key)
+            if entry is None or entry.ttl_remaining <= lead_time:
+                due.append(key)
+        await asyncio.gather(*[self._refresh(key, *self._refreshable[key]) for key in due])
+        return len(due)
+
+    async def _refresh_loop(self, interval: float, top_n: int) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh_hot_entries(top_n=top_n, lead_time=interval)
+            except Exception as e:
+                logger.error(f"Erreur du rafraîchissement planifié: {e}")
+
+    def start_background_refresh(
+        self,
+        interval: float = WEATHER_REFRESH_INTERVAL,
+        top_n: int = WEATHER_REFRESH_TOP_N,
+    ) -> None:
+        """Lance le rafraîchissement périodique des villes les plus demandées (dans le lifespan)"""
+        if self._refresher is None and interval > 0 and top_n > 0:
+            self._refresher = asyncio.ensure_future(self._refresh_loop(interval, top_n))
+
+    async def _fetch_and_cache(
+        self, key: Hashable, endpoint: str, params: Dict[str, Any], force: bool = False
+    ) -> Dict[str, Any]:
+        data = None if force else self._cache_for(key).peek(key)
+        if data is not None:
+            return data
+        data = await self._make_api_call(endpoint, params)
+        self._cache_for(key).set(key, data)
+        self._index_entry(key, data)
+        return data
+
+    async def _make_api_call(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Appelle l'API OpenWeatherMap, en fusionnant les appels identiques simultanés"""
+        return await self.single_flight.do(
+            self._flight_key(endpoint, params), lambda: self._call_api(endpoint, params)
+        )
+
+    async def _call_api(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Appel réseau protégé par le disjoncteur (CircuitOpenError si ouvert) et limité
+        par le quota de la clé API (RateLimitExceeded au-delà de l'attente acceptée),
+        rejoué avec backoff sur les erreurs transitoires tant que le budget le permet.
+        """
+        self.retry_policy.on_call()
+        attempt = 0
+        while True:
+            wait = self._reserve_call()
+            started = time.monotonic()
+            try:
+                # Attente du quota dans le try : une annulation libère aussi l'essai half_open
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    started = time.monotonic()
+                data = await self._send(endpoint, params, timeout=self.timeouts.timeout())
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                self._record_outcome(started, e)
+                if not self._should_retry(e, attempt):
+                    raise
+                await asyncio.sleep(self.retry_policy.backoff(attempt))
+                attempt += 1
+                continue
+            self._record_outcome(started)
+            return data
+
+    async def _send(self, endpoint: str, params: Dict[str, Any], timeout: float = WEATHER_HTTP_TIMEOUT) -> Dict[str, Any]:
+        url = f"{self.base_url}{endpoint}"
+
+        try:
+            logger.info(f"Appel API OpenWeather: {endpoint} avec params: {params}")
+            stream_type = self.STREAMED_ENDPOINTS.get(endpoint)
+            if stream_type is None:
+                response = await self.client.get(url, params=self._api_params(params), timeout=timeout)
+                response.raise_for_status()
+                return response.json()
+            async with self.client.stream("GET", url, params=self._api_params(params), timeout=timeout) as response:
+                if response.is_error:
+                    await response.aread()  # corps disponible pour les gestionnaires d'erreur
+                response.raise_for_status()
+                stream = stream_type()
+                async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+                    stream.feed(chunk)
+                return stream.close()
+
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Erreur HTTP {e.response.status_code}: {e}")
+            raise
+        except httpx.TimeoutException:
+            logger.error("Timeout lors de l'appel à l'API OpenWeather")
+            raise
+        except httpx.TransportError:
+            logger.error("Erreur de connexion à l'API OpenWeather")
+            raise
+        except Exception as e:
+            logger.error(f"Erreur inattendue: {e}")
+            raise
+
+    async def lookup_current_weather(self, city: str) -> WeatherResult:
+        """Météo actuelle avec son âge (éventuellement périmée, en cours de rafraîchissement)"""
+        key, params = self._city_request(city)
+        return await self._lookup(key, "/weather", params)
+
+    async def lookup_forecast(self, city: str) -> WeatherResult:
+        """Prévisions brutes avec leur âge (éventuellement périmées, en cours de rafraîchissement)"""
+        key, params = self._city_request(city, kind="forecast")
+        return await self._lookup(key, "/forecast", params)
+
+    async def get_current_weather(self, city: str) -> Dict[str, Any]:
+        """Récupère la météo actuelle"""
+        return (await self.lookup_current_weather(city)).data
+
+    async def get_forecast_raw(self, city: str) -> Dict[str, Any]:
+        """Récupère les prévisions sur 5 jours (3h par 3h), mises en cache par ville"""
+        return (await self.lookup_forecast(city)).data
+
+    async def lookup_weather_by_coords(self, lat: float, lon: float) -> WeatherResult:
+        """Météo actuelle de la cellule geohash de la position (ou d'une voisine fraîche)"""
+        key, params = self._coords_request(lat, lon)
+        return await self._lookup(key, "/weather", params)
+
+    async def lookup_forecast_by_coords(self, lat: float, lon: float) -> WeatherResult:
+        """Prévisions brutes de la cellule geohash de la position (ou d'une voisine fraîche)"""
+        key, params = self._coords_request(lat, lon, kind="forecast")
+        return await self._lookup(key, "/forecast", params)
+
+    async def get_weather_by_coords(self, lat: float, lon: float) -> Dict[str, Any]:
+        """Récupère la météo par coordonnées GPS"""
+        return (await self.lookup_weather_by_coords(lat, lon)).data
+
+    async def get_forecast_by_coords(self, lat: float, lon: float) -> Dict[str, Any]:
+        """Récupère les prévisions par coordonnées GPS"""
+        return (await self.lookup_forecast_by_coords(lat, lon)).data
+
+    async def get_current_weather_many(
+        self,
+        cities: Iterable[str] = (),
+        coords: Iterable[Tuple[float, float]] = (),
+        concurrency: int = WEATHER_BATCH_CONCURRENCY,
+    ) -> List[WeatherLookup]:
+        """
+        Météo actuelle d'un lot de villes/coordonnées : les doublons sont fusionnés,
+        le cache est consulté, les villes dont l'ID est connu partent par paquets de 20
+        dans des appels /group et au plus `concurrency` appels partent en même temps.
+        """
+        requests_by_key = self._batch_requests(cities, coords)
+        results, groups, singles = self._plan_batch(requests_by_key)
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def fetch_single(key: Hashable) -> None:
+            query, params = requests_by_key[key]
+            try:
+                async with semaphore:
+                    data = await self.single_flight.do(
+                        ("cache", key), lambda: self._fetch_and_cache(key, "/weather", params)
+                    )
+                results[key] = WeatherLookup(query, data=data)
+            except Exception as e:
+                results[key] = self._batch_failure(key, query, e)
+
+        async def fetch_group(group: List[Tuple[int, Hashable]]) -> None:
+            try:
+                async with semaphore:
+                    data = await self._make_api_call("/group", self._group_params(group))
+            except Exception as e:
+                for _, key in group:
+                    results[key] = self._batch_failure(key, requests_by_key[key][0], e)
+                return
+            found, missing = self._store_group_response(group, data)
+            for key, item in found.items():
+                results[key] = WeatherLookup(requests_by_key[key][0], data=item)
+            # ID inconnu de /group (ville renommée...) : repli sur /weather
+            await asyncio.gather(*[fetch_single(key) for key in missing])
+
+        await asyncio.gather(
+            *[fetch_group(group) for group in groups],
+            *[fetch_single(key) for key in singles],
+        )
+        return [results[key] for key in requests_by_key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **super().stats(),
+            "refresh": {
+                "tracked": len(self._popularity),
+                "in_progress": len(self._background),
+                "refreshes": self.refreshes,
+                "errors": self.refresh_errors,
+            },
+        }
+
+    async def aclose(self) -> None:
+        tasks = list(self._background) + ([self._refresher] if self._refresher else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._refresher = None
+        self.city_index.save()
+        if self.cache_store is not None:
+            self.cache_store.close()
+        if self._owns_client:
+            await self.client.aclose()
@@ -11,6 +11,7 @@ from server.src.models.role_model import Role
 from server.src.models.address_model import Address
 from server.src.main import app
 from server.src.core.security import get_password_hash
+from server.src.services.activity_index import get_activity_index
 
 # ⬇️ NEW: import your auth deps so we can override them
 from server.src.middlewares.auth_middleware import (
@@ -36,6 +37,9 @@ def override_get_db():
 # Keep DB override
 app.dependency_overrides[get_db] = override_get_db
 
+# Les tests écrivent directement en base (comme un autre process) : index comparé à chaque usage
+get_activity_index().check_interval = 0
+
 
 # -----------------------------
 # Setup tables + rôles
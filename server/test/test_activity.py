@@ -2,6 +2,11 @@
 import random
 import pytest
 from server.src.models.activity_model import Activity, Category, Tag
+from server.src.models.history_model import History
+from server.src.services.activity_index import ActivityFeatures, ActivityIndex
+from server.src.services.history_service import add_to_history
+from server.src.services.viewed_history import Bitset
+from server.src.services.recommendation_service import ScoringEngine, WeatherContext
 from server.test.conftest import override_get_db  # keep if you use it for seeding
 
 
@@ -51,3 +56,337 @@ def test_get_activities_list(client_user):
         assert isinstance(data["results"], list)
     else:
         assert isinstance(data, list)
+
+
+def test_activity_index_filters_and_follows_changes():
+    db = next(override_get_db())
+    football = Activity(name="Foot", is_outdoor=True, ideal_temperature_min=18, ideal_temperature_max=24,
+                        min_age=10, max_age=50)
+    museum = Activity(name="Musée", is_outdoor=False, min_age=0)
+    skating = Activity(name="Patinage", is_outdoor=True, ideal_temperature_min=0, ideal_temperature_max=10,
+                       min_age=6, max_age=70)
+    db.add_all([football, museum, skating])
+    db.commit()
+    ours = {football.id, museum.id, skating.id}
+
+    index = ActivityIndex(check_interval=0)
+    index.ensure_fresh(db)
+    assert index.match(temp=20, age=30) & ours == {football.id, museum.id}
+    assert index.match(temp=-5, age=30) & ours == {museum.id, skating.id}  # borne 0 ignorée
+    assert index.match(temp=20, age=60, is_outdoor=True) & ours == set()
+    assert index.match(age=8, exclude_outdoor=True) & ours == {museum.id}
+
+    # Mises à jour incrémentales, sans reconstruction
+    football.ideal_temperature_min = 25
+    football.ideal_temperature_max = 30
+    db.commit()
+    db.refresh(football)
+    index.upsert(football)
+    db.delete(museum)
+    db.commit()
+    index.remove(museum.id)
+    index.ensure_fresh(db)
+    assert index.rebuilds == 1
+    assert index.match(temp=27) & ours == {football.id}
+
+    # Modification faite hors de activity_service (autre process) : reconstruction
+    db.add(Activity(name="Escalade", is_outdoor=False, min_age=12))
+    db.commit()
+    index.ensure_fresh(db)
+    assert index.rebuilds == 2
+    assert index.match(temp=27) & ours == {football.id}  # modification relue depuis la base
+
+    # Vérifications espacées : pas de requête de signature avant check_interval
+    throttled = ActivityIndex(check_interval=60)
+    throttled.ensure_fresh(db)
+    db.add(Activity(name="Yoga", is_outdoor=False, min_age=12))
+    db.commit()
+    throttled.ensure_fresh(db)
+    assert throttled.rebuilds == 1
+
+
+@pytest.mark.parametrize("use_index", [True, False])
+def test_recommendations_sql_and_index_paths_agree(monkeypatch, use_index):
+    from server.src.services import recommendation_service
+
+    db = next(override_get_db())
+    tag = f"reco{random.randint(1, 10**9)}"
+    db.add_all([
+        Activity(name=f"{tag}-velo", is_outdoor=True, ideal_temperature_min=12, ideal_temperature_max=28, min_age=8),
+        Activity(name=f"{tag}-piscine", is_outdoor=False, ideal_temperature_min=0, min_age=5, max_age=25),
+        Activity(name=f"{tag}-cinema", is_outdoor=False, min_age=3),
+        Activity(name=f"{tag}-ski", is_outdoor=True, ideal_temperature_max=5, min_age=10),
+    ])
+    db.commit()
+    monkeypatch.setattr(recommendation_service, "RECOMMENDATION_ACTIVITY_INDEX", use_index)
+
+    class Reader:
+        id = random.randint(10**6, 10**7)
+        age = 30
+
+    def names(**kwargs):
+        result = recommendation_service.get_recommendations_for_user(Reader(), db, limit=1000, **kwargs)
+        return sorted(a.name[len(tag) + 1:] for a in result["activities"] if a.name.startswith(tag))
+
+    sunny = {"name": "Paris", "main": {"temp": 20}, "weather": [{"main": "Clear"}]}
+    rainy = {"name": "Paris", "main": {"temp": 20}, "weather": [{"main": "Rain"}]}
+    assert names(raw_weather=sunny) == ["cinema", "velo"]
+    assert names(raw_weather=rainy) == ["cinema"]
+    assert names(is_outdoor=True) == ["ski", "velo"]
+
+    # Activité vue : exclue aussitôt (bitset mis à jour par history_service / NOT EXISTS)
+    db.rollback()  # la recommandation annote weather_conditions sur les objets chargés
+    velo = db.query(Activity).filter(Activity.name == f"{tag}-velo").one()
+    add_to_history(Reader(), velo, db)
+    assert names(raw_weather=sunny) == ["cinema"]
+
+
+def test_bitset_membership():
+    viewed = Bitset([3, 17, 3])
+    viewed.add(200)
+    assert len(viewed) == 3
+    assert [i for i in range(256) if i in viewed] == [3, 17, 200]
+    assert -1 not in viewed and 10**6 not in viewed
+
+
+def test_scoring_engine_ranks_with_weather_and_affinity():
+    index = ActivityIndex()
+    rows = [
+        # id, outdoor, condition, tmin, tmax, intensity, labels
+        (1, True, "sunny", 15, 25, "low", (("tag", 1),)),
+        (2, True, "sunny", 15, 25, "high", (("tag", 2),)),
+        (3, False, "rainy", 0, 40, "low", (("tag", 2),)),
+        (4, True, "sunny", 15, 25, "low", (("tag", 1),)),   # même profil que 1, plus récente
+    ]
+    for i, outdoor, condition, tmin, tmax, intensity, labels in rows:
+        index._insert(ActivityFeatures(i, float(i), outdoor, None, condition, tmin, tmax, 0, None, intensity, labels))
+    humid_sunny = WeatherContext(temp=20, condition="sunny", wind_speed=2, humidity=100)
+
+    ranked = ScoringEngine(index, humid_sunny).top_k({1, 2, 3, 4}, 3, exclude={1})
+    assert [i for _, i in ranked] == [4, 2, 3]  # intense pénalisée par l'humidité, mais condition identique
+    assert ranked[0][0] == 0.75  # météo idéale, sans affinité
+
+    # Affinité pour le tag 2 : l'activité 2 passe devant
+    ranked = ScoringEngine(index, humid_sunny, {("tag", 2): 1.0}).top_k({1, 2, 3, 4}, 2)
+    assert [i for _, i in ranked] == [2, 4]
+    assert WeatherContext.from_raw({"wind": {"speed": 12}}, 20, "Clear").condition == "windy"
+
+
+def test_scoring_engine_scores_under_the_index_lock():
+    import threading
+    from types import SimpleNamespace
+
+    index = ActivityIndex()
+    index._signature = (0, None)  # index construit : upsert() s'applique
+    index._insert(ActivityFeatures(1, 1.0, True, None, "sunny", 10, 20, 0, None, "low", ()))
+    engine = ScoringEngine(index, WeatherContext(temp=15, condition="sunny"), {("category", 7): 1.0})
+    indoor = SimpleNamespace(
+        id=2, created_at=None, updated_at=None, is_outdoor=False, location_type=None, weather_conditions="sunny",
+        ideal_temperature_min=0, ideal_temperature_max=30, min_age=0, max_age=None, intensity="low",
+        categories=[SimpleNamespace(id=7)], tags=[],
+    )
+    writer = threading.Thread(target=index.upsert, args=(indoor,))
+
+    def label_scores():
+        # Upsert concurrent d'une nouvelle combinaison pendant le calcul des scores
+        writer.start()
+        writer.join(timeout=0.2)
+        return engine.label_scores()
+
+    assert [i for _, i in engine.top_k({1, 2}, 2, eligible_only=True, label_scores=label_scores)] == [1]
+    writer.join()
+    ranked = engine.top_k({1, 2}, 2, eligible_only=True)
+    assert [i for _, i in ranked] == [2, 1]  # affinité pour la catégorie 7
+
+
+def test_forecast_recommendations_pick_best_activity_per_slot(client_user):
+    from types import SimpleNamespace
+    from server.src.api.dependencies import get_optional_weather_service
+    from server.src.middlewares.auth_middleware import get_current_user_from_db
+
+    db = next(override_get_db())
+    tag = f"slot{random.randint(1, 10**9)}"
+    picnic = Activity(name=f"{tag}-piquenique", is_outdoor=True, ideal_temperature_min=15,
+                      ideal_temperature_max=30, weather_conditions="sunny", min_age=1, max_age=120)
+    bowling = Activity(name=f"{tag}-bowling", is_outdoor=False, weather_conditions="rainy", min_age=1, max_age=120)
+    db.add_all([picnic, bowling])
+    db.commit()
+    # Seules nos activités sont candidates : celles des autres tests sont déjà vues
+    reader = SimpleNamespace(id=random.randint(10**8, 10**9), age=30)
+    db.add_all([History(user_id=reader.id, activity_id=activity_id)
+                for activity_id, in db.query(Activity.id).filter(~Activity.name.startswith(tag))])
+    db.commit()
+
+    start = 1749283200  # 2025-06-07 08:00:00 UTC = 10:00 à Paris (UTC+2)
+    forecast = {
+        "city": {"name": "Paris", "timezone": 7200},
+        "list": [
+            {"dt": start, "main": {"temp": 22, "humidity": 40}, "weather": [{"main": "Clear"}]},
+            {"dt": start + 10800, "main": {"temp": 16, "humidity": 90}, "weather": [{"main": "Rain"}]},
+            {"dt": start + 21600, "main": {"temp": 24, "humidity": 50}, "weather": [{"main": "Clear"}]},
+        ],
+    }
+
+    class FakeForecastService:
+        async def lookup_forecast(self, city):
+            return SimpleNamespace(data=forecast)
+
+    app = client_user.app
+    app.dependency_overrides[get_optional_weather_service] = lambda: FakeForecastService()
+    app.dependency_overrides[get_current_user_from_db] = lambda: reader
+    try:
+        window = client_user.get("/recommendations/", params={"city": "Paris", "window": "2025-06-07T10:00/2025-06-07T16:00"})
+        at = client_user.get("/recommendations/", params={"city": "Paris", "at": "2025-06-07T16:30"})
+        bad = client_user.get("/recommendations/", params={"city": "Paris", "window": "demain"})
+    finally:
+        del app.dependency_overrides[get_optional_weather_service]
+
+    assert window.status_code == 200, window.text
+    slots = window.json()["slots"]
+    assert [s["dt"] for s in slots] == [start, start + 10800]  # fin exclue
+    best = [s["recommendations"][0]["activity"]["name"][len(tag) + 1:] for s in slots]
+    assert best == ["piquenique", "bowling"]  # pas d'extérieur sous la pluie
+    assert [s["dt"] for s in at.json()["slots"]] == [start + 21600]
+    assert bad.status_code == 400
+
+
+def test_bulk_recommendations_group_weather_and_stream_history():
+    from server.src.models.address_model import Address
+    from server.src.models.user_model import User
+    from server.src.services.recommendation_service import get_recommendations_for_users
+    from server.src.services.gazetteer import BUNDLED_GAZETTEER_PATH, Gazetteer
+    from server.src.services.weather_service import WeatherLookup, WeatherService
+
+    db = next(override_get_db())
+    tag = f"bulk{random.randint(1, 10**9)}"
+    velo = Activity(name=f"{tag}-velo", is_outdoor=True, ideal_temperature_min=10, ideal_temperature_max=30, min_age=8)
+    cinema = Activity(name=f"{tag}-cinema", is_outdoor=False, min_age=3)
+    users = [User(email=f"{tag}{i}@x.fr", username=f"{tag}{i}", hashed_password="x", age=30) for i in range(5)]
+    db.add_all([velo, cinema, *users])
+    db.commit()
+    db.add_all([
+        Address(user_id=users[0].id, street="1 rue", city="Paris", country="FR"),
+        Address(user_id=users[1].id, street="2 rue", city="lyon ", country="FR"),
+        Address(user_id=users[2].id, street="3 rue", city="Lyon", country="FR"),
+        Address(user_id=users[3].id, street="4 rue", city="Pàris", country="FR"),  # autre graphie
+        Address(user_id=users[4].id, street="5 rue", city="Atlantis", country="FR"),  # météo introuvable
+    ])
+    # Seules nos activités sont candidates ; le troisième utilisateur a déjà fait du vélo
+    others = [activity_id for activity_id, in db.query(Activity.id).filter(~Activity.name.startswith(tag))]
+    db.add_all([History(user_id=u.id, activity_id=activity_id) for u in users for activity_id in others])
+    db.add(History(user_id=users[2].id, activity_id=velo.id))
+    db.commit()
+
+    class FakeWeatherService:
+        calls = []
+        gazetteer = Gazetteer(BUNDLED_GAZETTEER_PATH)
+        _city_request = WeatherService._city_request  # mêmes clés de cache que le vrai service
+        city_cache_key = WeatherService.city_cache_key
+
+        def get_current_weather_many(self, cities=()):
+            self.calls.append(list(cities))
+            weather = {"Paris": "Rain", "lyon": "Clear"}
+            return [
+                WeatherLookup(c, data={"main": {"temp": 20}, "weather": [{"main": weather[c]}]}) if c in weather
+                else WeatherLookup(c, error=RuntimeError("city not found"))
+                for c in cities
+            ]
+
+    chunks = list(get_recommendations_for_users(
+        db, FakeWeatherService(), user_ids=[u.id for u in users], limit=5, chunk_size=2, history_page_size=3
+    ))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert FakeWeatherService.calls == [["Paris", "lyon", "Atlantis"]]  # une fois par ville
+    names = {entry["user_id"]: [r["name"][len(tag) + 1:] for r in entry["recommendations"]]
+             for chunk in chunks for entry in chunk}
+    assert names == {
+        users[0].id: ["cinema"],            # pluie : pas d'extérieur
+        users[1].id: ["velo", "cinema"],
+        users[2].id: ["cinema"],            # vélo déjà vu
+        users[3].id: ["cinema"],            # "Pàris" : même ville, même pluie
+        users[4].id: ["cinema", "velo"],    # sans météo : à égalité, plus récente d'abord
+    }
+    errors = {entry["user_id"]: entry["weather_error"] for chunk in chunks for entry in chunk}
+    assert errors == {u.id: None for u in users[:4]} | {users[4].id: "city not found"}
+    FakeWeatherService.gazetteer.close()
+
+
+def test_recommendation_snapshots_rebuild_on_bucket_or_catalogue_change():
+    import threading
+    from types import SimpleNamespace
+    from server.src.services.recommendation_service import _snapshot_ranking
+    from server.src.services.recommendation_snapshots import RecommendationSnapshots, age_band, weather_bucket
+
+    index = ActivityIndex()
+    rows = [
+        # id, outdoor, condition, tmin, tmax, min_age, max_age, labels
+        (1, True, "sunny", 15, 25, 0, None, (("tag", 1),)),
+        (2, True, "sunny", 10, 30, 18, None, (("tag", 2),)),
+        (3, False, "rainy", None, None, 0, 12, (("tag", 2),)),
+        (4, False, "cloudy", None, None, 5, 60, ()),
+    ]
+    for i, outdoor, condition, tmin, tmax, min_age, max_age, labels in rows:
+        index._insert(ActivityFeatures(i, float(i), outdoor, None, condition, tmin, tmax, min_age, max_age, "low", labels))
+    store = RecommendationSnapshots(depth=10)
+
+    def recommend(context, age, viewed=(), profile=None, index=index, store=store):
+        engine = ScoringEngine(index, context, profile)
+        band = age_band(age)
+        key = ("paris", weather_bucket(context), band, None)
+        ranked = store.top_k(index, key, lambda n: _snapshot_ranking(index, context, band, None, n),
+                             3, age, context.temp, engine.label_scores, exclude=set(viewed))
+        expected = engine.top_k(index.match(temp=context.temp, age=age), 3, exclude=set(viewed))
+        assert [i for _, i in ranked] == [i for _, i in expected]  # même résultat qu'un calcul complet
+        return [i for _, i in ranked]
+
+    sunny = WeatherContext(temp=20.2, condition="sunny")
+    assert recommend(sunny, 10) == [1, 4, 3]                          # 3 et 4 à égalité : plus récente d'abord
+    assert recommend(sunny, 15) == [1, 4]                              # même tranche d'âge, âge exact appliqué
+    assert recommend(WeatherContext(temp=21.5, condition="sunny"), 12, viewed=[1]) == [4, 3]
+    assert recommend(sunny, 11, profile={("tag", 2): 1.0}) == [1, 3, 4]
+    assert store.builds == 1 and store.hits == 3                       # 20.2 et 21.5 : même tranche (pas de 2°C)
+
+    assert recommend(WeatherContext(temp=22.1, condition="sunny"), 10) == [1, 4, 3]
+    assert store.builds == 2                                          # changement de tranche météo
+    index._insert(ActivityFeatures(5, 5.0, False, None, "sunny", None, None, 0, None, "low", ()))
+    assert recommend(sunny, 10) == [1, 5, 4]
+    assert store.builds == 3                                          # catalogue modifié
+
+    # Instantané tronqué : s'il ne suffit pas, calcul complet
+    shallow = RecommendationSnapshots(depth=1)
+    key = ("paris", weather_bucket(sunny), age_band(10), None)
+    assert shallow.top_k(index, key, lambda n: _snapshot_ranking(index, sunny, age_band(10), None, n),
+                         2, 10, sunny.temp, ScoringEngine(index, sunny).label_scores) is None
+    assert shallow.fallbacks == 1
+
+    # Bord de tranche : instantané construit à 20,1°C (tranche [20, 22[), lu à 21,9°C
+    edge, edge_store = ActivityIndex(), RecommendationSnapshots(depth=10)
+    edge._insert(ActivityFeatures(1, 1.0, False, None, "sunny", None, 21, 0, None, "low", ()))
+    edge._insert(ActivityFeatures(2, 2.0, False, None, "sunny", 21.5, None, 0, None, "low", ()))
+    assert recommend(WeatherContext(temp=20.1, condition="sunny"), 30, index=edge, store=edge_store) == [1]
+    assert recommend(WeatherContext(temp=21.9, condition="sunny"), 30, index=edge, store=edge_store) == [2]
+    assert edge_store.builds == 1
+
+    # Upsert concurrent d'une nouvelle combinaison de catégories pendant la lecture de l'instantané
+    edge._signature = (0, None)  # index construit : upsert() s'applique
+    retagged = SimpleNamespace(
+        id=1, created_at=None, updated_at=None, is_outdoor=False, location_type=None, weather_conditions="sunny",
+        ideal_temperature_min=None, ideal_temperature_max=21, min_age=0, max_age=None, intensity="low",
+        categories=[SimpleNamespace(id=7)], tags=[],
+    )
+    writer = threading.Thread(target=edge.upsert, args=(retagged,))
+    context = WeatherContext(temp=20.1, condition="sunny")
+    engine = ScoringEngine(edge, context)
+
+    def label_scores():
+        writer.start()
+        writer.join(timeout=0.2)
+        return engine.label_scores()
+
+    key = ("paris", weather_bucket(context), age_band(30), None)
+    ranked = edge_store.top_k(edge, key, lambda n: _snapshot_ranking(edge, context, age_band(30), None, n),
+                              3, 30, context.temp, label_scores)
+    assert [i for _, i in ranked] == [1]
+    writer.join()
+    assert recommend(context, 30, index=edge, store=edge_store, profile={("category", 7): 1.0}) == [1]
+    assert edge_store.builds == 2                                     # catalogue modifié
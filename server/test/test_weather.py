@@ -0,0 +1,847 @@
+# server/test/test_weather.py
+import asyncio
+import json
+import threading
+import time
+import httpx
+import pytest
+from server.src.api.dependencies import get_weather_service
+from server.src.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from server.src.services.city_index import CityIdIndex
+from server.src.services.adaptive_timeout import AdaptiveTimeout
+from server.src.services.rate_limiter import RateLimitExceeded, TokenBucket
+from server.src.services.retry_policy import RetryPolicy
+from server.src.services.weather_cache import TTLCache
+from server.src.services.forecast_aggregation import ForecastColumns, ForecastStream
+from server.src.services.json_stream import JsonArrayStream
+from server.src.services.gazetteer import BUNDLED_GAZETTEER_PATH, Gazetteer
+from server.src.services.cache_backends import RedisStore, SQLiteStore, SharedTTLCache
+from server.src.services.weather_service import WeatherService, AsyncWeatherService
+from server.src.services.weather_adapter import map_hourly_forecast
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_service(cache=None):
+    """WeatherService dont l'appel HTTP est remplacé par un compteur"""
+    service = WeatherService(api_key="test-key", cache=cache, city_index=CityIdIndex())
+    service.calls = []
+
+    def fake_api_call(endpoint, params):
+        service.calls.append((endpoint, dict(params)))
+        return {"name": params.get("q", "coords"), "main": {"temp": 20}}
+
+    service._call_api = fake_api_call
+    return service
+
+
+def test_ttl_cache_expiration():
+    clock = FakeClock()
+    cache = TTLCache(max_size=10, ttl=60, clock=clock)
+    cache.set("paris", {"temp": 20})
+    assert cache.get("paris") == {"temp": 20}
+
+    clock.now += 61
+    assert cache.get("paris") is None
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["expirations"] == 1
+
+
+def test_ttl_cache_lru_eviction():
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "b" devient la moins récemment utilisée
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_current_weather_is_cached_by_normalized_city():
+    service = make_service()
+    service.get_current_weather("Paris")
+    service.get_current_weather("  paris ")
+
+    assert len(service.calls) == 1
+    assert service.cache.stats()["hits"] == 1
+
+
+def test_weather_by_coords_is_cached_by_rounded_coords():
+    service = make_service()
+    service.get_weather_by_coords(48.85661, 2.35222)
+    service.get_weather_by_coords(48.85702, 2.35198)
+
+    assert len(service.calls) == 1
+
+
+def test_concurrent_identical_calls_are_coalesced():
+    service = make_service()
+
+    def slow_api_call(endpoint, params):
+        service.calls.append((endpoint, dict(params)))
+        time.sleep(0.2)
+        return {"list": []}
+
+    service._call_api = slow_api_call
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(service.get_forecast_raw("Paris")))
+        for _ in range(5)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(service.calls) == 1
+    assert len(results) == 5
+    assert service.single_flight.stats()["coalesced"] == 4
+
+
+def test_coalesced_callers_share_the_error():
+    service = make_service()
+
+    def failing_api_call(endpoint, params):
+        time.sleep(0.1)
+        raise TimeoutError("upstream timeout")
+
+    service._call_api = failing_api_call
+    errors = []
+
+    def call():
+        try:
+            service.get_current_weather("Paris")
+        except TimeoutError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(errors) == 3
+    assert len(service.cache) == 0
+
+
+def test_sync_batch_lookup_dedupes_cities():
+    service = make_service()
+    lookups = service.get_current_weather_many(cities=["Paris", "PARIS", "Lyon"])
+
+    assert [l.query for l in lookups] == ["Paris", "Lyon"]
+    assert all(l.error is None for l in lookups)
+    assert len(service.calls) == 2
+
+
+def unlimited():
+    """Quota assez large pour ne jamais ralentir les tests"""
+    return TokenBucket(rate=1000, burst=1000)
+
+
+def make_async_service(handler):
+    """AsyncWeatherService branché sur un transport httpx en mémoire"""
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return AsyncWeatherService(
+        api_key="test-key", client=client, city_index=CityIdIndex(), rate_limiter=unlimited()
+    )
+
+
+def test_async_service_caches_and_coalesces():
+    requests_seen = []
+
+    async def handler(request):
+        requests_seen.append(request.url.path)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={"name": "Paris", "main": {"temp": 20}})
+
+    async def scenario():
+        service = make_async_service(handler)
+        results = await asyncio.gather(*[service.get_current_weather("Paris") for _ in range(10)])
+        again = await service.get_current_weather(" paris")
+        await service.client.aclose()
+        return results, again
+
+    results, again = asyncio.run(scenario())
+    assert requests_seen == ["/data/2.5/weather"]
+    assert all(r["name"] == "Paris" for r in results)
+    assert again["name"] == "Paris"
+
+
+def test_async_service_raises_http_errors():
+    async def handler(request):
+        return httpx.Response(404, json={"message": "city not found"})
+
+    async def scenario():
+        service = make_async_service(handler)
+        try:
+            await service.get_current_weather("Nowhere")
+        finally:
+            await service.client.aclose()
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(scenario())
+
+
+def test_weather_route_reuses_the_app_scoped_service(client_user):
+    requests_seen = []
+
+    def handler(request):
+        requests_seen.append(request.url.path)
+        return httpx.Response(200, json={"name": "Paris", "main": {"temp": 20}})
+
+    service = make_async_service(handler)
+    client_user.app.dependency_overrides[get_weather_service] = lambda: service
+    try:
+        for _ in range(3):
+            resp = client_user.get("/weather/Paris")
+            assert resp.status_code == 200, resp.text
+            assert resp.json()["city"] == "Paris"
+    finally:
+        del client_user.app.dependency_overrides[get_weather_service]
+
+    assert requests_seen == ["/data/2.5/weather"]
+    assert service.stats()["cache"]["hits"] == 2
+
+
+def test_weather_batch_dedupes_and_reports_errors(client_user):
+    requests_seen = []
+
+    def handler(request):
+        city = request.url.params.get("q")
+        requests_seen.append(city)
+        if city == "Nowhere":
+            return httpx.Response(404, json={"message": "city not found"})
+        return httpx.Response(200, json={"name": city or "Coords", "main": {"temp": 20}})
+
+    service = make_async_service(handler)
+    client_user.app.dependency_overrides[get_weather_service] = lambda: service
+    try:
+        resp = client_user.post("/weather/batch", json={
+            "cities": ["Paris", " paris ", "Lyon", "Nowhere"],
+            "coords": [{"lat": 48.8566, "lon": 2.3522}],
+        })
+    finally:
+        del client_user.app.dependency_overrides[get_weather_service]
+
+    assert resp.status_code == 200, resp.text
+    data = resp.json()
+    assert data["count"] == 4
+    assert data["errors"] == 1
+    assert [r["query"] for r in data["results"]] == ["Paris", "Lyon", "Nowhere", "48.86,2.35"]
+    assert data["results"][2]["status_code"] == 404
+    assert len(requests_seen) == 4
+
+
+def test_weather_batch_rejects_empty_payload(client_user):
+    client_user.app.dependency_overrides[get_weather_service] = lambda: None
+    try:
+        resp = client_user.post("/weather/batch", json={"cities": []})
+    finally:
+        del client_user.app.dependency_overrides[get_weather_service]
+    assert resp.status_code == 400
+
+
+def test_batch_uses_group_endpoint_for_known_city_ids():
+    paths = []
+
+    async def handler(request):
+        paths.append(request.url.path)
+        if request.url.path.endswith("/group"):
+            ids = [int(i) for i in request.url.params["id"].split(",")]
+            return httpx.Response(200, json={
+                "cnt": len(ids),
+                "list": [{"id": i, "name": f"city{i}", "main": {"temp": 20}} for i in ids if i != 3],
+            })
+        return httpx.Response(200, json={"id": 99, "name": request.url.params["q"]})
+
+    async def scenario():
+        service = make_async_service(handler)
+        for i in range(1, 26):
+            service.city_index.learn(f"city{i}", i)
+        lookups = await service.get_current_weather_many(cities=[f"City{i}" for i in range(1, 26)] + ["Other"])
+        await service.client.aclose()
+        return service, lookups
+
+    service, lookups = asyncio.run(scenario())
+    assert all(l.error is None for l in lookups)
+    assert paths.count("/data/2.5/group") == 2  # 25 IDs -> paquets de 20 + 5
+    assert paths.count("/data/2.5/weather") == 2  # "Other" + l'ID absent de /group
+    assert service.city_index.get("other") == 99
+
+
+def test_city_index_is_persisted(tmp_path):
+    path = str(tmp_path / "city_index.json")
+    index = CityIdIndex(path)
+    index.learn("paris", 2988507)
+    index.save()
+
+    assert CityIdIndex(path).get("paris") == 2988507
+
+
+def test_forecast_is_cached_across_days(client_user):
+    requests_seen = []
+
+    def handler(request):
+        requests_seen.append(request.url.path)
+        return httpx.Response(200, json={
+            "city": {"id": 2988507, "name": "Paris", "country": "FR", "coord": {"lat": 48.85, "lon": 2.35}},
+            "list": [
+                {"dt_txt": f"2025-06-0{day} 12:00:00", "main": {"temp": 20 + day}, "weather": [{"main": "Clear"}]}
+                for day in range(1, 6)
+            ],
+        })
+
+    service = make_async_service(handler)
+    client_user.app.dependency_overrides[get_weather_service] = lambda: service
+    try:
+        lengths = []
+        for days in (1, 3, 5):
+            resp = client_user.get("/weather/Paris/forecast", params={"days": days})
+            assert resp.status_code == 200, resp.text
+            lengths.append(len(resp.json()["forecast"]))
+    finally:
+        del client_user.app.dependency_overrides[get_weather_service]
+
+    assert lengths == [1, 3, 5]
+    assert requests_seen == ["/data/2.5/forecast"]
+    assert service.city_index.get("fr:paris") == 2988507  # clé canonique du gazetteer
+
+
+def make_versioned_service(clock):
+    """Service async dont chaque appel upstream renvoie une nouvelle version des données"""
+    versions = []
+
+    async def handler(request):
+        versions.append(len(versions) + 1)
+        return httpx.Response(200, json={"name": "Paris", "version": versions[-1]})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    service = AsyncWeatherService(
+        api_key="test-key",
+        client=client,
+        cache=TTLCache(max_size=10, ttl=60, stale_ttl=600, clock=clock),
+        city_index=CityIdIndex(),
+        rate_limiter=unlimited(),
+    )
+    return service, versions
+
+
+def test_stale_entry_is_served_then_revalidated():
+    clock = FakeClock()
+
+    async def scenario():
+        service, versions = make_versioned_service(clock)
+        first = await service.lookup_current_weather("Paris")
+        clock.now += 90  # au-delà du TTL, dans la fenêtre stale
+        stale = await service.lookup_current_weather("Paris")
+        await asyncio.gather(*service._background)
+        fresh = await service.lookup_current_weather("Paris")
+        await service.aclose()
+        await service.client.aclose()
+        return first, stale, fresh, versions
+
+    first, stale, fresh, versions = asyncio.run(scenario())
+    assert (first.data["version"], first.stale) == (1, False)
+    assert (stale.data["version"], stale.stale) == (1, True)
+    assert stale.age == 90
+    assert (fresh.data["version"], fresh.stale) == (2, False)
+    assert versions == [1, 2]
+
+
+def test_hot_entries_are_refreshed_before_expiry():
+    clock = FakeClock()
+
+    async def scenario():
+        service, versions = make_versioned_service(clock)
+        service.start_background_refresh(interval=3600, top_n=1)
+        for _ in range(3):
+            await service.get_current_weather("Paris")
+        await service.get_current_weather("Lyon")
+        clock.now += 50  # 10 s avant expiration
+        refreshed = await service.refresh_hot_entries(top_n=1, lead_time=30)
+        await service.aclose()
+        await service.client.aclose()
+        return refreshed, versions
+
+    refreshed, versions = asyncio.run(scenario())
+    assert refreshed == 1  # seule la ville la plus demandée
+    assert len(versions) == 3
+
+
+def test_circuit_breaker_opens_then_closes_after_cooldown():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=30, clock=clock)
+    breaker.record_failure()
+    breaker.before_call()  # encore fermé
+    breaker.record_failure()
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    clock.now += 31
+    breaker.before_call()
+    assert breaker.stats()["opens"] == 1
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_last_known_weather_is_served_when_upstream_fails():
+    clock = FakeClock()
+    outage = {"status": None}
+
+    async def handler(request):
+        if outage["status"]:
+            return httpx.Response(outage["status"], json={"message": "error"})
+        return httpx.Response(200, json={"name": "Paris", "main": {"temp": 20}})
+
+    async def scenario():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        service = AsyncWeatherService(
+            api_key="test-key",
+            client=client,
+            cache=TTLCache(max_size=10, ttl=60, stale_ttl=7200, clock=clock),
+            city_index=CityIdIndex(),
+            breaker=CircuitBreaker(failure_threshold=1, cooldown=30, clock=clock),
+            stale_if_error=7200,
+            rate_limiter=unlimited(),
+        )
+        service.stale_while_revalidate = 0  # force l'appel upstream dès l'expiration
+        await service.lookup_current_weather("Paris")
+        clock.now += 3600
+        outage["status"] = 503
+        degraded = await service.lookup_current_weather("Paris")
+        rejected = await service.lookup_current_weather("Paris")  # circuit ouvert
+        outage["status"] = 404
+        with pytest.raises(CircuitOpenError):
+            await service.get_current_weather("Lyon")  # rien en cache
+        await service.client.aclose()
+        return degraded, rejected, service
+
+    degraded, rejected, service = asyncio.run(scenario())
+    assert (degraded.data["name"], degraded.stale, degraded.degraded) == ("Paris", True, True)
+    assert degraded.age == 3600
+    assert rejected.degraded
+    assert service.breaker.stats()["rejected"] == 2
+    assert service.stats()["stale_if_error_served"] == 2
+
+
+def test_weather_route_returns_503_when_circuit_is_open(client_user):
+    async def handler(request):
+        return httpx.Response(500, json={"message": "boom"})
+
+    service = make_async_service(handler)
+    service.breaker = CircuitBreaker(failure_threshold=1, cooldown=30)
+    client_user.app.dependency_overrides[get_weather_service] = lambda: service
+    try:
+        first = client_user.get("/weather/Paris")
+        second = client_user.get("/weather/Paris")
+    finally:
+        client_user.app.dependency_overrides.pop(get_weather_service, None)
+
+    assert first.status_code == 500
+    assert second.status_code == 503
+    assert second.json()["detail"] == "Service météo temporairement indisponible"
+
+
+def test_circuit_breaker_half_open_allows_a_single_probe():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=30, clock=clock)
+    breaker.record_failure()
+    clock.now += 31
+
+    breaker.before_call()  # essai autorisé
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # un seul essai à la fois
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    clock.now += 31
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.stats()["transitions"] == {
+        "closed->open": 1, "open->half_open": 2, "half_open->open": 1, "half_open->closed": 1
+    }
+
+
+def test_cancelled_quota_wait_releases_half_open_probe():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=30, clock=clock)
+    breaker.record_failure()
+    clock.now += 31
+
+    async def handler(request):
+        return httpx.Response(200, json={"name": "Paris"})
+
+    async def scenario():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        service = AsyncWeatherService(
+            api_key="test-key", client=client, city_index=CityIdIndex(), breaker=breaker,
+            rate_limiter=TokenBucket(rate=0.01, burst=1, max_wait=1000, clock=clock),
+        )
+        service.rate_limiter.reserve()  # quota épuisé : le prochain appel attend 100 s
+        task = asyncio.create_task(service._call_api("/weather", {"q": "Paris"}))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await client.aclose()
+
+    asyncio.run(scenario())
+    breaker.before_call()  # l'essai half_open a été libéré
+    assert breaker.state == "half_open"
+
+
+def test_transient_errors_are_retried_within_budget():
+    statuses = [503, 502, 200]
+
+    async def handler(request):
+        return httpx.Response(statuses.pop(0), json={"name": "Paris"})
+
+    async def scenario():
+        service = make_async_service(handler)
+        service.retry_policy = RetryPolicy(max_attempts=3, budget_max=2, rand=lambda a, b: 0)
+        data = await service.get_current_weather("Paris")
+        await service.client.aclose()
+        return data, service.retry_policy.stats()
+
+    data, stats = asyncio.run(scenario())
+    assert data["name"] == "Paris"
+    assert stats["retries"] == 2
+    # budget épuisé : l'erreur suivante n'est plus rejouée
+    assert not RetryPolicy(budget_max=0, budget_ratio=0).should_retry(httpx.ConnectError("down"), 0)
+
+
+def test_adaptive_timeout_follows_observed_latency():
+    timeouts = AdaptiveTimeout(min_timeout=0.5, max_timeout=10, pct=99, multiplier=2, min_samples=5)
+    assert timeouts.timeout() == 10
+    for latency in (0.1, 0.2, 0.2, 0.3, 1.0):
+        timeouts.observe(latency)
+    assert timeouts.timeout() == 2.0
+    for _ in range(200):
+        timeouts.observe(0.01)
+    assert timeouts.timeout() == 0.5
+
+
+def test_token_bucket_queues_then_rejects():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, burst=2, max_wait=1.5, clock=clock)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 1  # attend le prochain jeton
+    with pytest.raises(RateLimitExceeded):
+        bucket.reserve()  # 2 s d'attente > max_wait
+    clock.now += 3
+    assert bucket.reserve() == 0
+    assert bucket.stats()["rejected"] == 1
+    assert bucket.stats()["waited"] == 1
+
+
+def test_exhausted_quota_falls_back_to_cache():
+    clock = FakeClock()
+    calls = []
+
+    async def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(200, json={"name": "Paris"})
+
+    async def scenario():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        service = AsyncWeatherService(
+            api_key="test-key",
+            client=client,
+            cache=TTLCache(max_size=10, ttl=60, stale_ttl=7200, clock=clock),
+            city_index=CityIdIndex(),
+            rate_limiter=TokenBucket(rate=1 / 60, burst=1, max_wait=0, clock=clock),
+        )
+        service.stale_while_revalidate = 0
+        await service.get_current_weather("Paris")
+        clock.now += 120
+        service.rate_limiter.reserve()  # dernier jeton consommé par un autre appel
+        cached = await service.lookup_current_weather("Paris")
+        with pytest.raises(RateLimitExceeded):
+            await service.get_current_weather("Lyon")
+        await service.client.aclose()
+        return cached, service
+
+    cached, service = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert cached.degraded
+    assert service.breaker.state == "closed"
+
+
+class FakeRedis:
+    """Sous-ensemble du client redis utilisé par RedisStore (get/set px/delete/scan_iter)"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.data = {}
+
+    def get(self, key):
+        value, expires_at = self.data.get(key, (None, 0))
+        return value if expires_at > self.clock() else None
+
+    def set(self, key, value, px):
+        assert isinstance(value, bytes)
+        self.data[key] = (value, self.clock() + px / 1000)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def scan_iter(self, match):
+        prefix = match.rstrip("*")
+        return [k for k in list(self.data) if k.startswith(prefix) and self.get(k) is not None]
+
+
+def test_workers_share_the_sqlite_cache(tmp_path):
+    path = str(tmp_path / "weather_cache.sqlite3")
+    calls = []
+
+    async def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(200, json={"name": "Paris", "main": {"temp": 20}})
+
+    def worker():
+        # Chaque worker a son propre stockage ouvert sur le même fichier
+        cache = SharedTTLCache(SQLiteStore(path), "meteo:current", ttl=600, stale_ttl=600)
+        service = make_async_service(handler)
+        service.cache = cache
+        return service
+
+    async def scenario():
+        first, second = worker(), worker()
+        a = await first.get_current_weather("Paris")
+        b = await second.get_current_weather("paris ")
+        await first.client.aclose()
+        await second.client.aclose()
+        return a, b, second.cache.stats()
+
+    a, b, stats = asyncio.run(scenario())
+    assert calls == ["/data/2.5/weather"]
+    assert a == b
+    assert (stats["hits"], stats["size"], stats["backend"]) == (1, 1, "SQLiteStore")
+
+
+def test_redis_backed_cache_serves_stale_then_expires():
+    clock = FakeClock()
+    server = FakeRedis(clock)
+    cache = SharedTTLCache(RedisStore(server), "meteo:current", ttl=60, stale_ttl=60, clock=clock)
+    cache.set(("weather", "city", "paris"), {"name": "Paris"})
+
+    assert list(server.data) == ["meteo:current:weather:city:paris"]
+    assert cache.get(("weather", "city", "paris")) == {"name": "Paris"}
+    clock.now += 90
+    assert cache.get(("weather", "city", "paris")) is None
+    entry = cache.get_entry(("weather", "city", "paris"))
+    assert (entry.value, entry.fresh, entry.age) == ({"name": "Paris"}, False, 90)
+    clock.now += 60
+    assert cache.peek_entry(("weather", "city", "paris")) is None
+    assert len(cache) == 0
+
+
+def test_nearby_coordinates_share_a_geo_cell():
+    calls = []
+
+    async def handler(request):
+        calls.append((request.url.params["lat"], request.url.params["lon"]))
+        return httpx.Response(200, json={"name": "Paris", "coord": {"lat": 48.86, "lon": 2.35}})
+
+    async def scenario():
+        service = make_async_service(handler)
+        service.geo_radius_km = 1.5
+        await service.get_weather_by_coords(48.85661, 2.35222)
+        await service.get_weather_by_coords(48.85702, 2.35198)  # même cellule
+        await service.get_weather_by_coords(48.86000, 2.36400)  # cellule voisine, < 1,5 km
+        await service.get_weather_by_coords(48.90000, 2.45000)  # trop loin
+        await service.client.aclose()
+        return service.geo_index.stats()
+
+    stats = asyncio.run(scenario())
+    assert len(calls) == 2
+    assert stats["nearby_hits"] == 1
+
+
+def test_weather_by_coords_route(client_user):
+    async def handler(request):
+        return httpx.Response(200, json={"name": "Lyon", "sys": {"country": "FR"}})
+
+    service = make_async_service(handler)
+    client_user.app.dependency_overrides[get_weather_service] = lambda: service
+    try:
+        ok = client_user.get("/weather/coords", params={"lat": 45.76, "lon": 4.84})
+        invalid = client_user.get("/weather/coords", params={"lat": 120, "lon": 4.84})
+    finally:
+        client_user.app.dependency_overrides.pop(get_weather_service, None)
+
+    assert ok.status_code == 200
+    assert ok.json()["city"] == "Lyon"
+    assert invalid.status_code == 422
+
+
+def test_gazetteer_resolves_spelling_variants_to_one_city():
+    gazetteer = Gazetteer(BUNDLED_GAZETTEER_PATH)
+    variants = ["paris ", "Paris,FR", "Pàris", "PARIS", "fr:paris"]
+
+    assert {gazetteer.resolve(v).id for v in variants} == {"fr:paris"}
+    assert gazetteer.resolve("Saint Etienne").name == "Saint-Étienne"
+    assert gazetteer.resolve("Londres").query == "London,GB"
+    assert gazetteer.resolve("Parisot") is None  # autre ville : pas de correction abusive
+    # Villes absentes de la table : saisie gardée telle quelle, jamais la voisine orthographique
+    assert [gazetteer.resolve(c) for c in ("Lublin", "Mantes", "Vienne", "Marseile")] == [None] * 4
+    assert gazetteer.autocomplete("Marseile")[0].id == "fr:marseille"  # faute de frappe : suggestion seulement
+    assert gazetteer.resolve("Paris,US") is None
+    gazetteer.close()
+
+
+def test_city_variants_share_one_upstream_call_and_autocomplete(client_user):
+    queries = []
+
+    async def handler(request):
+        queries.append(request.url.params["q"])
+        return httpx.Response(200, json={"name": "Paris", "sys": {"country": "FR"}})
+
+    service = make_async_service(handler)
+    client_user.app.dependency_overrides[get_weather_service] = lambda: service
+    try:
+        for city in ("paris ", "Paris,FR", "Pàris"):
+            assert client_user.get(f"/weather/{city}").status_code == 200
+        suggestions = client_user.get("/weather/cities", params={"q": "sain"}).json()
+    finally:
+        client_user.app.dependency_overrides.pop(get_weather_service, None)
+
+    assert queries == ["Paris,FR"]
+    assert [s["name"] for s in suggestions] == ["Saint-Étienne"]
+    assert service.city_cache_key("Pàris") == service.city_cache_key("paris ") != service.city_cache_key("Lyon")
+
+
+def test_current_weather_is_served_from_rendered_bytes_with_etag(client_user):
+    from server.src.api import routes_weather
+
+    async def handler(request):
+        return httpx.Response(200, json={"name": "Nantes", "dt": 1700000000, "main": {"temp": 12.5}})
+
+    service = make_async_service(handler)
+    client_user.app.dependency_overrides[get_weather_service] = lambda: service
+    renders_before = routes_weather._rendered_weather.stats()["misses"]
+    try:
+        first = client_user.get("/weather/Nantes")
+        second = client_user.get("/weather/nantes")
+        not_modified = client_user.get("/weather/Nantes", headers={"If-None-Match": first.headers["ETag"]})
+    finally:
+        client_user.app.dependency_overrides.pop(get_weather_service, None)
+
+    assert first.status_code == second.status_code == 200
+    assert first.headers["ETag"] == second.headers["ETag"]
+    assert second.json()["temp_c"] == 12.5
+    assert isinstance(second.json()["age_seconds"], float)
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    # une seule sérialisation pour les trois réponses
+    assert routes_weather._rendered_weather.stats()["misses"] - renders_before == 1
+
+
+def test_forecast_days_follow_the_city_timezone():
+    # 22:00 et 23:00 UTC le 1er juin = 1h et 2h le 2 juin à UTC+3
+    start = 1748815200  # 2025-06-01 22:00:00 UTC
+    items = [
+        {"dt": start + i * 3600, "main": {"temp": temp}, "weather": [{"main": main}]}
+        for i, (temp, main) in enumerate([(10, "Rain"), (12, "Clear"), (14, "Clear"), (16, "Rain")])
+    ]
+
+    utc_days = ForecastColumns.from_items(items).daily(5)
+    local_days = ForecastColumns.from_items(items, tz_offset=3 * 3600).daily(5)
+
+    assert [d["date"] for d in utc_days] == ["2025-06-01", "2025-06-02"]
+    assert [d["date"] for d in local_days] == ["2025-06-02"]
+    day = local_days[0]
+    assert (day["temp_min"], day["temp_max"], day["temp_avg"]) == (10, 16, 13.0)
+    assert day["condition"] == "Rain"  # égalité : la première rencontrée
+
+
+def test_json_array_stream_yields_items_byte_by_byte():
+    body = json.dumps({
+        "cod": "200",
+        "list": [{"dt": 1, "main": {"temp": -1.5e1}, "name": "Zürich"}, {"dt": 22}, [3]],
+        "city": {"name": "Zürich", "timezone": 7200},
+    }).encode("utf-8") + b" \n"
+    stream = JsonArrayStream("list")
+
+    items = []
+    for i in range(len(body)):
+        items.extend(stream.feed(body[i:i + 1]))  # coupe aussi au milieu des caractères UTF-8
+
+    assert items == [{"dt": 1, "main": {"temp": -15.0}, "name": "Zürich"}, {"dt": 22}, [3]]
+    assert stream.close() == {"cod": "200", "city": {"name": "Zürich", "timezone": 7200}}
+
+    truncated = JsonArrayStream("list")
+    truncated.feed(body[:40])
+    with pytest.raises(ValueError):
+        truncated.close()
+
+
+def test_forecast_stream_uses_city_header_sent_after_the_list():
+    start = 1748815200  # 2025-06-01 22:00:00 UTC
+    body = json.dumps({
+        "list": [{"dt": start + i * 3600, "main": {"temp": 10 + i}, "weather": [{"main": "Rain"}]} for i in range(3)],
+        "city": {"id": 1, "name": "Moscou", "timezone": 3 * 3600},
+    }).encode("utf-8")
+    stream = ForecastStream()
+    for i in range(0, len(body), 7):
+        stream.feed(body[i:i + 7])
+
+    payload = stream.close()
+    assert json.loads(json.dumps(payload)) == payload  # compatible avec les caches partagés
+    days = ForecastColumns.from_payload(payload).daily(5)
+    assert [d["date"] for d in days] == ["2025-06-02"]
+    assert (days[0]["temp_min"], days[0]["temp_max"], days[0]["condition"]) == (10, 12, "Rain")
+
+
+def test_hourly_forecast_projects_interpolates_and_downsamples(client_user):
+    start = 1748736000  # 2025-06-01 00:00:00 UTC
+
+    def handler(request):
+        return httpx.Response(200, json={
+            "city": {"id": 2988507, "name": "Paris", "country": "FR", "timezone": 7200},
+            "list": [
+                {"dt": start + i * 10800, "main": {"temp": 10 + 3 * i, "humidity": 50},
+                 "weather": [{"main": "Rain" if i < 2 else "Clear"}], "pop": 0.5}
+                for i in range(8)
+            ],
+        })
+
+    service = make_async_service(handler)
+    client_user.app.dependency_overrides[get_weather_service] = lambda: service
+    try:
+        hourly = client_user.get("/weather/Paris/forecast/hourly", params={"fields": "temp,condition", "step": 60})
+        reduced = client_user.get("/weather/Paris/forecast/hourly", params={"fields": "temp", "points": 4})
+        unknown = client_user.get("/weather/Paris/forecast/hourly", params={"fields": "temp,snow"})
+    finally:
+        del client_user.app.dependency_overrides[get_weather_service]
+
+    assert hourly.status_code == 200, hourly.text
+    body = hourly.json()
+    assert set(body["series"]) == {"dt", "temp", "condition"}
+    assert body["points"] == 22 and body["step_minutes"] == 60 and body["timezone"] == 7200
+    assert body["series"]["dt"][:2] == [start, start + 3600]
+    assert body["series"]["temp"][:4] == [10, 11, 12, 13]
+    assert body["series"]["condition"][5:7] == ["Rain", "Clear"]
+
+    assert reduced.json()["series"] == {"dt": [start + k * 21600 for k in range(4)], "temp": [11.5, 17.5, 23.5, 29.5]}
+    assert unknown.status_code == 400
+
+
+def test_hourly_forecast_mapping_error_returns_empty_mock_series():
+    hourly = map_hourly_forecast("Paris", {"list": 3}, ["temp", "pop"], step_minutes=60)
+    assert hourly.mock is True and hourly.points == 0
+    assert hourly.series == {"dt": [], "temp": [], "pop": []}
+    assert hourly.city == "Paris" and hourly.fields == ["temp", "pop"]